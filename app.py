@@ -2,25 +2,25 @@
 # -*- coding: utf-8 -*-
 
 import streamlit as st
-import sounddevice as sd
-import soundfile as sf
-import numpy as np
-import tempfile
 import os
 import time
 import queue
 import logging
 
-from src.services import SpeechService, AIService, DBService
+# Audio libraries and the Azure/OpenAI clients are imported on first use,
+# keeping them out of a fresh Streamlit worker's first paint
 from src.ui import (
     TextInputComponent, 
     AnalysisComponent, 
     PlaybackComponent,
     PracticeHistoryComponent,
-    TextGuidanceComponent
+    TextGuidanceComponent,
+    render_memory_panel
 )
 from src.models.base import init_db
 from src.config.i18n import get_text
+from src.utils.lazy import LazyService
+from src.utils.memory_profiler import track_rerun
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +58,7 @@ class SimpleAudioRecorder:
             self.recording.append(indata.copy())
         
         # Start recording stream
+        import sounddevice as sd
         self.stream = sd.InputStream(
             samplerate=self.sample_rate, 
             channels=self.channels,
@@ -82,12 +83,14 @@ class SimpleAudioRecorder:
         
         # Merge recording data
         if self.recording:
+            import numpy as np
+            from src.services.audio_store import get_audio_store
             audio_data = np.concatenate(self.recording, axis=0)
             
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-                self.temp_audio_file = temp_file.name
-                sf.write(self.temp_audio_file, audio_data, self.sample_rate)
+            # Save into the managed recording store
+            self.temp_audio_file = get_audio_store().store_array(audio_data, self.sample_rate)
+            # The take is in the store now, the frames would only sit in session_state
+            self.recording = None
             
             current_language = st.session_state.get('language', 'english')
             st.toast(get_text('recording_stopped', current_language), icon="🟢")
@@ -95,10 +98,21 @@ class SimpleAudioRecorder:
         
         return None
 
+    def discard(self):
+        """Stop a recording without saving it and drop its frames"""
+        if self.is_recording and hasattr(self, 'stream'):
+            self.stream.stop()
+            self.stream.close()
+        self.is_recording = False
+        self.recording = None
+
     def play_recording(self):
         """Play recording"""
         current_language = st.session_state.get('language', 'english')
         if self.temp_audio_file and os.path.exists(self.temp_audio_file):
+            import sounddevice as sd
+            import soundfile as sf
+            
             # Read audio file
             data, fs = sf.read(self.temp_audio_file)
             
@@ -110,12 +124,50 @@ class SimpleAudioRecorder:
         else:
             st.warning(get_text('no_recording', current_language))
 
+# Restored by the next rerun: the analysis from its finished job, the history from the database
+ANALYSIS_RESULT_KEYS = ('pronunciation_result', 'alignment', 'prosody', 'reference_comparison',
+                        'practice_session_id')
+
+def release_idle_session(state):
+    """Drop the large buffers of an idle session, called by the memory profiler's sweeper
+    
+    Args:
+        state: The session's state
+    
+    Returns:
+        The session state keys released
+    """
+    def get(key):
+        return state[key] if key in state else None
+    
+    released = []
+    recorder = get('recorder')
+    if recorder is not None and recorder.is_recording:
+        # Still recording after the idle timeout: the take was abandoned
+        recorder.discard()
+        state['is_recording'] = False
+        state['text_input_disabled'] = False
+        released.append('recorder')
+    if get('practice_history'):
+        state['practice_history'] = []
+        released.append('practice_history')
+    if get('analysis_job_id') and get('analysis_completed'):
+        for key in ANALYSIS_RESULT_KEYS:
+            if get(key) is not None:
+                state[key] = None
+                released.append(key)
+        state['analysis_completed'] = False
+    if get('feedback_job_id') and get('ai_feedback'):
+        state['ai_feedback'] = None
+        released.append('ai_feedback')
+    return released
+
 class EnglishPracticeApp:
     def __init__(self):
-        # Initialize services
-        self.speech_service = SpeechService()
-        self.ai_service = AIService()
-        self.db_service = DBService()
+        # Initialize services, each one is built when first used
+        self.speech_service = LazyService('src.services.speech_service', 'SpeechService')
+        self.ai_service = LazyService('src.services.ai_service', 'AIService')
+        self.db_service = LazyService('src.services.db_service', 'DBService')
         
         # Initialize recorder
         if 'recorder' not in st.session_state:
@@ -170,8 +222,9 @@ class EnglishPracticeApp:
                 audio_file = recorder.stop_recording()
                 
                 if audio_file:
+                    import soundfile as sf
                     st.session_state['audio_file'] = audio_file
-                    st.session_state['audio_duration'] = len(sf.read(audio_file)[0]) / recorder.sample_rate
+                    st.session_state['audio_duration'] = sf.info(audio_file).duration
                     st.session_state['is_recording'] = False
                     st.session_state['text_input_disabled'] = False
                 else:
@@ -200,12 +253,16 @@ class EnglishPracticeApp:
             transcribed_text = pronunciation_result.get('transcribed_text', '')
             pronunciation_score = pronunciation_result.get('pronunciation_score', 0)
             
-            # Get AI feedback
-            feedback = self.ai_service.get_pronunciation_feedback(
-                st.session_state.get('practice_text', ''),
-                transcribed_text,
-                language=st.session_state.get('language', 'english')
-            )
+            # Get AI feedback, left empty rather than saving an error message as feedback
+            try:
+                feedback = self.ai_service.generate_pronunciation_feedback(
+                    st.session_state.get('practice_text', ''),
+                    transcribed_text,
+                    language=st.session_state.get('language', 'english')
+                )
+            except Exception as e:
+                logger.error(f"Feedback error: {str(e)}")
+                feedback = None
             
             # Update session state
             st.session_state['transcribed_text'] = transcribed_text
@@ -219,7 +276,10 @@ class EnglishPracticeApp:
                     audio_file_path=st.session_state['audio_file'],
                     transcribed_text=transcribed_text,
                     pronunciation_score=pronunciation_score,
-                    feedback=feedback
+                    feedback=feedback,
+                    accuracy_score=pronunciation_result.get('accuracy_score'),
+                    fluency_score=pronunciation_result.get('fluency_score'),
+                    completeness_score=pronunciation_result.get('completeness_score')
                 )
             
             return transcribed_text, feedback, pronunciation_result
@@ -273,6 +333,11 @@ def main():
     # Initialize database
     init_db()
     
+    # Per-rerun memory snapshots (MEMORY_PROFILING) and idle-session release
+    with track_rerun(release_idle_session):
+        render_page()
+
+def render_page():
     # Set page config
     st.set_page_config(
         page_title=get_text('app_title', st.session_state.get('language', 'english')), 
@@ -292,6 +357,7 @@ def main():
     app.render()
     
     current_language = st.session_state.get('language', 'english')
+    render_memory_panel(current_language)
     
     # Title and description
     st.title(get_text('app_title', current_language))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure audio task throughput of AudioExecutor against worker count.
+
+Each task resamples a synthetic 44.1 kHz take to 16 kHz and encodes it as
+FLAC, the upload path of SpeechService. Tasks are submitted from several
+threads at once, like concurrent Streamlit sessions. The 'inline' row runs
+them on those threads under the GIL, the other rows in 1..N processes.
+
+    python benchmarks/bench_audio_executor.py [--tasks 48] [--duration 30] [--threads 8] [--max-workers N]
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_upload_formats import synthesize_speech_like
+from src.services.audio_encoding import resample_and_encode
+from src.services.audio_executor import AudioExecutor
+
+
+def run_tasks(executor, samples, tasks, threads):
+    """Seconds to run all tasks, submitted from `threads` caller threads"""
+    def task(_):
+        return executor.run(resample_and_encode, samples, 44100, 'flac')
+
+    with ThreadPoolExecutor(threads) as callers:
+        executor.run(resample_and_encode, samples[:44100], 44100, 'flac')  # start the workers
+        start = time.perf_counter()
+        list(callers.map(task, range(tasks)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=48)
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of audio per task")
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent callers")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    samples = synthesize_speech_like(args.duration)
+    print(f"{args.tasks} tasks of {args.duration:.0f} s audio, {args.threads} callers, {os.cpu_count()} cores")
+    print(f"{'workers':<10}{'tasks/s':>10}{'speedup':>10}{'p50 run ms':>12}{'p95 wait ms':>13}")
+
+    baseline = None
+    for workers in [0] + list(range(1, args.max_workers + 1)):
+        executor = AudioExecutor(max_workers=workers)
+        try:
+            elapsed = run_tasks(executor, samples, args.tasks, args.threads)
+            stats = executor.get_metrics()['tasks']['resample_and_encode']
+        finally:
+            executor.shutdown()
+        throughput = args.tasks / elapsed
+        baseline = baseline or throughput
+        label = 'inline' if workers == 0 else str(workers)
+        print(f"{label:<10}{throughput:>10.2f}{throughput / baseline:>9.2f}x"
+              f"{stats['p50_run'] * 1000:>12.1f}{stats['p95_wait'] * 1000:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
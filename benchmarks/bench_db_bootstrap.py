@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark database work at cold start and on each Streamlit rerun.
+
+Runs against a fresh temporary SQLite database. A rerun is what main() and
+TextInputComponent do on every render: init_db() and get_preset_texts().
+The 'legacy' rows replay the previous behaviour, create_all() and the preset
+seeding check on every rerun, for comparison.
+
+    python benchmarks/bench_db_bootstrap.py [--reruns 200]
+"""
+
+import os
+import sys
+import tempfile
+
+# Point the engine at a scratch database before src.models.base creates it
+_tmpdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+from src.models import Base, PracticeText
+from src.models.base import engine, get_db_metrics, init_db
+from src.services.db_service import DBService
+
+
+def measure(fn, runs):
+    """Mean seconds and statements per call of fn"""
+    queries = get_db_metrics()['queries']
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    elapsed = time.perf_counter() - start
+    return elapsed / runs, (get_db_metrics()['queries'] - queries) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reruns', type=int, default=200)
+    args = parser.parse_args()
+
+    db_service = DBService()
+    cold_time, cold_queries = measure(init_db, 1)
+
+    def rerun():
+        init_db()
+        db_service.get_preset_texts()
+
+    def legacy_rerun():
+        Base.metadata.create_all(bind=engine)
+        db_service.db.query(PracticeText).filter(PracticeText.category == 'preset').all()
+        db_service.get_preset_texts()
+
+    rerun_time, rerun_queries = measure(rerun, args.reruns)
+    legacy_time, legacy_queries = measure(legacy_rerun, args.reruns)
+
+    print(f"{'':<22}{'ms':>10}{'statements':>12}")
+    print(f"{'cold start (migrate)':<22}{cold_time * 1000:>10.2f}{cold_queries:>12.0f}")
+    print(f"{'rerun':<22}{rerun_time * 1000:>10.3f}{rerun_queries:>12.1f}")
+    print(f"{'legacy rerun':<22}{legacy_time * 1000:>10.3f}{legacy_queries:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
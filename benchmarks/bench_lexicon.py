@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the offline pronunciation lexicon: load time, memory footprint and
+lookup latency.
+
+    python benchmarks/bench_lexicon.py [--lookups 100000]
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import resource
+import time
+import tracemalloc
+
+from src.services.lexicon import Lexicon, DEFAULT_LEXICON_PATH
+
+
+def rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lookups', type=int, default=100000)
+    args = parser.parse_args()
+
+    rss_before = rss_kb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    lexicon = Lexicon()
+    load_time = time.perf_counter() - start
+    heap_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with open(DEFAULT_LEXICON_PATH, encoding='utf-8') as f:
+        words = [line.split('\t', 1)[0] for line in f]
+    rng = random.Random(0)
+    # Half known words, half misses
+    queries = [rng.choice(words) if i % 2 else f"{rng.choice(words)}zq" for i in range(args.lookups)]
+
+    start = time.perf_counter()
+    hits = sum(lexicon.lookup(word) is not None for word in queries)
+    lookup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for word in queries[1::2][:10000]:
+        lexicon.describe(word)
+    describe_time = time.perf_counter() - start
+
+    print(f"entries:            {len(lexicon)}")
+    print(f"file size:          {os.path.getsize(DEFAULT_LEXICON_PATH) / 1e6:.2f} MB (memory-mapped)")
+    print(f"load time:          {load_time * 1000:.1f} ms")
+    print(f"python heap:        {heap_bytes / 1e6:.2f} MB")
+    print(f"max RSS growth:     {(rss_kb() - rss_before) / 1e3:.2f} MB (includes query list)")
+    print(f"lookup:             {lookup_time / len(queries) * 1e6:.2f} us ({hits} hits / {len(queries)})")
+    print(f"describe (IPA etc): {describe_time / min(10000, len(queries[1::2])) * 1e6:.2f} us")
+
+
+if __name__ == '__main__':
+    main()
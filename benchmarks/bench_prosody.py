@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure analyze_prosody() time against recording length.
+
+Runs on synthetic 44.1 kHz speech-like audio, the rate the recorder saves,
+and reports the median of several runs and the real-time factor.
+
+    python benchmarks/bench_prosody.py [--durations 10 30 60 120] [--repeat 5]
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import statistics
+import time
+
+from benchmarks.bench_upload_formats import synthesize_speech_like
+from src.utils.dsp import analyze_prosody
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--durations', type=float, nargs='+', default=[10, 30, 60, 120])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'seconds':<10}{'median ms':>12}{'x realtime':>12}{'syllables/s':>13}{'pauses':>8}")
+    for duration in args.durations:
+        samples = synthesize_speech_like(duration)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            prosody = analyze_prosody(samples, 44100)
+            timings.append(time.perf_counter() - start)
+        median = statistics.median(timings)
+        rate = prosody['speaking_rate']
+        print(f"{duration:<10.0f}{median * 1000:>12.1f}{duration / median:>12.0f}"
+              f"{rate if rate is not None else float('nan'):>13.2f}{prosody['pause_count']:>8}")
+
+
+if __name__ == '__main__':
+    main()
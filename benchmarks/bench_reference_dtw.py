@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure the reference comparison on long recordings.
+
+The reference is a synthetic 16 kHz take with one 'word' every 0.4 s, the
+learner's version the same take at 44.1 kHz read 10% slower. Reports MFCC
+extraction, banded DTW and whole compare_features() time, and the peak
+memory of the DTW against the full cost matrix it avoids, per band width.
+
+    python benchmarks/bench_reference_dtw.py [--duration 120] [--bands 0.5 1 2 4] [--repeat 3]
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.bench_upload_formats import synthesize_speech_like
+from src.services.audio_encoding import resample
+from src.services.reference_compare import compare_features
+from src.utils.dsp import HOP_SECONDS, banded_dtw, mfcc
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=120, help="Reference length in seconds")
+    parser.add_argument('--bands', type=float, nargs='+', default=[0.5, 1, 2, 4], help="Band half-widths in seconds")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    reference = resample(synthesize_speech_like(args.duration), 44100, 16000)
+    # Slower reading: the same take stretched by 10%
+    learner = resample(synthesize_speech_like(args.duration), 44100, int(44100 * 1.1))
+    words = [{'text': f'w{i}', 'start': i * 0.4, 'end': i * 0.4 + 0.3} for i in range(int(args.duration / 0.4))]
+
+    (x, y), feature_time = timed(lambda: (mfcc(reference, 16000), mfcc(learner, 44100)), args.repeat)
+    full_bytes = len(x) * len(y) * 8
+    print(f"{args.duration:.0f} s reference, {len(x)} x {len(y)} frames, MFCCs of both in {feature_time * 1000:.0f} ms")
+    print(f"full cost matrix would take {full_bytes / 2 ** 20:.0f} MiB")
+    print(f"{'band s':<8}{'dtw ms':>10}{'peak MiB':>10}{'compare ms':>12}{'worst word':>12}")
+
+    for band in args.bands:
+        radius = int(band / HOP_SECONDS)
+        _, dtw_time = timed(lambda: banded_dtw(x, y, radius), args.repeat)
+        tracemalloc.start()
+        banded_dtw(x, y, radius)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        comparison, compare_time = timed(
+            lambda: compare_features(learner, 44100, reference, 16000, words, band_seconds=band), args.repeat)
+        print(f"{band:<8.1f}{dtw_time * 1000:>10.0f}{peak / 2 ** 20:>10.1f}{compare_time * 1000:>12.0f}"
+              f"{comparison['worst'][0]['text']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare Azure upload formats for pronunciation assessment.
+
+Reports bytes transferred and encode time for each format against the WAV
+path. With --live (and Azure credentials in .env) it also measures the
+end-to-end latency of SpeechService.analyze_pronunciation.
+
+    python benchmarks/bench_upload_formats.py [--audio FILE] [--duration 30] [--live]
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from src.services.audio_encoding import UPLOAD_FORMATS, encode_for_upload
+
+
+def synthesize_speech_like(duration, sample_rate=44100):
+    """Voiced bursts with pauses, a rough stand-in for a spoken take"""
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = (np.sin(2 * np.pi * 2.5 * t) > -0.3).astype(np.float32)
+    noise = np.random.default_rng(0).normal(0, 0.01, len(t))
+    return (0.2 * voiced * envelope + noise).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--audio', help='Recording to encode (default: synthetic take)')
+    parser.add_argument('--duration', type=float, default=30, help='Synthetic take length in seconds')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--live', action='store_true', help='Also run Azure assessment per format')
+    parser.add_argument('--text', default='Hello, my name is Roy. I am a software engineer from San Francisco.')
+    args = parser.parse_args()
+
+    sources = []
+    if args.audio:
+        sources.append(args.audio)
+    else:
+        audio_data = synthesize_speech_like(args.duration)
+        for suffix in ('.wav', '.flac'):
+            fd, path = tempfile.mkstemp(suffix=suffix)
+            os.close(fd)
+            sf.write(path, audio_data, 44100, subtype='PCM_16')
+            sources.append(path)
+
+    speech_service = None
+    if args.live:
+        from src.services import SpeechService
+        speech_service = SpeechService()
+
+    print(f"{'source':<8}{'format':<10}{'bytes':>12}{'vs wav':>9}{'encode ms':>12}{'e2e ms':>10}")
+    for source in sources:
+        wav_bytes = None
+        for upload_format in UPLOAD_FORMATS:
+            timings = []
+            for _ in range(args.repeats):
+                data, encode_time = encode_for_upload(source, upload_format)
+                timings.append(encode_time)
+            if wav_bytes is None:
+                wav_bytes = len(data)
+
+            e2e = ''
+            if speech_service:
+                start = time.perf_counter()
+                speech_service.analyze_pronunciation(source, args.text, upload_format=upload_format)
+                e2e = f"{(time.perf_counter() - start) * 1000:.0f}"
+
+            print(f"{os.path.splitext(source)[1][1:]:<8}{upload_format:<10}{len(data):>12}"
+                  f"{len(data) / wav_bytes:>8.0%} {statistics.median(timings) * 1000:>11.1f}{e2e:>10}")
+
+    if not args.audio:
+        for path in sources:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
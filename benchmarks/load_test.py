@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Load test: N simulated learners practicing at once against one server process.
+
+Each user runs the practice script of the app in a loop through the real
+service layer: browse the preset texts, listen to the reference (TTS), look
+up a word guide, record a take through AudioService, have it analyzed and
+get feedback through the analysis job queue, then open the history and
+progress chart. Azure Speech, OpenAI and the microphone are replaced by the
+local stubs of benchmarks/stub_backends.py with the given latencies and
+error rates; the database, audio store, job queue and audio pool are real
+and live in a temporary directory.
+
+Reports throughput, per-step latency percentiles and error rates, process
+memory growth, and job queue and audio pool metrics.
+
+    python benchmarks/load_test.py [--users 10] [--duration 60] [--record-seconds 8]
+        [--speech-latency 1.5] [--llm-latency 2] [--error-rate 0.02] [--json report.json]
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import logging
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+def rss_bytes():
+    """Resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # Peak, not current, where /proc is unavailable (ru_maxrss is KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemorySampler:
+    """Samples RSS every interval seconds on a daemon thread"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            self.samples.append((time.perf_counter() - start, rss_bytes()))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.samples.append((self.samples[-1][0] if self.samples else 0.0, rss_bytes()))
+
+    def summary(self):
+        values = np.array([rss for _, rss in self.samples], dtype=np.float64) / 2 ** 20
+        # Growth over the second half filters out warm-up allocations
+        half = values[len(values) // 2:]
+        return {
+            'start_mib': round(values[0], 1),
+            'peak_mib': round(values.max(), 1),
+            'end_mib': round(values[-1], 1),
+            'growth_mib': round(values[-1] - values[0], 1),
+            'second_half_growth_mib': round(half[-1] - half[0], 1),
+        }
+
+
+class Recorder:
+    """Thread-safe per-step latencies and errors"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        self.scripts = 0
+
+    def step(self, name, fn, *args, **kwargs):
+        """Run one script step, recording its latency and whether it failed
+
+        Steps fail by raising, or by returning an AIService error message.
+        """
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            failed = isinstance(result, str) and result.startswith(('Error', '生成反馈时出错'))
+            error = result if failed else None
+        except Exception as e:
+            result, failed, error = None, True, f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            if failed:
+                self.errors[name] += 1
+                self.error_samples.setdefault(name, str(error)[:200])
+        return result, failed
+
+    def script_done(self):
+        with self._lock:
+            self.scripts += 1
+
+    def summary(self, elapsed):
+        steps = {}
+        for name, values in sorted(self.latencies.items()):
+            values = np.array(values)
+            steps[name] = {
+                'count': len(values),
+                'errors': self.errors[name],
+                'error_rate': round(self.errors[name] / len(values), 4),
+                'per_second': round(len(values) / elapsed, 3),
+                **{f'p{q}': round(float(np.percentile(values, q)), 4) for q in (50, 95, 99)},
+                'max': round(float(values.max()), 4),
+            }
+        return {'scripts': self.scripts, 'scripts_per_second': round(self.scripts / elapsed, 3),
+                'steps': steps, 'error_samples': self.error_samples}
+
+
+def wait_for_job(queue, job_id, timeout):
+    """Poll a job like AnalysisComponent does until it leaves queued/running"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('succeeded', 'failed'):
+            if job['status'] == 'failed':
+                raise RuntimeError(f"job failed: {job['error']}")
+            return job
+        time.sleep(queue.poll_interval)
+    raise TimeoutError(f"job {job_id} not done after {timeout}s")
+
+
+def practice_script(user, args, services, recorder, stop):
+    """One simulated learner practicing until stop is set"""
+    from src.services.analysis_jobs import ANALYSIS, FEEDBACK, job_key
+
+    db_factory, speech, ai, queue, audio_factory = services
+    # A session of its own, like each Streamlit session's DBService
+    db = db_factory()
+    rng = random.Random(args.seed + user)
+    while not stop.is_set():
+        texts, failed = recorder.step('browse_texts', db.get_preset_texts)
+        if failed or not texts:
+            stop.wait(1)
+            continue
+        text = rng.choice(texts)
+
+        if rng.random() < args.listen_share:
+            recorder.step('listen_reference', speech.text_to_speech, text['content'])
+        if rng.random() < args.guide_share:
+            word = rng.choice(text['content'].split())
+            recorder.step('word_guide', ai.get_word_pronunciation_guide, word)
+
+        audio = audio_factory()
+        audio.start_recording()
+        stop.wait(args.record_seconds / args.audio_speed)
+        audio_file, failed = recorder.step('stop_recording', audio.stop_recording)
+        if failed or not audio_file:
+            continue
+
+        payload = {'audio_file': audio_file, 'text': text['content'], 'practice_text_id': text['id']}
+        job, failed = recorder.step('analysis', lambda: wait_for_job(
+            queue, queue.submit(ANALYSIS, payload, job_key(ANALYSIS, payload))['id'], args.job_timeout))
+        if failed:
+            continue
+
+        if rng.random() < args.feedback_share:
+            result = job['result']
+            feedback = {
+                'text': text['content'],
+                'transcribed_text': result['pronunciation'].get('transcribed_text', ''),
+                'language': 'english',
+                'azure_details': result['pronunciation'],
+                'alignment': result['alignment'],
+                'prosody': result.get('prosody'),
+                'practice_session_id': result.get('practice_session_id'),
+            }
+            recorder.step('feedback', lambda: wait_for_job(
+                queue, queue.submit(FEEDBACK, feedback, job_key(FEEDBACK, feedback))['id'], args.job_timeout))
+
+        recorder.step('history', db.get_practice_history, text['id'])
+        recorder.step('progress', db.get_progress, 'text', text['id'])
+        recorder.script_done()
+        stop.wait(rng.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help="Concurrent simulated learners")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to run")
+    parser.add_argument('--record-seconds', type=float, default=8, help="Length of each take")
+    parser.add_argument('--audio-speed', type=float, default=4, help="Take seconds recorded per wall second")
+    parser.add_argument('--think-time', type=float, default=2, help="Mean pause between scripts in seconds")
+    parser.add_argument('--speech-latency', type=float, default=1.5, help="Mean Azure assessment latency")
+    parser.add_argument('--tts-latency', type=float, default=0.8, help="Mean Azure TTS latency")
+    parser.add_argument('--llm-latency', type=float, default=2.0, help="Mean OpenAI latency")
+    parser.add_argument('--error-rate', type=float, default=0.02, help="Share of failing backend requests")
+    parser.add_argument('--listen-share', type=float, default=0.5)
+    parser.add_argument('--guide-share', type=float, default=0.3)
+    parser.add_argument('--feedback-share', type=float, default=0.7)
+    parser.add_argument('--workers', type=int, default=int(os.getenv('JOB_WORKERS', 2)), help="Job worker threads")
+    parser.add_argument('--job-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Write the report to this file")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary database and recordings")
+    parser.add_argument('--verbose', action='store_true', help="Show the services' logs")
+    args = parser.parse_args()
+    if not args.verbose:
+        # Failures show up in the report, with the first error of each step
+        logging.disable(logging.ERROR)
+
+    # A throwaway database and audio store, set before src reads its settings
+    workdir = tempfile.mkdtemp(prefix='load_test_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'load_test.db')}"
+    os.environ['AUDIO_STORE_DIR'] = os.path.join(workdir, 'recordings')
+    os.environ.setdefault('AZURE_SPEECH_KEY', 'stub')
+    os.environ.setdefault('AZURE_SPEECH_REGION', 'stub')
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+    from benchmarks.stub_backends import (LatencyModel, StubOpenAIServer, StubRecognizerFactory,
+                                          StubSynthesizerFactory, SyntheticStreamFactory)
+    from src.models.base import init_db
+    from src.services import AIService, AudioService, DBService, SpeechService
+    from src.services.analysis_jobs import build_queue
+    from src.services.audio_executor import get_audio_executor_metrics
+
+    init_db()
+    llm = StubOpenAIServer(LatencyModel(args.llm_latency, error_rate=args.error_rate, seed=args.seed + 1))
+    speech = SpeechService(
+        recognizer_factory=StubRecognizerFactory(LatencyModel(args.speech_latency, error_rate=args.error_rate,
+                                                              seed=args.seed + 2)),
+        synthesizer_factory=StubSynthesizerFactory(LatencyModel(args.tts_latency, error_rate=args.error_rate,
+                                                                seed=args.seed + 3)),
+    )
+    ai = AIService(base_url=llm.base_url)
+    streams = SyntheticStreamFactory(speed=args.audio_speed)
+    queue = build_queue(speech_service=speech, ai_service=ai)
+    queue.poll_interval = 0.2
+    queue.start(args.workers)
+    services = (DBService, speech, ai, queue, lambda: AudioService(stream_factory=streams))
+
+    recorder = Recorder()
+    memory = MemorySampler()
+    stop = threading.Event()
+    users = [threading.Thread(target=practice_script, args=(user, args, services, recorder, stop), daemon=True)
+             for user in range(args.users)]
+    print(f"{args.users} users for {args.duration:.0f} s, {args.workers} job workers, backends: "
+          f"speech {args.speech_latency}s, TTS {args.tts_latency}s, LLM {args.llm_latency}s, "
+          f"{args.error_rate:.0%} errors")
+
+    memory.start()
+    start = time.perf_counter()
+    for user in users:
+        user.start()
+    stop.wait(args.duration)
+    stop.set()
+    for user in users:
+        user.join(args.job_timeout)
+    elapsed = time.perf_counter() - start
+    queue.stop(timeout=10)
+    memory.stop()
+    llm.close()
+
+    report = {
+        'config': vars(args),
+        'elapsed_seconds': round(elapsed, 2),
+        **recorder.summary(elapsed),
+        'memory': memory.summary(),
+        'job_queue': queue.get_metrics(),
+        'audio_pool': get_audio_executor_metrics(),
+    }
+
+    print(f"\n{report['scripts']} scripts in {elapsed:.1f} s, {report['scripts_per_second']:.2f}/s")
+    print(f"{'step':<18}{'count':>7}{'/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name, stats in report['steps'].items():
+        print(f"{name:<18}{stats['count']:>7}{stats['per_second']:>8.2f}{stats['p50'] * 1000:>9.0f}"
+              f"{stats['p95'] * 1000:>9.0f}{stats['p99'] * 1000:>9.0f}{stats['error_rate']:>8.1%}")
+    mem = report['memory']
+    print(f"memory: {mem['start_mib']} -> {mem['end_mib']} MiB (peak {mem['peak_mib']}, "
+          f"second half {mem['second_half_growth_mib']:+} MiB)")
+    print(f"job queue depth: {report['job_queue']['depth']}")
+    for name, sample in report['error_samples'].items():
+        print(f"first {name} error: {sample}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"report written to {args.json}")
+    if args.keep:
+        print(f"database and recordings kept in {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Local stand-ins for Azure Speech, OpenAI and the microphone.
+
+They plug into the real services through their seams, so load tests and
+benchmarks exercise SpeechService, AIService and AudioService end to end
+without network access or sound devices:
+
+    SpeechService(recognizer_factory=StubRecognizerFactory(...), synthesizer_factory=StubSynthesizerFactory(...))
+    AIService(base_url=StubOpenAIServer(...).base_url)
+    AudioService(stream_factory=SyntheticStreamFactory(...))
+
+Each backend takes a LatencyModel: lognormal latencies with a given mean
+and spread, and a share of requests that fail the way the real service
+does when it is overloaded (Azure cancellation, HTTP 503).
+"""
+
+import io
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import azure.cognitiveservices.speech as speechsdk
+import numpy as np
+import soundfile as sf
+
+from benchmarks.bench_upload_formats import synthesize_speech_like
+
+
+class LatencyModel:
+    """Lognormal latency with the given mean, and an error rate
+
+    Args:
+        mean: Mean latency in seconds
+        spread: Coefficient of variation of the latency
+        error_rate: Share of requests that fail
+        seed: Random seed, each model draws from its own generator
+    """
+
+    def __init__(self, mean: float = 0.0, spread: float = 0.5, error_rate: float = 0.0, seed: int = 0):
+        self.mean = mean
+        self.error_rate = error_rate
+        self._sigma = np.sqrt(np.log1p(spread ** 2))
+        self._mu = np.log(mean) - self._sigma ** 2 / 2 if mean > 0 else None
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(latency seconds, whether the request fails)"""
+        with self._lock:
+            latency = float(self._rng.lognormal(self._mu, self._sigma)) if self._mu is not None else 0.0
+            return latency, bool(self._rng.random() < self.error_rate)
+
+    def wait(self) -> bool:
+        """Sleep one latency, return whether the request fails"""
+        latency, failed = self.draw()
+        time.sleep(latency)
+        return failed
+
+
+def _canceled(code=speechsdk.CancellationErrorCode.ServiceUnavailable):
+    return SimpleNamespace(
+        reason=speechsdk.ResultReason.Canceled,
+        cancellation_details=SimpleNamespace(code=code, error_details="stub backend overloaded"),
+    )
+
+
+class StubRecognizerFactory:
+    """recognizer_factory for SpeechService answering canned pronunciation assessments
+
+    The transcription is the reference text with an occasional word dropped.
+    """
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, speech_config, audio_config, pronunciation_config):
+        with self._lock:
+            self.calls += 1
+            seed = self.calls
+        reference = getattr(pronunciation_config, 'reference_text', '') or ''
+        return SimpleNamespace(recognize_once=lambda: self._recognize(reference, seed))
+
+    def _recognize(self, reference: str, seed: int):
+        if self.latency.wait():
+            return _canceled()
+        rng = np.random.default_rng(seed)
+        words = reference.split()
+        if len(words) > 3 and rng.random() < 0.5:
+            del words[int(rng.integers(len(words)))]
+        scores = rng.uniform(60, 100, 4).round(1)
+        assessment = {'AccuracyScore': scores[0], 'FluencyScore': scores[1],
+                      'CompletenessScore': scores[2], 'PronScore': scores[3]}
+        body = {'NBest': [{'PronunciationAssessment': assessment, 'Words': []}]}
+        return SimpleNamespace(
+            reason=speechsdk.ResultReason.RecognizedSpeech,
+            text=' '.join(words),
+            properties={speechsdk.PropertyId.SpeechServiceResponse_JsonResult: json.dumps(body)},
+        )
+
+
+class _Signal:
+    def __init__(self):
+        self.callbacks = []
+
+    def connect(self, callback):
+        self.callbacks.append(callback)
+
+
+class StubSynthesizerFactory:
+    """synthesizer_factory for SpeechService returning 16 kHz WAV, 0.35 s per word
+
+    Word boundary events are reported like Azure's, offsets in 100 ns ticks.
+    """
+
+    WORD_SECONDS = 0.35
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, speech_config=None, audio_config=None):
+        synthesizer = SimpleNamespace(synthesis_word_boundary=_Signal())
+        synthesizer.speak_ssml_async = lambda ssml: SimpleNamespace(get=lambda: self._speak(synthesizer, ssml))
+        return synthesizer
+
+    def _speak(self, synthesizer, ssml: str):
+        with self._lock:
+            self.calls += 1
+        if self.latency.wait():
+            return _canceled()
+        words = re.sub(r'<[^>]+>', ' ', ssml).split()
+        samples = synthesize_speech_like(max(len(words), 1) * self.WORD_SECONDS, 16000)
+        for i, word in enumerate(words):
+            event = SimpleNamespace(boundary_type=speechsdk.SpeechSynthesisBoundaryType.Word,
+                                    audio_offset=int(i * self.WORD_SECONDS * 1e7),
+                                    duration=timedelta(seconds=self.WORD_SECONDS * 0.8), text=word)
+            for callback in synthesizer.synthesis_word_boundary.callbacks:
+                callback(event)
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, 16000, format='WAV', subtype='PCM_16')
+        return SimpleNamespace(reason=speechsdk.ResultReason.SynthesizingAudioCompleted,
+                               audio_data=buffer.getvalue())
+
+
+class SyntheticInputStream:
+    """sd.InputStream stand-in feeding speech-like audio to the callback
+
+    Args:
+        samplerate, channels, callback: As for sd.InputStream
+        blocksize: Frames per callback
+        speed: Audio seconds delivered per wall-clock second
+    """
+
+    _streams = 0
+    _lock = threading.Lock()
+
+    def __init__(self, samplerate, channels, callback, blocksize=1024, speed=1.0, **kwargs):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.callback = callback
+        self.blocksize = blocksize
+        self.speed = speed
+        with SyntheticInputStream._lock:
+            SyntheticInputStream._streams += 1
+            seed = SyntheticInputStream._streams
+        # Every take differs, so takes are neither deduplicated nor share analysis jobs
+        rng = np.random.default_rng(seed)
+        self._source = synthesize_speech_like(4, samplerate) + rng.normal(0, 0.005, 4 * samplerate).astype(np.float32)
+        self._start = int(rng.integers(len(self._source)))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        position = self._start
+        started = time.perf_counter()
+        delivered = 0
+        while not self._stop.is_set():
+            block = np.take(self._source, np.arange(position, position + self.blocksize), mode='wrap')
+            position = (position + self.blocksize) % len(self._source)
+            self.callback(np.repeat(block[:, None], self.channels, axis=1), self.blocksize, None, None)
+            delivered += self.blocksize
+            # Pace the blocks like a sound card would
+            ahead = delivered / self.samplerate / self.speed - (time.perf_counter() - started)
+            if ahead > 0:
+                self._stop.wait(ahead)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+
+
+class SyntheticStreamFactory:
+    """stream_factory for AudioService building SyntheticInputStreams"""
+
+    def __init__(self, speed: float = 1.0):
+        self.speed = speed
+
+    def __call__(self, **kwargs):
+        return SyntheticInputStream(speed=self.speed, **kwargs)
+
+
+class StubOpenAIServer:
+    """Local OpenAI-compatible chat completions server
+
+    Failed requests get HTTP 503, which AIService retries and falls back on.
+    """
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                model = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0)))).get('model')
+                server.requests += 1
+                if server.latency.wait():
+                    body = json.dumps({"error": {"message": "Model overloaded", "type": "server_error"}})
+                    self.send_response(503)
+                else:
+                    body = json.dumps({
+                        "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "Stub feedback: keep practicing."}}],
+                        "usage": {"prompt_tokens": 200, "completion_tokens": 40, "total_tokens": 240}
+                    })
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def close(self):
+        self.httpd.shutdown()
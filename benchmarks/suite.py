@@ -0,0 +1,456 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmarks of the practice-cycle hot paths, with a regression check.
+
+Cases, each at several sizes:
+
+    recorder.callback    AudioService's stream callback fed a whole take
+    recorder.concatenate joining the recorded blocks
+    recorder.stop        stop_recording(): join, hash and store the take
+    audio.encode/decode  WAV and FLAC of a take in memory
+    i18n.get_text        plain and formatted lookups
+    prompt.align/feedback/phonetic_guide   word diff and prompt building
+    db.insert_session/history/progress     with N sessions of the text
+    visualizer.frame     one refresh of the live waveform: join and plot
+
+Every case is timed in several samples, each a loop long enough to be above
+timer noise, and the per-call times are written as JSON. compare tests each
+case of two runs with a Mann-Whitney U test and flags the changes that are
+both significant and larger than the threshold. It exits with 1 on a
+regression.
+
+    python benchmarks/suite.py run [-k 'db.*'] [--samples 15] [--json after.json]
+    python benchmarks/suite.py compare before.json after.json [--alpha 0.01] [--threshold 0.05]
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import fnmatch
+import io
+import itertools
+import json
+import logging
+import math
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.bench_upload_formats import synthesize_speech_like
+
+SAMPLE_RATE = 44100
+# Frames per recorder callback, PortAudio's usual block at 44.1 kHz
+BLOCK = 1024
+
+CASES = []
+
+
+def case(name, **grid):
+    """Register a benchmark for every combination of the parameter grid
+
+    The decorated function takes the parameters and returns the callable to
+    time, or a (setup, run) pair when every call needs fresh state: setup()
+    runs untimed before each call and its result is passed to run().
+    """
+    def register(fn):
+        for values in itertools.product(*grid.values()):
+            CASES.append((name, dict(zip(grid, values)), fn))
+        return fn
+    return register
+
+
+def case_key(name, params):
+    return f"{name}[{','.join(f'{key}={value}' for key, value in params.items())}]" if params else name
+
+
+def _blocks(seconds):
+    """A synthetic take cut into recorder callback blocks, shaped like sounddevice's"""
+    samples = synthesize_speech_like(seconds, SAMPLE_RATE)
+    return [block[:, None] for block in np.array_split(samples, max(len(samples) // BLOCK, 1))]
+
+
+class _CapturedStream:
+    """sd.InputStream stand-in that only keeps the callback, the suite drives it"""
+
+    callback = None
+
+    def __init__(self, callback, **kwargs):
+        _CapturedStream.callback = callback
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _recorder():
+    from src.services.audio_service import AudioService
+
+    service = AudioService(stream_factory=_CapturedStream)
+    service.start_recording()
+    return service
+
+
+@case('recorder.callback', seconds=[10, 60, 120])
+def recorder_callback(seconds):
+    service = _recorder()
+    blocks = _blocks(seconds)
+
+    def setup():
+        service.recording = []
+
+    def run(_):
+        callback = _CapturedStream.callback
+        for block in blocks:
+            callback(block, BLOCK, None, None)
+
+    return setup, run
+
+
+@case('recorder.concatenate', seconds=[10, 60, 120])
+def recorder_concatenate(seconds):
+    blocks = _blocks(seconds)
+    return lambda: np.concatenate(blocks, axis=0)
+
+
+@case('recorder.stop', seconds=[10, 60, 120])
+def recorder_stop(seconds):
+    service = _recorder()
+    blocks = _blocks(seconds)
+    takes = itertools.count(1)
+
+    def setup():
+        service.start_recording()
+        # A different take each time, the audio store would deduplicate a repeat
+        blocks[0][0, 0] = next(takes) * 1e-6
+        for block in blocks:
+            _CapturedStream.callback(block, BLOCK, None, None)
+
+    return setup, lambda _: service.stop_recording()
+
+
+@case('audio.encode', format=['WAV', 'FLAC'], seconds=[10, 60, 120])
+def audio_encode(format, seconds):
+    from src.services.audio_encoding import encode_samples
+
+    samples = synthesize_speech_like(seconds, SAMPLE_RATE)
+    return lambda: encode_samples(samples, SAMPLE_RATE, format, 'PCM_16')
+
+
+@case('audio.decode', format=['WAV', 'FLAC'], seconds=[10, 60, 120])
+def audio_decode(format, seconds):
+    import soundfile as sf
+    from src.services.audio_encoding import encode_samples
+
+    data = encode_samples(synthesize_speech_like(seconds, SAMPLE_RATE), SAMPLE_RATE, format, 'PCM_16')
+    return lambda: sf.read(io.BytesIO(data), dtype='float32')
+
+
+@case('i18n.get_text', language=['english', 'chinese'], formatted=[False, True])
+def i18n_get_text(language, formatted):
+    from src.config.i18n import get_text
+
+    if formatted:
+        return lambda: get_text('analysis_failed', language, error='timeout')
+    return lambda: get_text('start_recording', language)
+
+
+_VOCABULARY = ("the quick brown fox jumps over a lazy dog while children play in the park on a "
+               "sunny afternoon and their parents talk about weather schedules travel plans "
+               "recipes music books that they have recently read or would like to buy").split()
+
+
+def _reading(words):
+    """(reference text, a transcription with a tenth of its words dropped or misheard)"""
+    rng = np.random.default_rng(words)
+    reference = [_VOCABULARY[i] for i in rng.integers(len(_VOCABULARY), size=words)]
+    spoken = []
+    for word in reference:
+        roll = rng.random()
+        if roll < 0.05:
+            continue
+        spoken.append(_VOCABULARY[rng.integers(len(_VOCABULARY))] if roll < 0.1 else word)
+    return ' '.join(reference), ' '.join(spoken)
+
+
+@case('prompt.align', words=[50, 200, 1000])
+def prompt_align(words):
+    from src.services.alignment import align_words
+
+    reference, spoken = _reading(words)
+    return lambda: align_words(reference, spoken)
+
+
+@case('prompt.feedback', words=[50, 200, 1000])
+def prompt_feedback(words):
+    from src.services.alignment import align_words, compact_diff
+    from src.services.prompt_builder import build_feedback_prompt
+    from src.utils.dsp import analyze_prosody
+
+    alignment = align_words(*_reading(words))
+    scores = {'pronunciation_score': 82.5, 'accuracy_score': 85.0, 'fluency_score': 78.0,
+              'completeness_score': 90.0}
+    prosody = analyze_prosody(synthesize_speech_like(10, SAMPLE_RATE), SAMPLE_RATE)
+    return lambda: build_feedback_prompt(alignment, compact_diff(alignment), 'english', scores,
+                                         prosody=prosody)
+
+
+@case('prompt.phonetic_guide', words=[50, 200, 1000])
+def prompt_phonetic_guide(words):
+    from src.services.prompt_builder import build_phonetic_guide_prompt
+
+    text = _reading(words)[0]
+    return lambda: build_phonetic_guide_prompt(text)
+
+
+_texts = {}
+
+
+def _history(rows):
+    """(DBService, id of a text with rows sessions over the past year), built once per size"""
+    if rows not in _texts:
+        from src.models import PracticeSession
+        from src.services.db_service import DBService
+        from src.services.practice_stats import rebuild_text_stats
+        from src.services.rollups import rebuild_rollups
+
+        service = DBService()
+        text = service.create_practice_text(f"History of {rows}", _reading(50)[0], 'intermediate', 'custom')
+        rng = np.random.default_rng(rows)
+        now = datetime.utcnow()
+        service.db.bulk_insert_mappings(PracticeSession, [{
+            'practice_text_id': text.id,
+            'audio_file_path': f"recordings/{i:064x}.flac",
+            'transcribed_text': text.content,
+            'pronunciation_score': float(score),
+            'accuracy_score': float(score),
+            'fluency_score': float(score),
+            'completeness_score': 100.0,
+            'created_at': now - timedelta(minutes=int(minutes)),
+        } for i, (score, minutes) in enumerate(zip(rng.uniform(50, 100, rows),
+                                                    rng.integers(0, 365 * 24 * 60, rows)))])
+        service.db.commit()
+        rebuild_rollups(service.db)
+        rebuild_text_stats(service.db, text.id)
+        _texts[rows] = (service, text.id)
+    return _texts[rows]
+
+
+@case('db.insert_session', rows=[100, 1000, 10000])
+def db_insert_session(rows):
+    service, text_id = _history(rows)
+    return lambda: service.create_practice_session(
+        practice_text_id=text_id, audio_file_path='recordings/take.flac', transcribed_text='take',
+        pronunciation_score=80.0, feedback=None, accuracy_score=82.0, fluency_score=75.0,
+        completeness_score=100.0)
+
+
+@case('db.history', rows=[100, 1000, 10000])
+def db_history(rows):
+    service, text_id = _history(rows)
+
+    def run():
+        # The query behind the read cache, as after every new session of the text
+        service.cache.invalidate(('history', text_id))
+        return service.get_practice_history(text_id)
+
+    return run
+
+
+@case('db.progress', rows=[100, 1000, 10000])
+def db_progress(rows):
+    service, text_id = _history(rows)
+    return lambda: service.get_progress('text', text_id)
+
+
+@case('visualizer.frame', seconds=[5, 15, 30, 60])
+def visualizer_frame(seconds):
+    from src.ui.recording_visualizer import waveform_figure
+
+    blocks = _blocks(seconds)
+    # One refresh: join the blocks so far, build the figure and serialize it as st.plotly_chart does
+    return lambda: waveform_figure(np.concatenate(blocks, axis=0)).to_json()
+
+
+def measure(target, samples, min_time):
+    """Per-call seconds of each sample and the calls per sample"""
+    setup, run = target if isinstance(target, tuple) else (None, target)
+    if setup is not None:
+        times = []
+        for _ in range(samples + 1):
+            state = setup()
+            start = time.perf_counter()
+            run(state)
+            times.append(time.perf_counter() - start)
+        # The first call warms caches and imports
+        return times[1:], 1
+
+    run()
+    # Calls per sample, grown 1, 2, 5, 10, ... until a sample takes min_time
+    for loops in (base * 10 ** exponent for exponent in itertools.count() for base in (1, 2, 5)):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+    times = [elapsed / loops]
+    for _ in range(samples - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        times.append((time.perf_counter() - start) / loops)
+    return times, loops
+
+
+def summarize(times):
+    times = np.asarray(times)
+    q1, median, q3 = np.percentile(times, [25, 50, 75])
+    return {
+        'median': float(median),
+        'mean': float(times.mean()),
+        'stdev': float(times.std(ddof=1)) if len(times) > 1 else 0.0,
+        'min': float(times.min()),
+        'iqr': float(q3 - q1),
+    }
+
+
+def mann_whitney(a, b):
+    """Two-sided p-value of the Mann-Whitney U test, normal approximation with tie correction"""
+    a, b = np.asarray(a), np.asarray(b)
+    n1, n2 = len(a), len(b)
+    n = n1 + n2
+    _, inverse, counts = np.unique(np.concatenate([a, b]), return_inverse=True, return_counts=True)
+    # Average rank of each distinct value, ties share it
+    ranks = (np.cumsum(counts) - (counts - 1) / 2)[inverse]
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    ties = float((counts ** 3 - counts).sum())
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = max(abs(u - n1 * n2 / 2) - 0.5, 0) / sigma
+    return math.erfc(z / math.sqrt(2))
+
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(args):
+    selected = [(name, params, fn) for name, params, fn in CASES
+                if not args.k or any(fnmatch.fnmatch(case_key(name, params), pattern) for pattern in args.k)]
+    if args.list:
+        for name, params, _ in selected:
+            print(case_key(name, params))
+        return 0
+
+    logging.disable(logging.ERROR)
+    # A throwaway database and audio store, set before src reads its settings
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['AUDIO_STORE_DIR'] = os.path.join(workdir, 'recordings')
+    os.environ.setdefault('AZURE_SPEECH_KEY', 'bench')
+    os.environ.setdefault('AZURE_SPEECH_REGION', 'bench')
+
+    from src.models.base import init_db
+
+    init_db()
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'config': {'samples': args.samples, 'min_time': args.min_time},
+        'results': {},
+    }
+    print(f"{'case':<50}{'median':>11}{'iqr':>11}{'loops':>8}")
+    try:
+        for name, params, fn in selected:
+            key = case_key(name, params)
+            times, loops = measure(fn(**params), args.samples, args.min_time)
+            result = {'name': name, 'params': params, 'loops': loops, **summarize(times), 'samples': times}
+            report['results'][key] = result
+            print(f"{key:<50}{format_seconds(result['median']):>11}{format_seconds(result['iqr']):>11}{loops:>8}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.json}")
+    return 0
+
+
+def compare_runs(args):
+    with open(args.before) as f:
+        before = json.load(f)['results']
+    with open(args.after) as f:
+        after = json.load(f)['results']
+
+    regressions = 0
+    print(f"{'case':<50}{'before':>11}{'after':>11}{'change':>9}{'p':>9}  verdict")
+    for key in sorted(set(before) | set(after)):
+        if key not in before or key not in after:
+            print(f"{key:<50}{'only in ' + ('before' if key in before else 'after'):>40}")
+            continue
+        old, new = before[key], after[key]
+        change = new['median'] / old['median'] - 1
+        p = mann_whitney(old['samples'], new['samples'])
+        verdict = ''
+        if p < args.alpha and abs(change) > args.threshold:
+            verdict = 'REGRESSION' if change > 0 else 'improvement'
+            regressions += change > 0
+        print(f"{key:<50}{format_seconds(old['median']):>11}{format_seconds(new['median']):>11}"
+              f"{change:>+9.1%}{p:>9.3g}  {verdict}")
+    print(f"\n{regressions} significant regressions (p < {args.alpha}, slower by more than {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="Run the benchmarks")
+    run.add_argument('-k', action='append', help="Only cases matching this glob, e.g. 'db.*' (repeatable)")
+    run.add_argument('--samples', type=int, default=15, help="Timed samples per case")
+    run.add_argument('--min-time', type=float, default=0.05, help="Shortest sample in seconds")
+    run.add_argument('--json', help="Write the results to this file")
+    run.add_argument('--list', action='store_true', help="List the cases and exit")
+    compare = commands.add_parser('compare', help="Flag significant changes between two runs")
+    compare.add_argument('before')
+    compare.add_argument('after')
+    compare.add_argument('--alpha', type=float, default=0.01, help="Significance level")
+    compare.add_argument('--threshold', type=float, default=0.05, help="Smallest relative change reported")
+    args = parser.parse_args()
+    return run_suite(args) if args.command == 'run' else compare_runs(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
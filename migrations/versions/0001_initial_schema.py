@@ -0,0 +1,50 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'practice_texts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=True),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('difficulty_level', sa.String(length=50), nullable=True),
+        sa.Column('category', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_practice_texts_id', 'practice_texts', ['id'])
+    op.create_table(
+        'practice_sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('practice_text_id', sa.Integer(), nullable=True),
+        sa.Column('audio_file_path', sa.String(length=500), nullable=True),
+        sa.Column('transcribed_text', sa.Text(), nullable=True),
+        sa.Column('pronunciation_score', sa.Float(), nullable=True),
+        sa.Column('feedback', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['practice_text_id'], ['practice_texts.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_practice_sessions_id', 'practice_sessions', ['id'])
+
+
+def downgrade():
+    op.drop_index('ix_practice_sessions_id', table_name='practice_sessions')
+    op.drop_table('practice_sessions')
+    op.drop_index('ix_practice_texts_id', table_name='practice_texts')
+    op.drop_table('practice_texts')
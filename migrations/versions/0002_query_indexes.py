@@ -0,0 +1,30 @@
+"""Indexes for preset and history queries
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:05:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # get_preset_texts filters by category
+    op.create_index('ix_practice_texts_category', 'practice_texts', ['category'])
+    # History is read per text, ordered by time
+    op.create_index('ix_practice_sessions_text_created', 'practice_sessions', ['practice_text_id', 'created_at'])
+    # The audio store counts references per recording path
+    op.create_index('ix_practice_sessions_audio_file_path', 'practice_sessions', ['audio_file_path'])
+
+
+def downgrade():
+    op.drop_index('ix_practice_sessions_audio_file_path', table_name='practice_sessions')
+    op.drop_index('ix_practice_sessions_text_created', table_name='practice_sessions')
+    op.drop_index('ix_practice_texts_category', table_name='practice_texts')
@@ -0,0 +1,68 @@
+"""Seed the preset practice texts
+
+Seeding used to be checked by get_preset_texts on every render; as a
+migration it runs once per database and alembic_version records it.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 09:10:00
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+practice_texts = sa.table(
+    'practice_texts',
+    sa.column('id', sa.Integer),
+    sa.column('title', sa.String),
+    sa.column('content', sa.Text),
+    sa.column('difficulty_level', sa.String),
+    sa.column('category', sa.String),
+    sa.column('created_at', sa.DateTime),
+)
+
+PRESET_TEXTS = [
+    {
+        'title': '自我介绍',
+        'content': 'Hello, my name is Roy. I am a software engineer from San Francisco. I love coding and learning new technologies.',
+        'difficulty_level': 'beginner',
+        'category': 'preset'
+    },
+    {
+        'title': '日常生活',
+        'content': 'Every morning, I wake up at 6 AM and start my day with a cup of coffee. I enjoy reading books and listening to podcasts during my free time.',
+        'difficulty_level': 'intermediate',
+        'category': 'preset'
+    },
+    {
+        'title': '职业规划',
+        'content': 'As a software developer, I am passionate about creating innovative solutions that can make people\'s lives easier. I believe in continuous learning and staying updated with the latest technological trends.',
+        'difficulty_level': 'advanced',
+        'category': 'preset'
+    }
+]
+
+
+def upgrade():
+    connection = op.get_bind()
+    # Databases created before migrations may have been seeded already
+    existing = connection.execute(
+        sa.select(sa.func.count()).select_from(practice_texts).where(practice_texts.c.category == 'preset')
+    ).scalar()
+    if not existing:
+        now = datetime.utcnow()
+        op.bulk_insert(practice_texts, [dict(text, created_at=now) for text in PRESET_TEXTS])
+
+
+def downgrade():
+    # Presets may be referenced by practice sessions, they are left in place
+    pass
@@ -0,0 +1,50 @@
+"""Per-text practice statistics
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('practice_texts') as batch_op:
+        batch_op.add_column(sa.Column('session_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('scored_session_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('score_sum', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('best_score', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('last_practiced_at', sa.DateTime(), nullable=True))
+
+    # Backfill from existing sessions, same as practice_stats.rebuild_text_stats
+    op.execute("""
+        UPDATE practice_texts SET
+            session_count = (SELECT count(*) FROM practice_sessions s
+                             WHERE s.practice_text_id = practice_texts.id),
+            scored_session_count = (SELECT count(*) FROM practice_sessions s
+                                    WHERE s.practice_text_id = practice_texts.id
+                                    AND s.pronunciation_score IS NOT NULL),
+            score_sum = coalesce((SELECT sum(s.pronunciation_score) FROM practice_sessions s
+                                  WHERE s.practice_text_id = practice_texts.id), 0),
+            best_score = (SELECT max(s.pronunciation_score) FROM practice_sessions s
+                          WHERE s.practice_text_id = practice_texts.id),
+            last_practiced_at = (SELECT max(s.created_at) FROM practice_sessions s
+                                 WHERE s.practice_text_id = practice_texts.id)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('practice_texts') as batch_op:
+        batch_op.drop_column('last_practiced_at')
+        batch_op.drop_column('best_score')
+        batch_op.drop_column('score_sum')
+        batch_op.drop_column('scored_session_count')
+        batch_op.drop_column('session_count')
@@ -0,0 +1,91 @@
+"""Per-score session columns and daily/weekly rollups
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 12:00:00
+
+"""
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+SCORES = ('pronunciation', 'accuracy', 'fluency', 'completeness')
+
+
+def upgrade():
+    with op.batch_alter_table('practice_sessions') as batch_op:
+        batch_op.add_column(sa.Column('accuracy_score', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('fluency_score', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('completeness_score', sa.Float(), nullable=True))
+
+    score_columns = []
+    for name in SCORES:
+        score_columns += [
+            sa.Column(f'{name}_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column(f'{name}_sum', sa.Float(), nullable=False, server_default='0'),
+            sa.Column(f'{name}_min', sa.Float(), nullable=True),
+            sa.Column(f'{name}_max', sa.Float(), nullable=True),
+        ]
+    rollups = op.create_table(
+        'practice_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('resolution', sa.String(length=8), nullable=False),
+        sa.Column('scope', sa.String(length=16), nullable=False),
+        sa.Column('scope_key', sa.String(length=100), nullable=False),
+        sa.Column('bucket_start', sa.Date(), nullable=False),
+        sa.Column('session_count', sa.Integer(), nullable=False, server_default='0'),
+        *score_columns,
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('resolution', 'scope', 'scope_key', 'bucket_start', name='uq_practice_rollups_bucket'),
+    )
+
+    # Backfill from existing sessions, same as rollups.rebuild_rollups. Only
+    # the overall score exists before this revision.
+    sessions = sa.table('practice_sessions', sa.column('practice_text_id', sa.Integer),
+                        sa.column('pronunciation_score', sa.Float), sa.column('created_at', sa.DateTime))
+    texts = sa.table('practice_texts', sa.column('id', sa.Integer), sa.column('category', sa.String))
+    rows = op.get_bind().execute(
+        sa.select(sessions.c.practice_text_id, texts.c.category,
+                  sessions.c.created_at, sessions.c.pronunciation_score)
+        .select_from(sessions.join(texts, sessions.c.practice_text_id == texts.c.id))
+    )
+    buckets = {}
+    for text_id, category, created_at, score in rows:
+        if created_at is None:
+            continue
+        day = created_at.date()
+        scopes = [('text', str(text_id))] + ([('category', category)] if category else [])
+        for resolution, start in (('day', day), ('week', day - timedelta(days=day.weekday()))):
+            for scope, scope_key in scopes:
+                bucket = buckets.setdefault((resolution, scope, scope_key, start), {
+                    'session_count': 0, 'pronunciation_count': 0, 'pronunciation_sum': 0.0,
+                    'pronunciation_min': None, 'pronunciation_max': None,
+                })
+                bucket['session_count'] += 1
+                if score is not None:
+                    bucket['pronunciation_count'] += 1
+                    bucket['pronunciation_sum'] += score
+                    low, high = bucket['pronunciation_min'], bucket['pronunciation_max']
+                    bucket['pronunciation_min'] = score if low is None else min(low, score)
+                    bucket['pronunciation_max'] = score if high is None else max(high, score)
+    if buckets:
+        op.bulk_insert(rollups, [
+            dict(values, resolution=resolution, scope=scope, scope_key=scope_key, bucket_start=start)
+            for (resolution, scope, scope_key, start), values in buckets.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('practice_rollups')
+    with op.batch_alter_table('practice_sessions') as batch_op:
+        batch_op.drop_column('completeness_score')
+        batch_op.drop_column('fluency_score')
+        batch_op.drop_column('accuracy_score')
@@ -0,0 +1,26 @@
+"""Prosody statistics on practice sessions
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('practice_sessions') as batch_op:
+        batch_op.add_column(sa.Column('prosody', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('practice_sessions') as batch_op:
+        batch_op.drop_column('prosody')
@@ -7,12 +7,14 @@ setup(
     name="speaking-practice",
     version="0.1",
     packages=find_packages(),
+    package_data={'src': ['data/*']},
     install_requires=[
         "streamlit>=1.24.0",
         "azure-cognitiveservices-speech>=1.24.0",
         "openai>=1.3.0",
         "python-dotenv>=0.19.0",
         "httpx>=0.24.0",
+        "tiktoken>=0.5.0",
     ],
     python_requires='>=3.8',
     description="A multilingual English speaking practice assistant",
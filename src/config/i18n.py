@@ -19,6 +19,8 @@ TRANSLATIONS = {
         'language_select': "Select Language",
         'text_mode_select': "Select Text Mode",
         'preset_text': "Preset Text",
+        'text_stats': "practiced {count}×, best {best}, last {last}",
+        'never_practiced': "not practiced yet",
         'custom_text': "Custom Text",
         'enter_text': "Enter your practice text",
         'confirm_text': "Confirm Text",
@@ -35,6 +37,13 @@ TRANSLATIONS = {
         'play_pronunciation': "🔊 Play Pronunciation",
         'getting_guide': "Getting pronunciation guide...",
         'guide_failed': "Failed to get pronunciation guide",
+        'preparing_word_guides': "Preparing pronunciation guides for this text...",
+        'guide_ipa': "IPA",
+        'guide_syllables': "Syllables",
+        'guide_stress': "Stress",
+        'guide_tips': "Tips",
+        'guide_stress_syllable': "syllable {n}",
+        'ai_detailed_guide': "🤖 Detailed AI Guide",
         
         # recording
         'recording_title': "🎙️ Record Your Speech",
@@ -57,6 +66,28 @@ TRANSLATIONS = {
         'accuracy_score': "Accuracy Score",
         'fluency_score': "Fluency Score",
         'completeness_score': "Completeness Score",
+        'word_diff_title': "Word Differences",
+        'local_accuracy': "Words Read Correctly",
+        'word_diff_legend': "Struck through: expected word · red: what was heard · orange: missed · blue: extra",
+        'review_title': "Show spectrogram and waveform",
+        'review_range': "Time range (seconds)",
+        'review_legend': "Top: log-mel spectrogram, low pitches at the bottom, brighter is louder. Bottom: waveform.",
+        'reference_title': "Furthest from the Native Reading",
+        'reference_legend': "Compared frame by frame with a synthesized native reading: time in your recording, then how far the word is from the reference relative to your typical word.",
+        'prosody_title': "Rhythm and Intonation",
+        'speaking_rate': "Syllables per Second",
+        'pause_count': "Pauses",
+        'pause_help': "Average pause {mean}, longest {longest}",
+        'pitch_range': "Pitch Range (semitones)",
+        'prosody_legend': "Measured from the recording itself. Relaxed read-aloud English is about 3-5 syllables per second; a pitch range under 4 semitones sounds flat.",
+        'memory_title': "Memory Profile",
+        'memory_traced': "Traced Memory",
+        'memory_peak': "Peak {peak}",
+        'memory_sessions': "Session state by session",
+        'memory_allocators': "Allocation sites that grew in the last rerun",
+        'memory_caches': "Process-wide caches",
+        'memory_measure_caches': "Measure caches (slow)",
+        'memory_legend': "Idle sessions released so far: {sessions}, {released} freed.",
         'get_ai_feedback': "🤖 Get AI Feedback",
         'getting_feedback': "Getting AI feedback...",
         'ai_feedback_title': "AI Feedback",
@@ -83,6 +114,9 @@ TRANSLATIONS = {
         # analysis related
         'analysis_time': "Analysis time: {time:.2f}s",
         'analysis_failed': "Analysis failed: {error}",
+        'job_queued': "Waiting for a free analysis worker...",
+        'job_retrying': "Retrying after an error (attempt {attempt}/{max_attempts}): {error}",
+        'job_missing': "This analysis is no longer available, please start it again.",
         
         # word guide related
         'click_for_guide': "Click for pronunciation guide",
@@ -172,6 +206,8 @@ TRANSLATIONS = {
         'language_select': "选择语言",
         'text_mode_select': "选择文本方式",
         'preset_text': "预设文本",
+        'text_stats': "已练习 {count} 次，最佳 {best}，最近 {last}",
+        'never_practiced': "尚未练习",
         'custom_text': "自定义文本",
         'enter_text': "输入您的练习文本",
         'confirm_text': "确认文本",
@@ -188,6 +224,13 @@ TRANSLATIONS = {
         'play_pronunciation': "🔊 播放发音",
         'getting_guide': "获取发音指导中...",
         'guide_failed': "获取发音指导失败",
+        'preparing_word_guides': "正在为本文准备单词发音指导...",
+        'guide_ipa': "国际音标",
+        'guide_syllables': "音节",
+        'guide_stress': "重音",
+        'guide_tips': "技巧",
+        'guide_stress_syllable': "第{n}个音节",
+        'ai_detailed_guide': "🤖 AI 详细指导",
         
         # 录音
         'recording_title': "🎙️ 录音",
@@ -210,6 +253,28 @@ TRANSLATIONS = {
         'accuracy_score': "准确性得分",
         'fluency_score': "流畅度得分",
         'completeness_score': "完整度得分",
+        'word_diff_title': "逐词对比",
+        'local_accuracy': "读对的单词",
+        'word_diff_legend': "删除线：应读单词 · 红色：识别结果 · 橙色：漏读 · 蓝色：多读",
+        'review_title': "显示频谱图与波形",
+        'review_range': "时间范围（秒）",
+        'review_legend': "上：对数梅尔频谱图，低频在下，越亮越响。下：波形。",
+        'reference_title': "与标准朗读差异最大的单词",
+        'reference_legend': "与合成的标准朗读逐帧比较：括号内为该词在你录音中的时间，以及它与标准朗读的差距相对于你一般单词的倍数。",
+        'prosody_title': "节奏与语调",
+        'speaking_rate': "每秒音节数",
+        'pause_count': "停顿次数",
+        'pause_help': "平均停顿 {mean}，最长 {longest}",
+        'pitch_range': "音高范围（半音）",
+        'prosody_legend': "根据录音本身测量。自然朗读英语约为每秒 3-5 个音节；音高范围低于 4 个半音听起来会比较平淡。",
+        'memory_title': "内存分析",
+        'memory_traced': "已跟踪内存",
+        'memory_peak': "峰值 {peak}",
+        'memory_sessions': "各会话的 session state",
+        'memory_allocators': "上次重新运行中增长的分配位置",
+        'memory_caches': "进程级缓存",
+        'memory_measure_caches': "统计缓存大小（较慢）",
+        'memory_legend': "已释放的空闲会话：{sessions} 个，共释放 {released}。",
         'get_ai_feedback': "🤖 获取AI反馈",
         'getting_feedback': "正在获取AI反馈...",
         'ai_feedback_title': "AI反馈建议",
@@ -236,6 +301,9 @@ TRANSLATIONS = {
         # 分析相关
         'analysis_time': "分析耗时：{time:.2f}秒",
         'analysis_failed': "分析失败：{error}",
+        'job_queued': "正在等待空闲的分析进程...",
+        'job_retrying': "出错后重试（第 {attempt}/{max_attempts} 次）：{error}",
+        'job_missing': "该分析已不存在，请重新开始。",
         
         # 单词指导相关
         'click_for_guide': "点击获取发音指导",
@@ -1,5 +1,7 @@
 from .base import Base
 from .practice_text import PracticeText
 from .practice_session import PracticeSession
+from .practice_rollup import PracticeRollup
+from .analysis_job import AnalysisJob
 
-__all__ = ['Base', 'PracticeText', 'PracticeSession']
+__all__ = ['Base', 'PracticeText', 'PracticeSession', 'PracticeRollup', 'AnalysisJob']
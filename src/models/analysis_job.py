@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from datetime import datetime
+import json
+from .base import Base
+
+class AnalysisJob(Base):
+    """Background job of the durable queue in src.services.job_queue"""
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        Index('ix_analysis_jobs_status_available', 'status', 'available_at'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    idempotency_key = Column(String(128), nullable=False, unique=True)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    payload = Column(Text, nullable=False)  # JSON
+    result = Column(Text)  # JSON
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0, server_default='0')
+    max_attempts = Column(Integer, nullable=False, default=3, server_default='3')
+    # Queued: earliest start (retry backoff). Running: lease expiry, after
+    # which another worker may claim the job again (visibility timeout)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String(100))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "idempotency_key": self.idempotency_key,
+            "kind": self.kind,
+            "status": self.status,
+            "payload": json.loads(self.payload) if self.payload else None,
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "available_at": self.available_at.isoformat() if self.available_at else None,
+            "locked_by": self.locked_by,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -1,17 +1,39 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import sessionmaker
 import os
+import threading
+import time
 
 Base = declarative_base()
 
 # Create database engine
-DATABASE_URL = "sqlite:///./speech_practice.db"
+DATABASE_URL = os.getenv('DATABASE_URL') or "sqlite:///./speech_practice.db"
 engine = create_engine(DATABASE_URL)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ALEMBIC_INI = os.path.join(ROOT_DIR, 'alembic.ini')
+# Schema that create_all produced before migrations were introduced
+INITIAL_REVISION = '0001'
+
+_db_metrics = {'queries': 0, 'bootstrap_seconds': None, 'bootstrap_queries': None}
+_metrics_lock = threading.Lock()
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+@event.listens_for(engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    with _metrics_lock:
+        _db_metrics['queries'] += 1
+
+def get_db_metrics():
+    """Statements executed by this process and the cost of the schema bootstrap"""
+    with _metrics_lock:
+        return dict(_db_metrics, bootstrapped=_bootstrapped)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -19,5 +41,34 @@ def get_db():
     finally:
         db.close()
 
+def run_migrations(revision='head'):
+    """Upgrade the database to a migration revision with Alembic"""
+    from alembic import command
+    from alembic.config import Config
+    
+    config = Config(ALEMBIC_INI)
+    with engine.begin() as connection:
+        config.attributes['connection'] = connection
+        tables = inspect(connection).get_table_names()
+        if 'practice_texts' in tables and 'alembic_version' not in tables:
+            command.stamp(config, INITIAL_REVISION)
+        command.upgrade(config, revision)
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """Apply pending migrations, which also seed the preset texts, once per process
+    
+    Streamlit calls this on every rerun, only the first call touches the database.
+    """
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        queries = get_db_metrics()['queries']
+        start_time = time.perf_counter()
+        run_migrations()
+        with _metrics_lock:
+            _db_metrics['bootstrap_seconds'] = time.perf_counter() - start_time
+            _db_metrics['bootstrap_queries'] = _db_metrics['queries'] - queries
+        _bootstrapped = True
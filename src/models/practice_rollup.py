@@ -0,0 +1,55 @@
+from sqlalchemy import Column, Integer, String, Date, Float, UniqueConstraint
+from .base import Base
+
+# Scores rolled up per bucket, each from the practice_sessions column <name>_score
+ROLLUP_SCORES = ('pronunciation', 'accuracy', 'fluency', 'completeness')
+
+class PracticeRollup(Base):
+    """Aggregated scores of the sessions in one day or week, per text or category"""
+    __tablename__ = "practice_rollups"
+    __table_args__ = (
+        UniqueConstraint('resolution', 'scope', 'scope_key', 'bucket_start', name='uq_practice_rollups_bucket'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    resolution = Column(String(8), nullable=False)  # day, week
+    scope = Column(String(16), nullable=False)  # text, category
+    scope_key = Column(String(100), nullable=False)  # text id or category name
+    bucket_start = Column(Date, nullable=False)  # UTC day, or the Monday of the week
+    session_count = Column(Integer, nullable=False, default=0, server_default='0')
+
+    # Count of sessions with the score, its sum, min and max
+    pronunciation_count = Column(Integer, nullable=False, default=0, server_default='0')
+    pronunciation_sum = Column(Float, nullable=False, default=0.0, server_default='0')
+    pronunciation_min = Column(Float)
+    pronunciation_max = Column(Float)
+    accuracy_count = Column(Integer, nullable=False, default=0, server_default='0')
+    accuracy_sum = Column(Float, nullable=False, default=0.0, server_default='0')
+    accuracy_min = Column(Float)
+    accuracy_max = Column(Float)
+    fluency_count = Column(Integer, nullable=False, default=0, server_default='0')
+    fluency_sum = Column(Float, nullable=False, default=0.0, server_default='0')
+    fluency_min = Column(Float)
+    fluency_max = Column(Float)
+    completeness_count = Column(Integer, nullable=False, default=0, server_default='0')
+    completeness_sum = Column(Float, nullable=False, default=0.0, server_default='0')
+    completeness_min = Column(Float)
+    completeness_max = Column(Float)
+
+    def to_dict(self):
+        data = {
+            "resolution": self.resolution,
+            "scope": self.scope,
+            "scope_key": self.scope_key,
+            "bucket_start": self.bucket_start.isoformat(),
+            "session_count": self.session_count,
+        }
+        for name in ROLLUP_SCORES:
+            count = getattr(self, f"{name}_count")
+            data[name] = {
+                "count": count,
+                "mean": getattr(self, f"{name}_sum") / count if count else None,
+                "min": getattr(self, f"{name}_min"),
+                "max": getattr(self, f"{name}_max"),
+            }
+        return data
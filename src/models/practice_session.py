@@ -1,16 +1,24 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
+import json
 from .base import Base
 
 class PracticeSession(Base):
     __tablename__ = "practice_sessions"
+    __table_args__ = (
+        Index('ix_practice_sessions_text_created', 'practice_text_id', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     practice_text_id = Column(Integer, ForeignKey("practice_texts.id"))
-    audio_file_path = Column(String(500))
+    audio_file_path = Column(String(500), index=True)
     transcribed_text = Column(Text)
     pronunciation_score = Column(Float)  # Overall pronunciation score
+    accuracy_score = Column(Float)
+    fluency_score = Column(Float)
+    completeness_score = Column(Float)
+    prosody = Column(Text)  # JSON of src.utils.dsp.analyze_prosody
     feedback = Column(Text)  # AI feedback
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -24,6 +32,10 @@ class PracticeSession(Base):
             "audio_file_path": self.audio_file_path,
             "transcribed_text": self.transcribed_text,
             "pronunciation_score": self.pronunciation_score,
+            "accuracy_score": self.accuracy_score,
+            "fluency_score": self.fluency_score,
+            "completeness_score": self.completeness_score,
+            "prosody": json.loads(self.prosody) if self.prosody else None,
             "feedback": self.feedback,
             "created_at": self.created_at.isoformat()
         }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -10,12 +10,24 @@ class PracticeText(Base):
     title = Column(String(200))
     content = Column(Text, nullable=False)
     difficulty_level = Column(String(50))  # beginner, intermediate, advanced
-    category = Column(String(100))  # conversation, business, academic, etc.
+    category = Column(String(100), index=True)  # conversation, business, academic, etc.
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Practice statistics, kept up to date by DBService.create_practice_session
+    # (rebuild with: python -m src.services.practice_stats rebuild)
+    session_count = Column(Integer, nullable=False, default=0, server_default='0')
+    scored_session_count = Column(Integer, nullable=False, default=0, server_default='0')
+    score_sum = Column(Float, nullable=False, default=0.0, server_default='0')
+    best_score = Column(Float)
+    last_practiced_at = Column(DateTime)
+    
     # Relationship with practice sessions
     practice_sessions = relationship("PracticeSession", back_populates="practice_text")
 
+    @property
+    def mean_score(self):
+        return self.score_sum / self.scored_session_count if self.scored_session_count else None
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -23,5 +35,9 @@ class PracticeText(Base):
             "content": self.content,
             "difficulty_level": self.difficulty_level,
             "category": self.category,
-            "created_at": self.created_at.isoformat()
+            "created_at": self.created_at.isoformat(),
+            "session_count": self.session_count,
+            "best_score": self.best_score,
+            "mean_score": self.mean_score,
+            "last_practiced_at": self.last_practiced_at.isoformat() if self.last_practiced_at else None
         }
@@ -1,6 +1,42 @@
-from .speech_service import SpeechService
-from .ai_service import AIService
-from .audio_service import AudioService
-from .db_service import DBService
+# Services are imported on first access (PEP 562), so importing one of them
+# does not pull in the Azure Speech SDK, OpenAI client or audio stack of the others
+from ..utils.lazy import lazy_getattr
 
-__all__ = ['SpeechService', 'AIService', 'AudioService', 'DBService']
+_EXPORTS = {
+    'SpeechService': '.speech_service',
+    'AIService': '.ai_service',
+    'AudioService': '.audio_service',
+    'DBService': '.db_service',
+    'get_db_cache_metrics': '.db_service',
+    'AudioStore': '.audio_store',
+    'get_audio_store': '.audio_store',
+    'SingleFlight': '.single_flight',
+    'get_single_flight_metrics': '.single_flight',
+    'ResiliencePolicy': '.resilience',
+    'RetryableError': '.resilience',
+    'CircuitOpenError': '.resilience',
+    'get_resilience_metrics': '.resilience',
+    'Hedger': '.hedging',
+    'get_hedging_metrics': '.hedging',
+    'count_tokens': '.prompt_builder',
+    'get_prompt_metrics': '.prompt_builder',
+    'ModelRouter': '.model_router',
+    'get_routing_metrics': '.model_router',
+    'FeedbackCache': '.feedback_cache',
+    'get_feedback_cache_metrics': '.feedback_cache',
+    'JobQueue': '.job_queue',
+    'AudioExecutor': '.audio_executor',
+    'get_audio_executor': '.audio_executor',
+    'get_audio_executor_metrics': '.audio_executor',
+    'get_job_queue_metrics': '.analysis_jobs',
+    'compare_to_reference': '.reference_compare',
+    'get_playback_review': '.playback_review',
+}
+
+__all__ = list(_EXPORTS)
+
+__getattr__ = lazy_getattr(__name__, _EXPORTS, globals())
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
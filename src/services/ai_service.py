@@ -1,106 +1,229 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from openai import OpenAI
+from openai import OpenAI, APIConnectionError, APITimeoutError
+from concurrent.futures import ThreadPoolExecutor
+import json
 import os
+import re
+import time
 from dotenv import load_dotenv
 import httpx
 import logging
 from ..config.i18n import get_text
 from ..utils.logger import setup_logger
+from .single_flight import coalesced
+from .resilience import get_policy, policy_from_env
+from .hedging import HedgeCancelled, get_hedger
+from .word_guide_store import format_word_guide, get_word_guide_store
+from .lexicon import format_lexicon_guide, get_lexicon
+from .alignment import align_words, compact_diff
+from .prompt_builder import (
+    build_feedback_prompt, build_phonetic_guide_prompt, build_word_guide_batch_prompt,
+    build_word_guide_prompt, count_tokens, get_prompt_stats
+)
+from .model_router import get_model_router, should_fall_back
+from .feedback_cache import get_feedback_cache
+from ..utils.text import unique_words
 
 logger = setup_logger(__name__)
 
 load_dotenv()
 
+# Words per batched word-guide request, small enough to keep each reply well-formed
+WORD_GUIDE_CHUNK_SIZE = 40
+
+def _parse_json_object(content):
+    """Parse the first JSON object in a model reply, tolerating code fences"""
+    match = re.search(r"\{.*\}", content or '', re.DOTALL)
+    if not match:
+        raise ValueError("No JSON object in response")
+    return json.loads(match.group(0))
+
+def _openai_policy():
+    return policy_from_env('openai', 'OPENAI', retry_on=(APITimeoutError, APIConnectionError))
+
 class AIService:
-    def __init__(self, http_client=None):
+    def __init__(self, http_client=None, base_url=None, resilience=None, hedging=None, router=None,
+                 feedback_cache=None):
+        """
+        Args:
+            http_client: httpx client, a default one without proxies if omitted
+            base_url: API base URL (default OPENAI_BASE_URL or the OpenAI API)
+            resilience: ResiliencePolicy, default the process-wide 'openai' policy
+            hedging: Hedge slow feedback requests (default OPENAI_HEDGING)
+            router: ModelRouter, default the process-wide router
+            feedback_cache: FeedbackCache, default the process-wide cache
+        """
         # If no http_client is provided, create a default one without proxies
         if http_client is None:
             http_client = httpx.Client()
         
+        # Retries are handled by the resilience policy, not the SDK
         self.client = OpenAI(
             api_key=os.getenv('OPENAI_API_KEY'),
-            http_client=http_client
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=0
         )
+        self.resilience = resilience or get_policy('openai', _openai_policy)
+        if hedging is None:
+            hedging = os.getenv('OPENAI_HEDGING', '').lower() in ('1', 'true', 'yes')
+        self.hedging = hedging
+        self.hedge_fallback_model = os.getenv('OPENAI_HEDGE_FALLBACK_MODEL') or None
+        self.router = router or get_model_router()
+        self.feedback_cache = feedback_cache or get_feedback_cache()
+
+    @property
+    def single_flight_scope(self):
+        """What decides the upstream request besides the arguments, see coalesced()"""
+        return [str(self.client.base_url), id(self.resilience), id(self.router), id(self.feedback_cache),
+                self.hedging, self.hedge_fallback_model]
 
-    def get_pronunciation_feedback(self, text, recorded_text, language='english', azure_details=None):
-        """Get AI feedback on pronunciation using OpenAI
+    def _complete(self, prompt, model=None, hedge_name=None):
+        """Run a chat completion through the rate limiter, retries and circuit breaker
+        
+        The model router picks the models for the prompt's route and size.
+        When a model times out, fails server-side or has its circuit open,
+        the next one in the route's fallback chain is tried. A model with a
+        fallback gets the router's fallback_attempts instead of the full
+        retry budget, and every model has its own circuit breaker.
+        
+        Args:
+            prompt: Prompt dict from prompt_builder (name, messages, prompt_tokens)
+            model: Force a single model instead of routing
+            hedge_name: Hedge this call type when hedging is enabled
+        """
+        route = prompt['name']
+        models = [model] if model else self.router.models_for(route, prompt['prompt_tokens'])
+        for position, candidate in enumerate(models):
+            start_time = time.monotonic()
+            attempts = self.router.fallback_attempts if position + 1 < len(models) else None
+            try:
+                content, usage = self._call_model(prompt, candidate, hedge_name, attempts)
+            except Exception as e:
+                self.router.record(route, candidate, time.monotonic() - start_time, error=True)
+                if position + 1 < len(models) and should_fall_back(e):
+                    logger.warning(f"[{route}] {candidate} failed ({e}), falling back to {models[position + 1]}")
+                    continue
+                raise
+            
+            prompt_tokens = getattr(usage, 'prompt_tokens', None) or prompt['prompt_tokens']
+            completion_tokens = getattr(usage, 'completion_tokens', None) or count_tokens(content)
+            self.router.record(route, candidate, time.monotonic() - start_time, prompt_tokens,
+                               completion_tokens, fallback=position > 0)
+            self._record_prompt_tokens(prompt, usage)
+            return content
+
+    def _call_model(self, prompt, model, hedge_name=None, attempts=None):
+        """One completion on one model, returns the content and the reported usage (None when streamed)"""
+        messages = prompt['messages']
+        if hedge_name and self.hedging:
+            fallback_model = self.hedge_fallback_model or model
+            content = get_hedger(hedge_name).run(
+                lambda attempt: self._stream_completion(attempt, messages, model, prompt['name'], attempts),
+                lambda attempt: self._stream_completion(attempt, messages, fallback_model, prompt['name'],
+                                                        attempts)
+            )
+            # Streamed replies carry no usage, token counts are estimated
+            return content, None
+        
+        response = self.resilience.call(
+            self.client.chat.completions.create,
+            model=model,
+            messages=messages,
+            latency_kind=(prompt['name'], model),
+            circuit=model,
+            max_attempts=attempts
+        )
+        return response.choices[0].message.content, getattr(response, 'usage', None)
+
+    def _record_prompt_tokens(self, prompt, usage=None):
+        """Log and record the prompt size of one call"""
+        reported = getattr(usage, 'prompt_tokens', None)
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = getattr(details, 'cached_tokens', None)
+        get_prompt_stats().record(prompt['name'], prompt['prompt_tokens'], reported, cached)
+        logger.debug(f"[{prompt['name']}] prompt tokens: estimated {prompt['prompt_tokens']}, "
+                     f"reported {reported if reported is not None else 'n/a'}, "
+                     f"cached {cached if cached is not None else 'n/a'}")
+
+    def _stream_completion(self, attempt, messages, model, route=None, attempts=None):
+        """Stream one hedge attempt, stopping as soon as it has lost the race"""
+        if attempt.cancelled():
+            raise HedgeCancelled()
+        stream = self.resilience.call(
+            self.client.chat.completions.create,
+            model=model,
+            messages=messages,
+            stream=True,
+            latency_kind=(route, model, 'stream'),
+            circuit=model,
+            max_attempts=attempts
+        )
+        parts = []
+        try:
+            for chunk in stream:
+                if attempt.cancelled():
+                    raise HedgeCancelled()
+                if chunk.choices and chunk.choices[0].delta.content:
+                    attempt.first_token()
+                    attempt.tokens += 1
+                    parts.append(chunk.choices[0].delta.content)
+        finally:
+            # Closing the response aborts the loser's generation server-side
+            stream.response.close()
+        return ''.join(parts)
+
+    @coalesced('openai')
+    def generate_pronunciation_feedback(self, text, recorded_text, language='english', azure_details=None,
+                                        alignment=None, prosody=None):
+        """Get AI feedback on pronunciation using OpenAI, raising when it cannot be generated
+        
+        The prompt carries a compact word diff of the reading instead of both
+        full texts, cut to PROMPT_MAX_INPUT_TOKENS. Readings of the same text
+        with the same mistakes and scores in the same bands share one reply
+        through the feedback cache, so the prompt only gives those bands.
+        Background jobs call this so a failure fails the job and the queue
+        retries it.
         
         Args:
             text (str): Original text
             recorded_text (str): Transcribed speech text
             language (str): Feedback language ('english' or 'chinese')
             azure_details (dict): Additional pronunciation details from Azure
+            alignment (dict): align_words(text, recorded_text), computed if omitted
+            prosody (dict): analyze_prosody() of the recording, summarized in the prompt
+        """
+        logger.debug(f"Generating pronunciation feedback for text length: {len(text)}")
+        
+        if alignment is None:
+            alignment = align_words(text, recorded_text)
+        cache_key = self.feedback_cache.key(text, alignment, language, azure_details, prosody)
+        feedback = self.feedback_cache.get(cache_key)
+        if feedback is not None:
+            logger.debug("Serving cached feedback for an identical reading outcome")
+            return feedback
+        
+        # A cached reply is served to every reading with this key, its prompt holds no more than the key
+        bucket_width = self.feedback_cache.bucket_width if self.feedback_cache.enabled else None
+        prompt = build_feedback_prompt(alignment, compact_diff(alignment), language, azure_details,
+                                       prosody=prosody, bucket_width=bucket_width)
+        feedback = self._complete(prompt, hedge_name='pronunciation_feedback')
+        self.feedback_cache.put(cache_key, feedback)
+        
+        logger.debug("Successfully generated AI feedback")
+        return feedback
+
+    def get_pronunciation_feedback(self, text, recorded_text, language='english', azure_details=None,
+                                   alignment=None, prosody=None):
+        """generate_pronunciation_feedback() for display, an error message instead of raising
+        
+        The message is for the learner only, never store it as feedback.
         """
         try:
-            logger.info(f"Generating pronunciation feedback for text length: {len(text)}")
-            
-            # 根据语言选择系统提示和分析提示
-            system_role = {
-                'english': "You are an expert English pronunciation coach. Provide feedback in English.",
-                'chinese': "你是一位专业的英语发音教练。请用中文提供反馈。"
-            }.get(language, "You are an expert English pronunciation coach.")
-
-            analysis_prompt = {
-                'english': f"""
-                    Compare the original text and the transcribed speech, then provide feedback:
-                    Original text: {text}
-                    Transcribed speech: {recorded_text}
-                    
-                    Please analyze:
-                    1. Pronunciation accuracy
-                    2. Common mistakes
-                    3. Specific improvement suggestions
-                    4. Phonetic tips for difficult words
-                    """,
-                'chinese': f"""
-                    请对比原文和语音识别结果，并提供发音反馈：
-                    原文：{text}
-                    识别结果：{recorded_text}
-                    
-                    请分析以下几点：
-                    1. 发音准确度
-                    2. 常见错误
-                    3. 具体改进建议
-                    4. 难词的发音技巧
-                    """
-            }.get(language, "")
-
-            # 如果有Azure详细信息，添加到提示中
-            if azure_details:
-                score_info = {
-                    'english': f"""
-                        Additional pronunciation scores:
-                        - Overall pronunciation score: {azure_details.get('pronunciation_score', 'N/A')}
-                        - Accuracy score: {azure_details.get('accuracy_score', 'N/A')}
-                        - Fluency score: {azure_details.get('fluency_score', 'N/A')}
-                        - Completeness score: {azure_details.get('completeness_score', 'N/A')}
-                        
-                        Please incorporate these scores in your feedback.
-                        """,
-                    'chinese': f"""
-                        额外的发音评分：
-                        - 总体发音得分：{azure_details.get('pronunciation_score', 'N/A')}
-                        - 准确性得分：{azure_details.get('accuracy_score', 'N/A')}
-                        - 流畅度得分：{azure_details.get('fluency_score', 'N/A')}
-                        - 完整度得分：{azure_details.get('completeness_score', 'N/A')}
-                        
-                        请将这些分数纳入你的反馈中。
-                        """
-                }.get(language, "")
-                analysis_prompt += score_info
-
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_role},
-                    {"role": "user", "content": analysis_prompt}
-                ]
-            )
-            
-            logger.info("Successfully generated AI feedback")
-            return response.choices[0].message.content
+            return self.generate_pronunciation_feedback(text, recorded_text, language, azure_details,
+                                                        alignment, prosody)
         except Exception as e:
             logger.error(f"Error generating feedback: {str(e)}", exc_info=True)
             error_msg = {
@@ -109,62 +232,88 @@ class AIService:
             }.get(language, str(e))
             return error_msg
 
+    @coalesced('openai')
     def get_phonetic_guide(self, text):
         """Get phonetic guidance for the text"""
         try:
-            prompt = f"""
-            Please provide phonetic guidance for the following text:
-            {text}
-            
-            Focus on:
-            1. Stress patterns
-            2. Difficult sounds
-            3. Word linking
-            4. Natural rhythm
-            Include IPA symbols where helpful.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert in English phonetics and pronunciation."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            return response.choices[0].message.content
+            return self._complete(build_phonetic_guide_prompt(text))
         except Exception as e:
-             
             return f"Error generating phonetic guide: {str(e)}"
 
-    def get_word_pronunciation_guide(self, word, language='english'):
+    @coalesced('openai')
+    def prepare_word_guides(self, text, language='english'):
+        """Fetch structured guides for every word of a text in a few batched calls
+        
+        Words are deduplicated and only words missing from the word guide
+        store are requested, WORD_GUIDE_CHUNK_SIZE per call. Later
+        get_word_pronunciation_guide lookups on the text are served locally.
+        
+        Args:
+            text (str): Practice text
+            language (str): Language of the tips ('english' or 'chinese')
+        
+        Returns:
+            dict: Normalized word -> guide dict (ipa, syllables, stress, tips),
+                None for words left to the offline lexicon
+        """
+        store = get_word_guide_store()
+        words = unique_words(text)
+        if store.is_prepared(text, language):
+            return store.get_many(words, language)
+        
+        # Dictionary words are answered by the offline lexicon
+        lexicon = get_lexicon()
+        missing = [word for word in store.missing(words, language) if word not in lexicon]
+        chunks = [missing[i:i + WORD_GUIDE_CHUNK_SIZE] for i in range(0, len(missing), WORD_GUIDE_CHUNK_SIZE)]
+        logger.info(f"Preparing word guides: {len(words)} words, {len(missing)} missing, {len(chunks)} calls")
+        
+        failed = False
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(len(chunks), 4)) as executor:
+                for guides in executor.map(lambda chunk: self._fetch_word_guides(chunk, language), chunks):
+                    if guides is None:
+                        failed = True
+                    else:
+                        store.put_many(guides, language)
+        
+        guides = store.get_many(words, language)
+        # A failed chunk is retried on the next lookup
+        if not failed:
+            store.mark_prepared(text, language, [word for word, guide in guides.items() if guide])
+        return guides
+
+    def _fetch_word_guides(self, words, language):
+        """Request guides for one chunk of words, None on failure"""
+        try:
+            content = self._complete(build_word_guide_batch_prompt(words, language))
+            guides = _parse_json_object(content).get('words', [])
+            return [guide for guide in guides if isinstance(guide, dict)]
+        except Exception as e:
+            logger.error(f"Error fetching word guides: {str(e)}", exc_info=True)
+            return None
+
+    @coalesced('openai')
+    def get_word_pronunciation_guide(self, word, language='english', detailed=False):
         """Get pronunciation guide for a specific word
         
+        Dictionary words are answered from the offline lexicon and words
+        prepared by prepare_word_guides from the store. Only unknown words,
+        or detailed=True, go to the LLM.
+        
         Args:
             word (str): The word to analyze
+            detailed (bool): Ask the LLM for the full explanation
         """
-        try:
-            prompt = f"""
-            Please provide a detailed pronunciation guide for the word: "{word}"
-            
-            Include:
-            1. IPA transcription
-            2. Syllable breakdown
-            3. Stress pattern
-            4. Common pronunciation mistakes
-            5. Similar sounding words
-            6. Example sentences
-            
-            Format the response in markdown.
-            """
+        if not detailed:
+            descriptions = get_lexicon().describe(word)
+            if descriptions:
+                return format_lexicon_guide(descriptions, language)
             
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert in English pronunciation and phonetics."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response.choices[0].message.content
+            guide = get_word_guide_store().get(word, language)
+            if guide:
+                return format_word_guide(guide, language)
+        
+        try:
+            return self._complete(build_word_guide_prompt(word))
         except Exception as e:
             return get_text('guide_error', language, error=str(e))
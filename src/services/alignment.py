@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+from typing import Dict, List
+
+import numpy as np
+
+from ..utils.text import normalize_word, tokenize_words
+
+# Operation codes in the backpointer matrix
+_DIAGONAL, _OMISSION, _INSERTION = 0, 1, 2
+
+
+def align_words(reference: str, spoken: str) -> Dict:
+    """Word-level edit-distance alignment of a transcription against its reference
+
+    Each DP row is computed with NumPy: the diagonal and vertical moves are
+    elementwise, and the horizontal (insertion) chain is resolved with a
+    running minimum, so only the row loop runs in Python. Backpointers take
+    one byte per cell.
+
+    Args:
+        reference: Text the learner was asked to read
+        spoken: Transcription of what was recognized
+
+    Returns:
+        dict with the list of operations (correct, substitution, omission,
+        insertion), their counts, word_error_rate and a local accuracy (0-100)
+    """
+    ref_words = tokenize_words(reference)
+    hyp_words = tokenize_words(spoken)
+    ref_norm = [normalize_word(word) for word in ref_words]
+    hyp_norm = np.array([normalize_word(word) for word in hyp_words], dtype=object)
+
+    n, m = len(ref_words), len(hyp_words)
+    # Costs are edits * weight, plus one per substitution. Among alignments
+    # with the fewest edits this picks the one with the fewest substitutions,
+    # so "the lazy dog" vs "lazy dog dog" reads as [-the] ... [+dog] instead
+    # of a chain of shifted substitutions.
+    weight = n + m + 1
+    steps = np.arange(m + 1) * weight
+    backpointers = np.empty((n + 1, m + 1), dtype=np.uint8)
+    backpointers[0, :] = _INSERTION
+    backpointers[:, 0] = _OMISSION
+
+    previous = steps.astype(np.int64)
+    for i in range(1, n + 1):
+        mismatch = (hyp_norm != ref_norm[i - 1]).astype(np.int64) if m else np.empty(0, dtype=np.int64)
+        diagonal = previous[:-1] + mismatch * (weight + 1)
+        vertical = previous[1:] + weight
+        best = np.minimum(diagonal, vertical)
+        # Ties go to the gap: backtracking runs from the end, so gaps land as
+        # late as possible and a repeated word reads as the extra second one
+        ops = np.where(vertical <= diagonal, _OMISSION, _DIAGONAL).astype(np.uint8)
+
+        # current[j] = min(best[j], current[j - 1] + weight), solved as a running min of best - j * weight
+        candidate = np.concatenate(([i * weight], best))
+        current = np.minimum.accumulate(candidate - steps) + steps
+        ops[current[:-1] + weight <= best] = _INSERTION
+
+        backpointers[i, 1:] = ops
+        previous = current
+
+    operations = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        op = backpointers[i, j] if i and j else (_OMISSION if i else _INSERTION)
+        if op == _DIAGONAL:
+            kind = 'correct' if ref_norm[i - 1] == normalize_word(hyp_words[j - 1]) else 'substitution'
+            operations.append({'type': kind, 'reference': ref_words[i - 1], 'spoken': hyp_words[j - 1], 'index': i - 1})
+            i, j = i - 1, j - 1
+        elif op == _OMISSION:
+            operations.append({'type': 'omission', 'reference': ref_words[i - 1], 'spoken': None, 'index': i - 1})
+            i -= 1
+        else:
+            operations.append({'type': 'insertion', 'reference': None, 'spoken': hyp_words[j - 1], 'index': i})
+            j -= 1
+    operations.reverse()
+
+    counts = {kind: 0 for kind in ('correct', 'substitution', 'omission', 'insertion')}
+    for operation in operations:
+        counts[operation['type']] += 1
+    errors = counts['substitution'] + counts['omission'] + counts['insertion']
+
+    return {
+        'operations': operations,
+        'reference_words': n,
+        'spoken_words': m,
+        'correct': counts['correct'],
+        'substitutions': counts['substitution'],
+        'omissions': counts['omission'],
+        'insertions': counts['insertion'],
+        'word_error_rate': errors / n if n else float(m > 0),
+        'accuracy': 100.0 * counts['correct'] / max(n, m) if max(n, m) else 100.0,
+    }
+
+
+def compact_diff(alignment: Dict, context: int = 1) -> str:
+    """Render only the mistakes of an alignment, with a few words of context
+
+    Substitutions read ``[ref→spoken]``, omissions ``[-ref]`` and insertions
+    ``[+spoken]``. Runs of correct words beyond the context are elided.
+
+    Returns:
+        The compact diff, or an empty string when every word was correct
+    """
+    operations = alignment['operations']
+    keep = set()
+    for position, operation in enumerate(operations):
+        if operation['type'] != 'correct':
+            keep.update(range(position - context, position + context + 1))
+    if not keep:
+        return ''
+
+    parts: List[str] = []
+    elided = False
+    for position, operation in enumerate(operations):
+        if position not in keep:
+            if not elided:
+                parts.append('…')
+                elided = True
+            continue
+        elided = False
+        kind = operation['type']
+        if kind == 'correct':
+            parts.append(operation['reference'])
+        elif kind == 'substitution':
+            parts.append(f"[{operation['reference']}→{operation['spoken']}]")
+        elif kind == 'omission':
+            parts.append(f"[-{operation['reference']}]")
+        else:
+            parts.append(f"[+{operation['spoken']}]")
+    return ' '.join(parts)
+
+
+def diff_signature(alignment: Dict) -> str:
+    """Stable hash of the mistakes of an alignment
+
+    Only the normalized words of substitutions, omissions and insertions and
+    their reference positions count, so casing and punctuation of the
+    transcription do not change it. Perfect readings all share one signature.
+    """
+    mistakes = [
+        f"{operation['type'][0]}:{operation['index']}:"
+        f"{normalize_word(operation['reference'] or '')}:{normalize_word(operation['spoken'] or '')}"
+        for operation in alignment['operations'] if operation['type'] != 'correct'
+    ]
+    return hashlib.sha256('\n'.join(mistakes).encode('utf-8')).hexdigest()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Pronunciation analysis and feedback as durable background jobs.
+
+AnalysisComponent submits a job and polls it, so the Azure assessment and the
+LLM feedback keep running across Streamlit reruns and browser refreshes.
+Results of readings of a saved practice text are persisted to PracticeSession
+when the job completes. Worker threads start in the app process (JOB_WORKERS,
+0 to disable); more workers can run as separate processes on the same
+database with:
+
+    python -m src.services.analysis_jobs worker [--threads 2]
+
+The results of persisted jobs name the practice text they changed, so the
+app process can drop its cached reads of it when it sees the job finish.
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from ..utils.dsp import analyze_prosody
+from ..utils.lazy import LazyService
+from ..utils.logger import setup_logger
+from .alignment import align_words
+from .audio_executor import get_audio_executor
+from .db_service import DBService
+from .job_queue import JobQueue
+from .reference_compare import compare_to_reference
+
+logger = setup_logger(__name__)
+
+load_dotenv()
+
+ANALYSIS = 'pronunciation_analysis'
+FEEDBACK = 'pronunciation_feedback'
+
+# Built by the first job a worker runs, not by the app's own services
+_speech_service = LazyService('src.services.speech_service', 'SpeechService')
+_ai_service = LazyService('src.services.ai_service', 'AIService')
+
+
+def job_key(kind: str, payload: Dict) -> str:
+    """Idempotency key of a job: the same work always maps to the same key"""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return f"{kind}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+def measure_prosody(audio_file: str) -> Optional[Dict]:
+    """analyze_prosody() of a recording in the audio process pool, None if it fails
+
+    Prosody only adds context to the feedback, it never fails an analysis.
+    """
+    # soundfile stays out of the app's startup imports
+    from .audio_encoding import load_mono
+
+    try:
+        samples, sample_rate = load_mono(audio_file)
+        return get_audio_executor().run(analyze_prosody, samples, sample_rate)
+    except Exception as e:
+        logger.error(f"Prosody analysis failed: {str(e)}", exc_info=True)
+        return None
+
+
+def measure_reference_distance(audio_file: str, text: str, speech_service=_speech_service) -> Optional[Dict]:
+    """compare_to_reference() of a recording, None if disabled or it fails"""
+    if os.getenv('REFERENCE_COMPARISON', '1') == '0' or not text:
+        return None
+    try:
+        return compare_to_reference(audio_file, text, speech_service)
+    except Exception as e:
+        logger.error(f"Reference comparison failed: {str(e)}", exc_info=True)
+        return None
+
+
+def analyze(payload: Dict, speech_service=_speech_service) -> Dict:
+    """Azure pronunciation assessment, local word diff, prosody and reference distance of a recording"""
+    pronunciation = speech_service.analyze_pronunciation(payload['audio_file'], payload['text'])
+    return {
+        'pronunciation': pronunciation,
+        'alignment': align_words(payload['text'], pronunciation.get('transcribed_text', '')),
+        'prosody': measure_prosody(payload['audio_file']),
+        'reference': measure_reference_distance(payload['audio_file'], payload['text'], speech_service),
+    }
+
+
+def persist_analysis(db: Session, job: Dict, result: Dict) -> Optional[Dict]:
+    """Save the reading as a PracticeSession of its practice text, if it has one"""
+    payload = job['payload']
+    if not payload.get('practice_text_id'):
+        return None
+    scores = result['pronunciation']
+    practice_session = DBService(db).create_practice_session(
+        practice_text_id=payload['practice_text_id'],
+        audio_file_path=payload['audio_file'],
+        transcribed_text=scores.get('transcribed_text', ''),
+        pronunciation_score=scores.get('pronunciation_score'),
+        feedback=None,
+        accuracy_score=scores.get('accuracy_score'),
+        fluency_score=scores.get('fluency_score'),
+        completeness_score=scores.get('completeness_score'),
+        prosody=result.get('prosody')
+    )
+    return {'practice_session_id': practice_session.id, 'practice_text_id': payload['practice_text_id']}
+
+
+def feedback(payload: Dict, ai_service=_ai_service) -> Dict:
+    """LLM feedback on an analyzed reading, raising on failure so the job is retried"""
+    return {
+        'feedback': ai_service.generate_pronunciation_feedback(
+            payload['text'],
+            payload['transcribed_text'],
+            language=payload.get('language', 'english'),
+            azure_details=payload.get('azure_details'),
+            alignment=payload.get('alignment'),
+            prosody=payload.get('prosody')
+        )
+    }
+
+
+def persist_feedback(db: Session, job: Dict, result: Dict) -> Optional[Dict]:
+    """Attach the feedback to the reading's PracticeSession, if it was saved"""
+    session_id = job['payload'].get('practice_session_id')
+    if not session_id:
+        return None
+    db_service = DBService(db)
+    if not db_service.update_practice_session_feedback(session_id, result['feedback']):
+        return None
+    return {'practice_text_id': db_service.get_practice_session(session_id).practice_text_id}
+
+
+def build_queue(speech_service=None, ai_service=None) -> JobQueue:
+    """JobQueue with the analysis handlers, configured from JOB_*
+
+    Args:
+        speech_service: SpeechService the handlers use, default one built by the first job
+        ai_service: AIService the handlers use, default one built by the first job
+    """
+    queue = JobQueue(
+        visibility_timeout=float(os.getenv('JOB_VISIBILITY_TIMEOUT', 300)),
+        max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3)),
+        retry_backoff=float(os.getenv('JOB_RETRY_BACKOFF', 5)),
+    )
+    queue.register(ANALYSIS, functools.partial(analyze, speech_service=speech_service or _speech_service),
+                   persist_analysis)
+    queue.register(FEEDBACK, functools.partial(feedback, ai_service=ai_service or _ai_service),
+                   persist_feedback)
+    return queue
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_analysis_queue() -> JobQueue:
+    """Return the process-wide analysis queue, starting JOB_WORKERS worker threads"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = build_queue()
+            workers = int(os.getenv('JOB_WORKERS', 2))
+            if workers > 0:
+                _queue.start(workers)
+        return _queue
+
+
+def submit_analysis(audio_file: str, text: str, practice_text_id: Optional[int] = None) -> Dict:
+    """Queue the analysis of a recording, or return the job already analyzing it"""
+    payload = {'audio_file': audio_file, 'text': text, 'practice_text_id': practice_text_id}
+    return get_analysis_queue().submit(ANALYSIS, payload, job_key(ANALYSIS, payload))
+
+
+def submit_feedback(text: str, transcribed_text: str, language: str = 'english',
+                    azure_details: Optional[Dict] = None, alignment: Optional[Dict] = None,
+                    practice_session_id: Optional[int] = None, prosody: Optional[Dict] = None) -> Dict:
+    """Queue feedback on an analyzed reading, or return the job already writing it"""
+    payload = {
+        'text': text,
+        'transcribed_text': transcribed_text,
+        'language': language,
+        'azure_details': azure_details,
+        'alignment': alignment,
+        'prosody': prosody,
+        'practice_session_id': practice_session_id,
+    }
+    return get_analysis_queue().submit(FEEDBACK, payload, job_key(FEEDBACK, payload))
+
+
+def get_job_queue_metrics() -> Dict[str, Any]:
+    """Return depth and latency metrics of the analysis queue"""
+    return get_analysis_queue().get_metrics()
+
+
+if __name__ == '__main__':
+    from ..models.base import init_db
+
+    parser = argparse.ArgumentParser(description="Run analysis job workers")
+    parser.add_argument('command', choices=['worker'])
+    parser.add_argument('--threads', type=int, default=2)
+    args = parser.parse_args()
+
+    init_db()
+    queue = build_queue()
+    queue.start(args.threads)
+    print(f"Running {args.threads} analysis workers, Ctrl-C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        queue.stop(timeout=10)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import time
+from typing import Tuple
+
+import numpy as np
+import soundfile as sf
+
+from .audio_executor import get_audio_executor
+
+# Formats accepted by SpeechService.analyze_pronunciation(upload_format=...)
+UPLOAD_FORMATS = ('wav', 'flac', 'ogg_opus')
+
+# Azure recognizes speech at 16 kHz, anything above is uploaded for nothing
+UPLOAD_SAMPLE_RATE = 16000
+
+
+def resample(audio_data: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Resample mono audio by linear interpolation
+
+    Good enough for speech recognition input, not meant for playback.
+    """
+    if src_rate == dst_rate or len(audio_data) == 0:
+        return audio_data
+    duration = len(audio_data) / src_rate
+    dst_length = max(int(round(duration * dst_rate)), 1)
+    src_times = np.arange(len(audio_data)) / src_rate
+    dst_times = np.arange(dst_length) / dst_rate
+    return np.interp(dst_times, src_times, audio_data).astype(audio_data.dtype)
+
+
+def encode_samples(audio_data: np.ndarray, sample_rate: int, format: str = 'FLAC',
+                   subtype: str = 'PCM_16') -> bytes:
+    """Encode samples to an in-memory audio file, e.g. as an AudioExecutor task"""
+    buffer = io.BytesIO()
+    sf.write(buffer, audio_data, sample_rate, format=format, subtype=subtype)
+    return buffer.getvalue()
+
+
+def resample_and_encode(audio_data: np.ndarray, sample_rate: int, upload_format: str) -> bytes:
+    """Resample mono samples to UPLOAD_SAMPLE_RATE and encode them as FLAC or Ogg Opus"""
+    audio_data = resample(audio_data, sample_rate, UPLOAD_SAMPLE_RATE)
+    if upload_format == 'flac':
+        return encode_samples(audio_data, UPLOAD_SAMPLE_RATE, 'FLAC', 'PCM_16')
+    return encode_samples(audio_data, UPLOAD_SAMPLE_RATE, 'OGG', 'OPUS')
+
+
+def load_mono(audio_file: str) -> Tuple[np.ndarray, int]:
+    """Read an audio file as mono float32 samples"""
+    audio_data, sample_rate = sf.read(audio_file, dtype='float32', always_2d=True)
+    return audio_data.mean(axis=1), sample_rate
+
+
+def encode_for_upload(audio_file: str, upload_format: str) -> Tuple[bytes, float]:
+    """Encode a recording for upload to Azure
+
+    Args:
+        audio_file: Recording path (WAV or FLAC from the audio store)
+        upload_format: One of UPLOAD_FORMATS
+
+    Returns:
+        (encoded bytes, encode time in seconds)
+    """
+    if upload_format not in UPLOAD_FORMATS:
+        raise ValueError(f"Unsupported upload format: {upload_format}")
+
+    start_time = time.perf_counter()
+
+    # Already FLAC at the upload rate, send it untouched
+    if upload_format == 'flac' and audio_file.lower().endswith('.flac'):
+        info = sf.info(audio_file)
+        passthrough = info.samplerate == UPLOAD_SAMPLE_RATE and info.channels == 1
+    else:
+        passthrough = False
+    if passthrough:
+        with open(audio_file, 'rb') as f:
+            data = f.read()
+        return data, time.perf_counter() - start_time
+
+    if upload_format == 'wav':
+        if audio_file.lower().endswith('.wav'):
+            with open(audio_file, 'rb') as f:
+                data = f.read()
+            return data, time.perf_counter() - start_time
+        audio_data, sample_rate = sf.read(audio_file, dtype='int16')
+        buffer = io.BytesIO()
+        sf.write(buffer, audio_data, sample_rate, format='WAV', subtype='PCM_16')
+        return buffer.getvalue(), time.perf_counter() - start_time
+
+    # Resampling and encoding hold the GIL, run them in the audio process pool
+    audio_data, sample_rate = load_mono(audio_file)
+    data = get_audio_executor().run(resample_and_encode, audio_data, sample_rate, upload_format)
+    return data, time.perf_counter() - start_time
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Process pool for CPU-bound audio work.
+
+Resampling and encoding hold the GIL for most of their run, so on the
+Streamlit script thread or a job worker thread they stall every other
+session of the server. AudioExecutor runs them in worker processes instead.
+
+Sample buffers travel through multiprocessing.shared_memory: the caller
+copies the input array into a shared block once and the worker maps it
+without unpickling. Array results of at least SHM_MIN_BYTES come back the
+same way, anything else (encoded bytes, small arrays, scalars) is pickled.
+Task functions must be importable module-level functions taking the
+samples as their first argument.
+
+At most max_pending tasks are in flight. Further submits wait for a free
+slot, or raise ExecutorBusy when the wait times out, so a burst of sessions
+queues up instead of piling copies of their recordings into memory.
+
+A worker process that dies (killed by the OOM killer, a crash in native
+code) breaks the whole pool. The broken pool is then replaced and the
+tasks it lost are run once more on the new one.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from ..utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+load_dotenv()
+
+# Smaller array results are cheaper to pickle than to map
+SHM_MIN_BYTES = 64 * 1024
+
+# (shared memory name, shape, dtype)
+ArraySpec = Tuple[str, Tuple[int, ...], str]
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when no task slot frees up within the submit timeout"""
+
+
+def _to_shared(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, ArraySpec]:
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _from_shared(spec: ArraySpec, unlink: bool = False) -> np.ndarray:
+    """Copy an array out of a shared block"""
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf).copy()
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _run_in_worker(fn: Callable, spec: ArraySpec, args: tuple, kwargs: dict) -> Tuple[Any, bool, float, float]:
+    """Worker side of a task: map the input, run fn, share a large array result
+
+    Returns:
+        (result or its ArraySpec, whether it is shared, start wall time, run seconds)
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        samples = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        samples.flags.writeable = False
+        result = fn(samples, *args, **kwargs)
+        if isinstance(result, np.ndarray):
+            # A view of the input must not outlive the mapping
+            result = np.array(result, copy=True) if np.shares_memory(result, samples) else result
+        del samples
+    finally:
+        block.close()
+    shared = isinstance(result, np.ndarray) and result.nbytes >= SHM_MIN_BYTES
+    if shared:
+        out, result = _to_shared(result)
+        out.close()
+    return result, shared, started_at, time.perf_counter() - start
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+
+class AudioExecutor:
+    """Process pool running audio tasks on shared-memory sample buffers
+
+    Args:
+        max_workers: Worker processes, 0 to run tasks inline on the calling thread
+            (default: one per core but one, which is left to the Streamlit server)
+        max_pending: Tasks in flight before submit blocks (default: 2 per worker)
+        start_method: multiprocessing start method (default forkserver where
+            available, so workers never inherit Streamlit's threads)
+        window: Timings kept per task name for the percentiles
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 start_method: Optional[str] = None, window: int = 500):
+        self.max_workers = max((os.cpu_count() or 1) - 1, 0) if max_workers is None else max_workers
+        self.max_pending = max_pending or max(self.max_workers, 1) * 2
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._window = window
+        self._timings: Dict[str, Dict[str, deque]] = {}
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'in_flight': 0,
+                          'pool_restarts': 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.max_workers,
+                                                 mp_context=multiprocessing.get_context(self.start_method))
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool so the next task starts a new one"""
+        with self._pool_lock:
+            if self._pool is not pool:
+                # Another task already replaced it
+                return
+            self._pool = None
+        logger.warning("Audio worker process died, restarting the pool")
+        # Never wait here, this can run on the broken pool's own management thread
+        pool.shutdown(wait=False)
+        with self._lock:
+            self._counters['pool_restarts'] += 1
+
+    def _submit_to_pool(self, *task) -> Tuple[ProcessPoolExecutor, Future]:
+        """Submit _run_in_worker(*task), on a new pool if the current one is broken"""
+        pool = self._get_pool()
+        try:
+            return pool, pool.submit(_run_in_worker, *task)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            pool = self._get_pool()
+            return pool, pool.submit(_run_in_worker, *task)
+
+    def _record(self, name: str, **timings: float):
+        with self._lock:
+            series = self._timings.setdefault(name, {})
+            for key, value in timings.items():
+                series.setdefault(key, deque(maxlen=self._window)).append(value)
+
+    def _finish(self, outcome: str):
+        with self._lock:
+            self._counters[outcome] += 1
+            self._counters['in_flight'] -= 1
+        self._slots.release()
+
+    def submit(self, fn: Callable, samples: np.ndarray, *args, timeout: Optional[float] = None,
+               **kwargs) -> Future:
+        """Run fn(samples, *args, **kwargs) in a worker process
+
+        Args:
+            fn: Module-level function, samples as its first argument
+            samples: NumPy array shared with the worker
+            timeout: Seconds to wait for a free slot, None to wait as long as needed
+
+        Raises:
+            ExecutorBusy: No slot freed up within timeout
+        """
+        name = getattr(fn, '__qualname__', repr(fn))
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise ExecutorBusy(f"{self.max_pending} audio tasks already in flight")
+        with self._lock:
+            self._counters['submitted'] += 1
+            self._counters['in_flight'] += 1
+
+        future: Future = Future()
+        submitted_at = time.time()
+        if self.max_workers == 0:
+            start = time.perf_counter()
+            try:
+                future.set_result(fn(samples, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            elapsed = time.perf_counter() - start
+            self._record(name, run=elapsed, wait=0.0, total=elapsed)
+            self._finish('failed' if future.exception() else 'completed')
+            return future
+
+        block = None
+        try:
+            block, spec = _to_shared(samples)
+            queued_at = time.time()
+            pool, inner = self._submit_to_pool(fn, spec, args, kwargs)
+        except Exception:
+            if block is not None:
+                block.close()
+                block.unlink()
+            self._finish('failed')
+            raise
+
+        def done(inner_future: Future, pool: ProcessPoolExecutor, retried: bool = False):
+            if isinstance(inner_future.exception(), BrokenProcessPool) and not retried:
+                # The input block is still there, run the task once more on a new pool
+                self._discard_pool(pool)
+                try:
+                    retry_pool, retry = self._submit_to_pool(fn, spec, args, kwargs)
+                except Exception as e:
+                    inner_future = Future()
+                    inner_future.set_exception(e)
+                else:
+                    retry.add_done_callback(lambda retry_future: done(retry_future, retry_pool, True))
+                    return
+            
+            # The worker has unmapped the input, it can go
+            block.close()
+            block.unlink()
+            try:
+                result, shared, started_at, run_seconds = inner_future.result()
+                if shared:
+                    result = _from_shared(result, unlink=True)
+            except Exception as e:
+                self._finish('failed')
+                future.set_exception(e)
+                return
+            self._record(name, run=run_seconds, wait=max(started_at - queued_at, 0.0),
+                         total=time.time() - submitted_at)
+            self._finish('completed')
+            future.set_result(result)
+
+        inner.add_done_callback(lambda inner_future: done(inner_future, pool))
+        return future
+
+    def run(self, fn: Callable, samples: np.ndarray, *args, **kwargs) -> Any:
+        """Submit a task and wait for its result"""
+        return self.submit(fn, samples, *args, **kwargs).result()
+
+    def shutdown(self, wait: bool = True):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Task counts and, per task function, wait/run/total time percentiles in seconds
+
+        wait is the time a task spent queued for a worker process, run its
+        time inside the worker, total the whole call including buffer transfer.
+        """
+        with self._lock:
+            metrics: Dict[str, Any] = dict(self._counters)
+            snapshot = {name: {key: list(values) for key, values in series.items()}
+                        for name, series in self._timings.items()}
+        metrics.update(workers=self.max_workers, max_pending=self.max_pending, tasks={})
+        for name, series in snapshot.items():
+            stats = {'count': len(series.get('run', []))}
+            for key, values in series.items():
+                for q in (50, 95):
+                    stats[f'p{q}_{key}'] = _percentile(values, q)
+            metrics['tasks'][name] = stats
+        return metrics
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_audio_executor() -> AudioExecutor:
+    """Return the process-wide audio executor, configured from AUDIO_POOL_*
+
+    Worker processes start on the first task. AUDIO_POOL_WORKERS=0 runs tasks
+    inline, which is also the default on single-core hosts where a pool only
+    adds transfer cost.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = os.getenv('AUDIO_POOL_WORKERS')
+            pending = os.getenv('AUDIO_POOL_MAX_PENDING')
+            _executor = AudioExecutor(
+                max_workers=int(workers) if workers else None,
+                max_pending=int(pending) if pending else None,
+            )
+        return _executor
+
+
+def get_audio_executor_metrics() -> Dict[str, Any]:
+    """Return task counts and timings of the audio process pool"""
+    return get_audio_executor().get_metrics()
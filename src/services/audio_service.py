@@ -1,17 +1,18 @@
 import sounddevice as sd
 import soundfile as sf
 import numpy as np
-import tempfile
 import os
 import time
 import azure.cognitiveservices.speech as speechsdk
+from .audio_store import get_audio_store
 
 class AudioService:
     def __init__(self, 
                  sample_rate=44100, 
                  channels=1, 
                  max_duration=120, 
-                 input_device=None):
+                 input_device=None,
+                 stream_factory=None):
         """
         初始化音频服务
         
@@ -20,10 +21,12 @@ class AudioService:
         - channels: 声道数，默认单声道
         - max_duration: 最大录音时长（秒），默认120秒
         - input_device: 输入设备，默认None（自动选择）
+        - stream_factory: 录音流构造函数，参数同 sd.InputStream，默认 sd.InputStream（压测时替换为合成音频）
         """
         # 录音参数
         self.sample_rate = sample_rate
         self.channels = channels
+        self.stream_factory = stream_factory or sd.InputStream
         self.recording = None
         self.is_recording = False
         self.temp_audio_file = None
@@ -50,7 +53,7 @@ class AudioService:
             self.recording.append(indata.copy())
         
         # 开始录音流
-        self.stream = sd.InputStream(
+        self.stream = self.stream_factory(
             samplerate=self.sample_rate, 
             channels=self.channels,
             callback=audio_callback
@@ -75,10 +78,8 @@ class AudioService:
         if self.recording:
             audio_data = np.concatenate(self.recording, axis=0)
             
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-                self.temp_audio_file = temp_file.name
-                sf.write(self.temp_audio_file, audio_data, self.sample_rate)
+            # 保存到录音存储
+            self.temp_audio_file = get_audio_store().store_array(audio_data, self.sample_rate)
             
             return self.temp_audio_file
         
@@ -114,24 +115,27 @@ class AudioService:
         """
         try:
             # 配置发音评估
-            audio_config = speechsdk.AudioConfig(filename=audio_file)
             pronunciation_config = speechsdk.PronunciationAssessmentConfig(
                 reference_text=reference_text,
                 grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
                 granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme
             )
             
-            # 创建语音识别器
-            speech_recognizer = speechsdk.SpeechRecognizer(
-                speech_config=self.speech_config, 
-                audio_config=audio_config
-            )
-            
-            # 应用发音评估配置
-            pronunciation_config.apply_to(speech_recognizer)
-            
-            # 识别
-            result = speech_recognizer.recognize_once()
+            # Azure 文件输入只支持 WAV，存储中的 FLAC 需先解码
+            with get_audio_store().as_wav(audio_file) as wav_file:
+                audio_config = speechsdk.AudioConfig(filename=wav_file)
+                
+                # 创建语音识别器
+                speech_recognizer = speechsdk.SpeechRecognizer(
+                    speech_config=self.speech_config, 
+                    audio_config=audio_config
+                )
+                
+                # 应用发音评估配置
+                pronunciation_config.apply_to(speech_recognizer)
+                
+                # 识别
+                result = speech_recognizer.recognize_once()
             
             # 处理结果
             if result.reason == speechsdk.ResultReason.RecognizedSpeech:
@@ -160,7 +164,9 @@ class AudioService:
             }
 
     def cleanup(self):
-        """清理临时文件"""
-        if self.temp_audio_file and os.path.exists(self.temp_audio_file):
+        """释放录音引用（文件由录音存储的垃圾回收负责删除）"""
+        store = get_audio_store()
+        if self.temp_audio_file and not store.is_managed(self.temp_audio_file) \
+                and os.path.exists(self.temp_audio_file):
             os.unlink(self.temp_audio_file)
-            self.temp_audio_file = None
\ No newline at end of file
+        self.temp_audio_file = None
\ No newline at end of file
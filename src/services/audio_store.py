@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import numpy as np
+import soundfile as sf
+from dotenv import load_dotenv
+from sqlalchemy import func
+
+from ..models import PracticeSession
+from ..models.base import SessionLocal
+from ..utils.logger import setup_logger
+from .audio_encoding import encode_samples
+from .audio_executor import get_audio_executor
+
+logger = setup_logger(__name__)
+
+load_dotenv()
+
+# Size of the RIFF header soundfile writes for a plain PCM WAV file
+WAV_HEADER_BYTES = 44
+
+
+class AudioStore:
+    """Content-addressed, FLAC-compressed storage for practice recordings
+
+    Recordings are stored as ``<root>/<hash[:2]>/<hash>.flac`` where the hash
+    covers the raw samples and sample rate, so identical takes are stored once.
+    Files are reference-counted against ``practice_sessions.audio_file_path``
+    and a background collector removes orphaned and expired files.
+    """
+
+    def __init__(self, root: Optional[str] = None,
+                 retention_days: Optional[float] = None,
+                 orphan_grace_hours: Optional[float] = None,
+                 gc_interval_minutes: Optional[float] = None):
+        """
+        Args:
+            root: Directory holding the store (AUDIO_STORE_DIR, default ./recordings)
+            retention_days: Delete any recording older than this, referenced or
+                not (AUDIO_RETENTION_DAYS, default: keep forever)
+            orphan_grace_hours: Delete unreferenced recordings older than this
+                (AUDIO_ORPHAN_GRACE_HOURS, default 24)
+            gc_interval_minutes: Background collection period
+                (AUDIO_GC_INTERVAL_MINUTES, default 60)
+        """
+        self.root = os.path.abspath(root or os.getenv('AUDIO_STORE_DIR', './recordings'))
+        if retention_days is None and os.getenv('AUDIO_RETENTION_DAYS'):
+            retention_days = float(os.getenv('AUDIO_RETENTION_DAYS'))
+        self.retention_days = retention_days
+        self.orphan_grace_hours = (orphan_grace_hours if orphan_grace_hours is not None
+                                   else float(os.getenv('AUDIO_ORPHAN_GRACE_HOURS', 24)))
+        self.gc_interval_minutes = (gc_interval_minutes if gc_interval_minutes is not None
+                                    else float(os.getenv('AUDIO_GC_INTERVAL_MINUTES', 60)))
+
+        os.makedirs(self.root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._gc_thread = None
+        self._gc_stop = threading.Event()
+        self._metrics = {
+            'recordings_stored': 0,
+            'dedup_hits': 0,
+            'raw_bytes': 0,
+            'stored_bytes': 0,
+            'bytes_saved_compression': 0,
+            'bytes_saved_dedup': 0,
+            'gc_runs': 0,
+            'gc_deleted_orphaned': 0,
+            'gc_deleted_expired': 0,
+            'gc_bytes_freed': 0,
+        }
+
+    def path_for(self, content_hash: str) -> str:
+        """Return the storage path for a content hash"""
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.flac")
+
+    def is_managed(self, path: Optional[str]) -> bool:
+        """Whether a path points into this store"""
+        if not path:
+            return False
+        return os.path.abspath(path).startswith(self.root + os.sep)
+
+    def store_array(self, audio_data: np.ndarray, sample_rate: int) -> str:
+        """Store recorded samples and return the path of the stored recording
+
+        Args:
+            audio_data: Samples shaped (frames,) or (frames, channels)
+            sample_rate: Sample rate in Hz
+        """
+        audio_data = np.ascontiguousarray(audio_data)
+        channels = 1 if audio_data.ndim == 1 else audio_data.shape[1]
+
+        digest = hashlib.sha256()
+        digest.update(f"{sample_rate}:{channels}:{audio_data.dtype.str}:".encode())
+        digest.update(audio_data.tobytes())
+        content_hash = digest.hexdigest()
+
+        path = self.path_for(content_hash)
+        # Equivalent size of the 16-bit WAV file we used to write to /tmp
+        raw_bytes = len(audio_data) * channels * 2 + WAV_HEADER_BYTES
+
+        if os.path.exists(path):
+            # Refresh mtime so retention counts from the most recent take
+            os.utime(path, None)
+            with self._lock:
+                self._metrics['dedup_hits'] += 1
+                self._metrics['raw_bytes'] += raw_bytes
+                self._metrics['bytes_saved_dedup'] += raw_bytes
+            logger.debug(f"Recording deduplicated: {content_hash[:12]}")
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # FLAC encoding holds the GIL, run it in the audio process pool
+        data = get_audio_executor().run(encode_samples, audio_data, sample_rate, 'FLAC', 'PCM_16')
+        fd, tmp_path = tempfile.mkstemp(suffix='.flac', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(data)
+            # Atomic publish, concurrent writers of the same take converge on one file
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        stored_bytes = os.path.getsize(path)
+        with self._lock:
+            self._metrics['recordings_stored'] += 1
+            self._metrics['raw_bytes'] += raw_bytes
+            self._metrics['stored_bytes'] += stored_bytes
+            self._metrics['bytes_saved_compression'] += max(raw_bytes - stored_bytes, 0)
+
+        logger.debug(f"Recording stored: {content_hash[:12]} ({raw_bytes} -> {stored_bytes} bytes)")
+        return path
+
+    def store_file(self, audio_file: str, remove_source: bool = True) -> str:
+        """Import an existing audio file into the store
+
+        Args:
+            audio_file: Path of any format soundfile can read
+            remove_source: Delete the source file once it is stored
+        """
+        if self.is_managed(audio_file):
+            return os.path.abspath(audio_file)
+
+        audio_data, sample_rate = sf.read(audio_file, dtype='float32')
+        path = self.store_array(audio_data, sample_rate)
+        if remove_source:
+            os.unlink(audio_file)
+        return path
+
+    @contextmanager
+    def as_wav(self, audio_file: str):
+        """Yield a WAV path for consumers that cannot read FLAC
+
+        Non-WAV files are decoded into a temporary file that is removed on exit.
+        """
+        if audio_file.lower().endswith('.wav'):
+            yield audio_file
+            return
+
+        audio_data, sample_rate = sf.read(audio_file, dtype='int16')
+        fd, wav_path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            sf.write(wav_path, audio_data, sample_rate, subtype='PCM_16')
+            yield wav_path
+        finally:
+            os.unlink(wav_path)
+
+    def reference_counts(self) -> Dict[str, int]:
+        """Count practice sessions referencing each stored recording"""
+        # Escaped so '%' or '_' in the root are literal, and the separator keeps out siblings like recordings2
+        prefix = os.path.join(self.root, '')
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(PracticeSession.audio_file_path, func.count(PracticeSession.id))
+                .filter(PracticeSession.audio_file_path.like(f"{pattern}%", escape='\\'))
+                .group_by(PracticeSession.audio_file_path)
+                .all()
+            )
+        finally:
+            db.close()
+        return {os.path.abspath(path): count for path, count in rows
+                if path and os.path.abspath(path).startswith(prefix)}
+
+    def collect_garbage(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Delete orphaned and expired recordings
+
+        A recording is orphaned when no practice session references it and it
+        is older than the orphan grace period. It is expired when a retention
+        period is configured and it is older than that, referenced or not.
+
+        Returns:
+            Counts of deleted files and freed bytes for this run
+        """
+        now = now or time.time()
+        ref_counts = self.reference_counts()
+        orphan_cutoff = now - self.orphan_grace_hours * 3600
+        expiry_cutoff = now - self.retention_days * 86400 if self.retention_days else None
+
+        deleted = {'orphaned': 0, 'expired': 0, 'bytes_freed': 0}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith('.flac'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                if expiry_cutoff is not None and stat.st_mtime < expiry_cutoff:
+                    reason = 'expired'
+                elif ref_counts.get(path, 0) == 0 and stat.st_mtime < orphan_cutoff:
+                    reason = 'orphaned'
+                else:
+                    continue
+
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                deleted[reason] += 1
+                deleted['bytes_freed'] += stat.st_size
+
+        with self._lock:
+            self._metrics['gc_runs'] += 1
+            self._metrics['gc_deleted_orphaned'] += deleted['orphaned']
+            self._metrics['gc_deleted_expired'] += deleted['expired']
+            self._metrics['gc_bytes_freed'] += deleted['bytes_freed']
+
+        logger.info(f"Audio GC finished: {deleted}")
+        return deleted
+
+    def start_gc(self):
+        """Start the background garbage collector (idempotent)"""
+        with self._lock:
+            if self._gc_thread and self._gc_thread.is_alive():
+                return
+            self._gc_stop.clear()
+            self._gc_thread = threading.Thread(target=self._gc_loop, name='audio-store-gc', daemon=True)
+            self._gc_thread.start()
+
+    def stop_gc(self):
+        """Stop the background garbage collector"""
+        self._gc_stop.set()
+        if self._gc_thread:
+            self._gc_thread.join(timeout=5)
+
+    def _gc_loop(self):
+        while not self._gc_stop.wait(self.gc_interval_minutes * 60):
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                logger.error(f"Audio GC error: {str(e)}", exc_info=True)
+
+    def get_metrics(self) -> Dict[str, float]:
+        """Return storage metrics, including bytes saved by compression and dedup"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        saved = metrics['bytes_saved_compression'] + metrics['bytes_saved_dedup']
+        metrics['bytes_saved'] = saved
+        metrics['savings_ratio'] = saved / metrics['raw_bytes'] if metrics['raw_bytes'] else 0.0
+        return metrics
+
+
+_audio_store = None
+_audio_store_lock = threading.Lock()
+
+
+def get_audio_store() -> AudioStore:
+    """Return the process-wide audio store, starting its collector on first use"""
+    global _audio_store
+    with _audio_store_lock:
+        if _audio_store is None:
+            _audio_store = AudioStore()
+            _audio_store.start_gc()
+        return _audio_store
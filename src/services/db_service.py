@@ -1,13 +1,36 @@
 from sqlalchemy.orm import Session
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import json
+import os
 
 from ..models import PracticeText, PracticeSession
 from ..models.base import get_db
+from ..utils.cache import LRUCache
+from .practice_stats import increment_values
+from .rollups import DEFAULT_MAX_POINTS, apply_session, get_progress
+
+# Shared by every DBService, Streamlit builds a new one per rerun. Writes
+# through this service invalidate what they change in their own process only.
+# Sessions saved by a separate job worker process become visible here when
+# the app sees their job finish and calls invalidate_text().
+_read_cache = LRUCache(max_entries=int(os.getenv('DB_CACHE_SIZE', 512)))
+
+def get_db_cache_metrics() -> Dict:
+    """Return hit and miss counts of the practice text and history cache"""
+    return _read_cache.get_metrics()
 
 class DBService:
-    def __init__(self):
-        self.db = next(get_db())
+    def __init__(self, db: Optional[Session] = None):
+        self.db = db if db is not None else next(get_db())
+        self.cache = _read_cache
+
+    def _detach(self, objects):
+        """Detach loaded rows so they stay readable after this session commits"""
+        for obj in objects:
+            if obj is not None:
+                self.db.expunge(obj)
+        return objects
 
     def create_practice_text(self, title: str, content: str, 
                            difficulty_level: str, category: str) -> PracticeText:
@@ -20,29 +43,76 @@ class DBService:
         self.db.add(db_text)
         self.db.commit()
         self.db.refresh(db_text)
+        self.cache.invalidate(('presets', category))
+        self.cache.invalidate(('text', db_text.id))
         return db_text
 
+    def invalidate_text(self, text_id: int):
+        """Drop the cached history, text and preset list of a practice text written elsewhere"""
+        self.cache.invalidate(('history', text_id))
+        self.cache.invalidate(('text', text_id))
+        practice_text = self.get_practice_text(text_id)
+        if practice_text is not None:
+            self.cache.invalidate(('presets', practice_text.category))
+
     def get_practice_text(self, text_id: int) -> Optional[PracticeText]:
-        return self.db.query(PracticeText).filter(PracticeText.id == text_id).first()
+        def load():
+            return self._detach([self.db.query(PracticeText).filter(PracticeText.id == text_id).first()])[0]
+        return self.cache.get_or_load(('text', text_id), load)
 
     def get_all_practice_texts(self) -> List[PracticeText]:
         return self.db.query(PracticeText).all()
 
     def create_practice_session(self, practice_text_id: int, audio_file_path: str,
                               transcribed_text: str, pronunciation_score: float,
-                              feedback: str) -> PracticeSession:
+                              feedback: str, accuracy_score: Optional[float] = None,
+                              fluency_score: Optional[float] = None,
+                              completeness_score: Optional[float] = None,
+                              prosody: Optional[Dict] = None) -> PracticeSession:
+        practice_text = self.get_practice_text(practice_text_id)
         db_session = PracticeSession(
             practice_text_id=practice_text_id,
             audio_file_path=audio_file_path,
             transcribed_text=transcribed_text,
             pronunciation_score=pronunciation_score,
-            feedback=feedback
+            accuracy_score=accuracy_score,
+            fluency_score=fluency_score,
+            completeness_score=completeness_score,
+            prosody=json.dumps(prosody) if prosody is not None else None,
+            feedback=feedback,
+            created_at=datetime.utcnow()
         )
         self.db.add(db_session)
+        # Fold the session into the text's statistics and the score rollups in the same transaction
+        self.db.query(PracticeText).filter(PracticeText.id == practice_text_id).update(
+            increment_values(pronunciation_score, db_session.created_at), synchronize_session=False
+        )
+        apply_session(self.db, practice_text_id, practice_text.category if practice_text else None,
+                      db_session.created_at, {
+                          'pronunciation': pronunciation_score,
+                          'accuracy': accuracy_score,
+                          'fluency': fluency_score,
+                          'completeness': completeness_score,
+                      })
         self.db.commit()
         self.db.refresh(db_session)
+        
+        self.cache.invalidate(('history', practice_text_id))
+        self.cache.invalidate(('text', practice_text_id))
+        if practice_text is not None:
+            self.cache.invalidate(('presets', practice_text.category))
         return db_session
 
+    def update_practice_session_feedback(self, session_id: int, feedback: str) -> bool:
+        """Store AI feedback on a saved practice session, returns whether it exists"""
+        practice_session = self.db.query(PracticeSession).filter(PracticeSession.id == session_id).first()
+        if practice_session is None:
+            return False
+        practice_session.feedback = feedback
+        self.db.commit()
+        self.cache.invalidate(('history', practice_session.practice_text_id))
+        return True
+
     def get_practice_sessions(self, text_id: Optional[int] = None) -> List[PracticeSession]:
         query = self.db.query(PracticeSession)
         if text_id:
@@ -56,10 +126,32 @@ class DBService:
         """
         Retrieve practice sessions for a specific text
         
+        Served from the read cache until a session is added for the text.
+        
         :param text_id: ID of the practice text
         :return: List of PracticeSession objects
         """
-        return self.get_practice_sessions(text_id)
+        history = self.cache.get_or_load(('history', text_id),
+                                         lambda: self._detach(self.get_practice_sessions(text_id)))
+        return list(history)
+
+    def get_progress(self, scope: str, scope_key, start: Optional[date] = None,
+                     end: Optional[date] = None, max_points: int = DEFAULT_MAX_POINTS) -> Dict:
+        """
+        Score series of a text or category for progress charts
+        
+        Read from the daily or weekly rollups, whichever is the finest with at
+        most max_points buckets in the range.
+        
+        :param scope: 'text' or 'category'
+        :param scope_key: Text id or category name
+        :param start: First day (UTC), default a year before end
+        :param end: Last day (UTC), default today
+        :return: {'resolution', 'points'}
+        """
+        end = end or datetime.utcnow().date()
+        start = start or end - timedelta(days=364)
+        return get_progress(self.db, scope, scope_key, start, end, max_points)
 
     def get_preset_texts(self, category: str = 'preset') -> List[dict]:
         """
@@ -68,45 +160,23 @@ class DBService:
         :param category: 文本类别，默认为'preset'
         :return: 预设文本列表，每个文本为字典格式
         """
-        preset_texts = self.db.query(PracticeText).filter(PracticeText.category == category).all()
-        
-        # 如果没有预设文本，创建一些默认文本
-        if not preset_texts:
-            default_texts = [
-                {
-                    'title': '自我介绍',
-                    'content': 'Hello, my name is Roy. I am a software engineer from San Francisco. I love coding and learning new technologies.',
-                    'difficulty_level': 'beginner',
-                    'category': 'preset'
-                },
-                {
-                    'title': '日常生活',
-                    'content': 'Every morning, I wake up at 6 AM and start my day with a cup of coffee. I enjoy reading books and listening to podcasts during my free time.',
-                    'difficulty_level': 'intermediate',
-                    'category': 'preset'
-                },
+        def load():
+            # 预设文本由数据库迁移写入（init_db），这里只需查询
+            preset_texts = self.db.query(PracticeText).filter(PracticeText.category == category).all()
+            
+            # 转换为字典列表
+            return [
                 {
-                    'title': '职业规划',
-                    'content': 'As a software developer, I am passionate about creating innovative solutions that can make people\'s lives easier. I believe in continuous learning and staying updated with the latest technological trends.',
-                    'difficulty_level': 'advanced',
-                    'category': 'preset'
-                }
+                    'id': text.id, 
+                    'title': text.title,
+                    'content': text.content, 
+                    'difficulty': text.difficulty_level,
+                    'session_count': text.session_count,
+                    'best_score': text.best_score,
+                    'mean_score': text.mean_score,
+                    'last_practiced_at': text.last_practiced_at
+                } for text in preset_texts
             ]
-            
-            # 创建并保存默认文本
-            for text_data in default_texts:
-                db_text = PracticeText(**text_data)
-                self.db.add(db_text)
-            
-            self.db.commit()
-            preset_texts = self.db.query(PracticeText).filter(PracticeText.category == category).all()
         
-        # 转换为字典列表
-        return [
-            {
-                'id': text.id, 
-                'title': text.title,
-                'content': text.content, 
-                'difficulty': text.difficulty_level
-            } for text in preset_texts
-        ]
+        # 读缓存，create_practice_text 写入该类别时失效
+        return list(self.cache.get_or_load(('presets', category), load))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cache of pronunciation feedback for readings with the same outcome.
+
+Learners reading the same text often make the same mistakes with scores in
+the same band. Feedback is keyed by the reference text, the diff signature of
+the reading, the bucketed Azure scores and prosody and the feedback language,
+so those readings share one LLM reply while any different mistake gets fresh
+feedback. The prompt of a cached reply carries the scores and prosody only as
+coarsely as the key does (build_feedback_prompt's bucket_width), so a reply
+never quotes another reading's exact numbers.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from ..utils.cache import LRUCache
+from ..utils.dsp import summarize_prosody
+from .alignment import diff_signature
+from .word_guide_store import text_key
+
+load_dotenv()
+
+BUCKETED_SCORES = ('accuracy_score', 'fluency_score', 'completeness_score')
+
+
+def score_bucket(score: Any, width: float) -> Optional[int]:
+    """Index of the width-sized band a 0-100 score falls in, None if missing"""
+    try:
+        return int(min(max(float(score), 0.0), 100.0) // width)
+    except (TypeError, ValueError):
+        return None
+
+
+def prosody_buckets(prosody: Optional[Dict]) -> Optional[tuple]:
+    """Coarse prosody of a reading: speaking rate, pauses (5+ as 5) and pitch range in 3-semitone bands"""
+    summary = summarize_prosody(prosody)
+    if summary is None:
+        return None
+    rate, semitones = summary['speaking_rate'], summary['f0_range_semitones']
+    return (round(rate) if rate is not None else None, min(summary['pause_count'], 5),
+            int(semitones // 3) if semitones is not None else None)
+
+
+def feedback_key(text: str, alignment: Dict, language: str = 'english',
+                 azure_details: Optional[Dict] = None, bucket_width: float = 10.0,
+                 prosody: Optional[Dict] = None) -> tuple:
+    """Cache key of one reading's feedback
+
+    Args:
+        text: Reference text
+        alignment: align_words(text, transcription)
+        language: Feedback language
+        azure_details: Azure scores, bucketed by bucket_width
+        bucket_width: Width of a score band in points
+        prosody: analyze_prosody() of the recording, bucketed by prosody_buckets
+    """
+    details = azure_details or {}
+    buckets = tuple(score_bucket(details.get(name), bucket_width) for name in BUCKETED_SCORES)
+    return (text_key(text, language), diff_signature(alignment), buckets, prosody_buckets(prosody))
+
+
+class FeedbackCache:
+    """LRU/TTL cache of feedback by reading outcome
+
+    Args:
+        max_entries: Feedback replies kept
+        ttl: Seconds a reply is served, None for no expiry
+        bucket_width: Score band width in points, wider bands share more replies
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl: Optional[float] = 7 * 24 * 3600,
+                 bucket_width: float = 10.0):
+        self.bucket_width = bucket_width
+        self.enabled = max_entries > 0
+        self._cache = LRUCache(max_entries, ttl)
+
+    def key(self, text: str, alignment: Dict, language: str = 'english',
+            azure_details: Optional[Dict] = None, prosody: Optional[Dict] = None) -> tuple:
+        return feedback_key(text, alignment, language, azure_details, self.bucket_width, prosody)
+
+    def get(self, key: tuple) -> Optional[str]:
+        return self._cache.get(key)
+
+    def put(self, key: tuple, feedback: str):
+        self._cache.put(key, feedback)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        metrics = self._cache.get_metrics()
+        metrics['bucket_width'] = self.bucket_width
+        return metrics
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_feedback_cache() -> FeedbackCache:
+    """Return the process-wide feedback cache, configured from FEEDBACK_CACHE_*"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            ttl = float(os.getenv('FEEDBACK_CACHE_TTL_HOURS', 168)) * 3600
+            _cache = FeedbackCache(
+                max_entries=int(os.getenv('FEEDBACK_CACHE_SIZE', 2000)),
+                ttl=ttl if ttl > 0 else None,
+                bucket_width=float(os.getenv('FEEDBACK_CACHE_BUCKET_WIDTH', 10)),
+            )
+        return _cache
+
+
+def get_feedback_cache_metrics() -> Dict[str, Any]:
+    """Return hit, miss and eviction counts of the feedback cache"""
+    return get_feedback_cache().get_metrics()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from ..utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+load_dotenv()
+
+# Shared by every hedger, attempts block on network I/O
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='hedge')
+
+
+class HedgeCancelled(Exception):
+    """Raised inside an attempt that lost the race and was told to stop"""
+
+
+class Attempt:
+    """Signals shared between the hedger and one upstream attempt
+
+    The attempt calls first_token() when its first streamed token arrives and
+    should check cancelled() between tokens, raising HedgeCancelled once set.
+    """
+
+    def __init__(self):
+        # Set by the first token or by the attempt finishing, whichever comes first
+        self._progress = threading.Event()
+        self._cancel = threading.Event()
+        self.started_at = time.monotonic()
+        self.first_token_at = None
+        self.tokens = 0
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+            self._progress.set()
+
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+
+def _percentile(values, q) -> Optional[float]:
+    return float(np.percentile(values, q)) if len(values) else None
+
+
+class Hedger:
+    """Fire a backup request when the first token is late
+
+    The hedge delay is the configured percentile of recent first-token
+    latencies, so roughly (100 - percentile)% of calls are hedged. A budget
+    caps the fraction of calls allowed to hedge. The first attempt to finish
+    wins and the other one is cancelled. A primary still without a token when
+    the race ends is sampled at the time it had waited, a lower bound of its
+    first-token latency, so slow calls are not left out of the percentile.
+
+    Args:
+        name: Hedger name for logs and metrics
+        percentile: First-token latency percentile used as the hedge delay
+        budget: Maximum fraction of calls that may send a hedge request
+        initial_delay: Delay used until min_samples latencies are observed
+        min_samples: Observations needed before the percentile is trusted
+        window: Number of recent observations kept
+    """
+
+    def __init__(self, name: str, percentile: float = 95.0, budget: float = 0.1,
+                 initial_delay: float = 3.0, min_samples: int = 20, window: int = 500):
+        self.name = name
+        self.percentile = percentile
+        self.budget = budget
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+
+        self._lock = threading.Lock()
+        self._first_token_latencies = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._unhedged_latencies = deque(maxlen=window)
+        self._generation_times = deque(maxlen=window)
+        self._calls = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._budget_denied = 0
+        self._wasted_tokens = 0
+        self._censored_first_tokens = 0
+        self._failed_primaries = 0
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            if len(self._first_token_latencies) < self.min_samples:
+                return self.initial_delay
+            return _percentile(self._first_token_latencies, self.percentile)
+
+    def _reserve_hedge(self) -> bool:
+        with self._lock:
+            if self._hedges + 1 > self.budget * self._calls:
+                self._budget_denied += 1
+                return False
+            self._hedges += 1
+            return True
+
+    def run(self, attempt_fn: Callable[[Attempt], Any],
+            hedge_fn: Optional[Callable[[Attempt], Any]] = None) -> Any:
+        """Run attempt_fn, hedging with hedge_fn (default attempt_fn) if the first token is late"""
+        with self._lock:
+            self._calls += 1
+        start_time = time.monotonic()
+
+        primary = Attempt()
+        primary_future = _executor.submit(attempt_fn, primary)
+        # A primary that fails before its first token ends the wait instead of the delay
+        primary_future.add_done_callback(lambda _: primary._progress.set())
+        attempts = {primary_future: primary}
+
+        delay = self.hedge_delay()
+        primary._progress.wait(delay)
+        if primary.first_token_at is None and not primary_future.done() and self._reserve_hedge():
+            logger.info(f"[{self.name}] no first token after {delay:.2f}s, sending hedge request")
+            hedge = Attempt()
+            attempts[_executor.submit(hedge_fn or attempt_fn, hedge)] = hedge
+
+        pending = set(attempts)
+        winner = None
+        error = None
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = future
+                    break
+                error = future.exception()
+
+        for future, attempt in attempts.items():
+            if future is not winner:
+                attempt.cancel()
+                future.add_done_callback(lambda _, loser=attempt: self._record_loser(loser))
+
+        end_time = time.monotonic()
+        primary_failed = primary_future.done() and primary_future.exception() is not None
+        self._record(primary, attempts.get(winner), start_time, end_time, primary_failed)
+
+        if winner is None:
+            raise error
+        return winner.result()
+
+    def _record(self, primary: Attempt, winner: Optional[Attempt], start_time: float, end_time: float,
+                primary_failed: bool = False):
+        with self._lock:
+            if primary.first_token_at is not None:
+                self._first_token_latencies.append(primary.first_token_at - start_time)
+            elif primary_failed:
+                # No latency to learn from an error, but it is counted
+                self._failed_primaries += 1
+            else:
+                # Cut off by the hedge or done without tokens: censored at the time waited
+                self._censored_first_tokens += 1
+                self._first_token_latencies.append(end_time - start_time)
+            if winner is None:
+                return
+            latency = end_time - start_time
+            self._latencies.append(latency)
+            if winner.first_token_at is not None:
+                self._generation_times.append(end_time - winner.first_token_at)
+
+            if winner is primary:
+                self._unhedged_latencies.append(latency)
+                return
+
+            # The cancelled primary would have needed at least until its first
+            # token (or now, if none arrived) plus a typical generation time
+            self._hedge_wins += 1
+            first_token_at = primary.first_token_at or end_time
+            generation = float(np.median(self._generation_times)) if self._generation_times else 0.0
+            self._unhedged_latencies.append(first_token_at - start_time + generation)
+
+    def _record_loser(self, attempt: Attempt):
+        """Count tokens streamed by an attempt that lost the race"""
+        with self._lock:
+            self._wasted_tokens += attempt.tokens
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self._latencies)
+            unhedged = list(self._unhedged_latencies)
+            calls = self._calls
+            metrics = {
+                'calls': calls,
+                'hedges': self._hedges,
+                'hedge_wins': self._hedge_wins,
+                'budget_denied': self._budget_denied,
+                'extra_request_ratio': self._hedges / calls if calls else 0.0,
+                'wasted_tokens': self._wasted_tokens,
+                'censored_first_tokens': self._censored_first_tokens,
+                'failed_primaries': self._failed_primaries,
+                'hedge_delay': (self.initial_delay if len(self._first_token_latencies) < self.min_samples
+                                else _percentile(self._first_token_latencies, self.percentile)),
+            }
+        # p*_unhedged estimates the latency the same calls would have had without hedging
+        for q in (50, 95, 99):
+            metrics[f'p{q}'] = _percentile(latencies, q)
+            metrics[f'p{q}_unhedged'] = _percentile(unhedged, q)
+        return metrics
+
+
+_hedgers: Dict[str, Hedger] = {}
+_hedgers_lock = threading.Lock()
+
+
+def get_hedger(name: str, prefix: str = 'OPENAI') -> Hedger:
+    """Return the process-wide hedger for a call type, configured from <PREFIX>_HEDGE_*"""
+    with _hedgers_lock:
+        if name not in _hedgers:
+            _hedgers[name] = Hedger(
+                name,
+                percentile=float(os.getenv(f'{prefix}_HEDGE_PERCENTILE', 95)),
+                budget=float(os.getenv(f'{prefix}_HEDGE_BUDGET', 0.1)),
+                initial_delay=float(os.getenv(f'{prefix}_HEDGE_INITIAL_DELAY', 3.0)),
+            )
+        return _hedgers[name]
+
+
+def get_hedging_metrics() -> Dict[str, Dict[str, Any]]:
+    """Return metrics for every hedger"""
+    with _hedgers_lock:
+        hedgers = list(_hedgers.values())
+    return {hedger.name: hedger.get_metrics() for hedger in hedgers}
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Durable job queue stored in the analysis_jobs table.
+
+Jobs outlive the Streamlit script run that submitted them: a rerun or a
+browser refresh only stops the polling, and any worker thread or process
+sharing the database picks the work up. Each job has an idempotency key, so
+submitting the same work twice returns the existing job.
+
+A worker claims a job by moving it to 'running' with a lease of
+visibility_timeout seconds. If the worker dies, the lease expires and another
+worker claims the job again. Failures are retried with exponential backoff
+until max_attempts, then the job is 'failed'. Only the worker holding the
+current lease can complete a job, so a reclaimed job is persisted once.
+"""
+
+import json
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import AnalysisJob
+from ..models.base import SessionLocal
+from ..utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED)
+
+# handler(payload) -> JSON-serializable result, run outside any transaction
+Handler = Callable[[Dict], Dict]
+# persist(db, job, result) -> extra result fields, run in the completing transaction
+Persister = Callable[[Session, Dict, Dict], Optional[Dict]]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class JobQueue:
+    """SQLite-backed job queue with leases, retries and idempotent submits
+
+    Args:
+        session_factory: Builds database sessions, one per queue operation
+        visibility_timeout: Seconds a claimed job stays invisible to other workers
+        max_attempts: Default number of runs before a job fails
+        retry_backoff: Delay in seconds before the first retry, doubled for each next one
+        poll_interval: Seconds an idle worker waits before looking for work again
+        clock: Returns the current UTC datetime, replaceable in tests
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 visibility_timeout: float = 300.0, max_attempts: int = 3,
+                 retry_backoff: float = 5.0, poll_interval: float = 0.5,
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        self.session_factory = session_factory
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._handlers: Dict[str, tuple] = {}
+        self._workers: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._counters = {'completed': 0, 'retried': 0, 'failed': 0, 'reclaimed': 0, 'stale_results': 0}
+
+    def register(self, kind: str, handler: Handler, persist: Optional[Persister] = None):
+        """Set the function running jobs of a kind, and optionally the one storing their result
+
+        persist runs in the same transaction that marks the job succeeded,
+        after the lease check, so its writes happen once per job.
+        """
+        self._handlers[kind] = (handler, persist)
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def submit(self, kind: str, payload: Dict, idempotency_key: Optional[str] = None,
+               max_attempts: Optional[int] = None) -> Dict:
+        """Queue a job, or return the existing job with the same idempotency key"""
+        key = idempotency_key or uuid.uuid4().hex
+        db = self.session_factory()
+        try:
+            job = db.query(AnalysisJob).filter(AnalysisJob.idempotency_key == key).first()
+            if job is None:
+                now = self._clock()
+                job = AnalysisJob(idempotency_key=key, kind=kind, status=QUEUED,
+                                  payload=json.dumps(payload), attempts=0,
+                                  max_attempts=max_attempts or self.max_attempts,
+                                  available_at=now, created_at=now)
+                db.add(job)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Submitted concurrently with the same key
+                    db.rollback()
+                    job = db.query(AnalysisJob).filter(AnalysisJob.idempotency_key == key).one()
+                else:
+                    logger.debug(f"Queued {kind} job {job.id}")
+                    self._wake.set()
+            return job.to_dict()
+        finally:
+            db.close()
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        db = self.session_factory()
+        try:
+            job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+            return job.to_dict() if job else None
+        finally:
+            db.close()
+
+    def retry(self, job_id: int) -> Optional[Dict]:
+        """Queue a failed job again with a fresh set of attempts"""
+        db = self.session_factory()
+        try:
+            db.query(AnalysisJob).filter(AnalysisJob.id == job_id, AnalysisJob.status == FAILED).update({
+                AnalysisJob.status: QUEUED, AnalysisJob.attempts: 0, AnalysisJob.error: None,
+                AnalysisJob.available_at: self._clock(), AnalysisJob.finished_at: None,
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self._wake.set()
+        return self.get(job_id)
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """Lease the next due job of a registered kind, None if there is none
+
+        Due jobs are queued jobs past their backoff and running jobs past
+        their lease. A compare-and-set on status and attempts makes sure
+        only one worker wins each job.
+        """
+        if not self._handlers:
+            return None
+        db = self.session_factory()
+        try:
+            while True:
+                now = self._clock()
+                job = db.query(AnalysisJob).filter(
+                    AnalysisJob.kind.in_(list(self._handlers)),
+                    or_(AnalysisJob.status == QUEUED, AnalysisJob.status == RUNNING),
+                    AnalysisJob.available_at <= now,
+                ).order_by(AnalysisJob.available_at, AnalysisJob.id).first()
+                if job is None:
+                    return None
+                current = (AnalysisJob.id == job.id, AnalysisJob.status == job.status,
+                           AnalysisJob.attempts == job.attempts)
+                reclaimed, previous_worker = job.status == RUNNING, job.locked_by
+                if reclaimed and job.attempts >= job.max_attempts:
+                    values = {AnalysisJob.status: FAILED, AnalysisJob.finished_at: now,
+                              AnalysisJob.error: f"Visibility timeout expired on attempt {job.attempts}"}
+                else:
+                    values = {AnalysisJob.status: RUNNING, AnalysisJob.attempts: job.attempts + 1,
+                              AnalysisJob.locked_by: worker_id, AnalysisJob.started_at: now,
+                              AnalysisJob.available_at: now + timedelta(seconds=self.visibility_timeout)}
+                won = db.query(AnalysisJob).filter(*current).update(values, synchronize_session=False)
+                db.commit()
+                db.expire_all()
+                if not won:
+                    continue
+                if reclaimed:
+                    self._count('reclaimed')
+                    logger.warning(f"Job {job.id} lease expired on worker {previous_worker}")
+                if values[AnalysisJob.status] == FAILED:
+                    self._count('failed')
+                    continue
+                return db.query(AnalysisJob).filter(AnalysisJob.id == job.id).one().to_dict()
+        finally:
+            db.close()
+
+    def _is_leased(self, job: Dict):
+        return (AnalysisJob.id == job['id'], AnalysisJob.status == RUNNING,
+                AnalysisJob.locked_by == job['locked_by'], AnalysisJob.attempts == job['attempts'])
+
+    def complete(self, job: Dict, result: Dict) -> bool:
+        """Store the result of a claimed job, False if its lease was lost"""
+        _, persist = self._handlers.get(job['kind'], (None, None))
+        db = self.session_factory()
+        try:
+            won = db.query(AnalysisJob).filter(*self._is_leased(job)).update({
+                AnalysisJob.status: SUCCEEDED, AnalysisJob.result: json.dumps(result),
+                AnalysisJob.error: None, AnalysisJob.finished_at: self._clock(),
+            }, synchronize_session=False)
+            if not won:
+                db.rollback()
+                self._count('stale_results')
+                logger.warning(f"Dropping result of job {job['id']}, its lease was lost")
+                return False
+            if persist is not None:
+                # May commit the status update together with its own writes
+                extra = persist(db, job, result)
+                if extra:
+                    db.query(AnalysisJob).filter(AnalysisJob.id == job['id']).update(
+                        {AnalysisJob.result: json.dumps(dict(result, **extra))}, synchronize_session=False
+                    )
+            db.commit()
+            self._count('completed')
+            return True
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def fail(self, job: Dict, error: str) -> bool:
+        """Record a failed attempt, queueing a retry while attempts remain"""
+        now = self._clock()
+        if job['attempts'] < job['max_attempts']:
+            delay = self.retry_backoff * 2 ** (job['attempts'] - 1)
+            values = {AnalysisJob.status: QUEUED, AnalysisJob.available_at: now + timedelta(seconds=delay)}
+            counter = 'retried'
+        else:
+            values = {AnalysisJob.status: FAILED, AnalysisJob.finished_at: now}
+            counter = 'failed'
+        values[AnalysisJob.error] = error
+        db = self.session_factory()
+        try:
+            won = db.query(AnalysisJob).filter(*self._is_leased(job)).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if won:
+            self._count(counter)
+        return bool(won)
+
+    def run_once(self, worker_id: str) -> bool:
+        """Claim and run one job, returns whether there was one"""
+        job = self.claim(worker_id)
+        if job is None:
+            return False
+        handler, _ = self._handlers[job['kind']]
+        logger.debug(f"Worker {worker_id} running {job['kind']} job {job['id']} (attempt {job['attempts']})")
+        try:
+            result = handler(job['payload'])
+            self.complete(job, result)
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}", exc_info=True)
+            self.fail(job, str(e))
+        return True
+
+    def work(self, worker_id: str, stop: Optional[threading.Event] = None):
+        """Run jobs until stop (default: the queue's stop event) is set"""
+        stop = stop or self._stop
+        while not stop.is_set():
+            try:
+                if self.run_once(worker_id):
+                    continue
+            except Exception as e:
+                logger.error(f"Worker {worker_id} error: {str(e)}", exc_info=True)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self, workers: int = 2):
+        """Start worker threads in this process"""
+        self._stop.clear()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for _ in range(workers):
+            worker_id = f"{prefix}:{uuid.uuid4().hex[:8]}"
+            thread = threading.Thread(target=self.work, args=(worker_id,), name=f"job-worker-{worker_id}",
+                                      daemon=True)
+            thread.start()
+            self._workers.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._workers:
+            thread.join(timeout)
+        self._workers = []
+
+    def get_metrics(self, recent: int = 200) -> Dict[str, Any]:
+        """Queue depth by status, age of the oldest queued job and latency of recent jobs
+
+        Latencies are in seconds over the last `recent` succeeded jobs: wait is
+        submit to the start of the last attempt, run that attempt, total submit
+        to result. Counters only cover this process's workers.
+        """
+        db = self.session_factory()
+        try:
+            depth = dict.fromkeys(STATUSES, 0)
+            depth.update(db.query(AnalysisJob.status, func.count()).group_by(AnalysisJob.status).all())
+            oldest = db.query(func.min(AnalysisJob.created_at)).filter(AnalysisJob.status == QUEUED).scalar()
+            rows = db.query(AnalysisJob.created_at, AnalysisJob.started_at, AnalysisJob.finished_at).filter(
+                AnalysisJob.status == SUCCEEDED
+            ).order_by(AnalysisJob.finished_at.desc()).limit(recent).all()
+        finally:
+            db.close()
+        with self._lock:
+            metrics: Dict[str, Any] = dict(self._counters)
+        metrics['depth'] = depth
+        metrics['oldest_queued_seconds'] = (self._clock() - oldest).total_seconds() if oldest else None
+        metrics['workers'] = sum(thread.is_alive() for thread in self._workers)
+        latencies = {
+            'wait': [(started - created).total_seconds() for created, started, _ in rows],
+            'run': [(finished - started).total_seconds() for _, started, finished in rows],
+            'total': [(finished - created).total_seconds() for created, _, finished in rows],
+        }
+        for name, values in latencies.items():
+            for q in (50, 95):
+                metrics[f'p{q}_{name}_seconds'] = _percentile(values, q)
+        return metrics
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Offline pronunciation lexicon built from CMUdict.
+
+The bundled lexicon is a sorted text file with one ``word<TAB>pron|pron`` line
+per word (ARPAbet, alternates separated by ``|``). It is memory-mapped and
+searched by bisection over an array of line offsets, so loading costs one
+vectorized newline scan and the file itself stays in the shared page cache.
+
+Rebuild it from a CMUdict release with:
+
+    python -m src.services.lexicon build path/to/cmudict.dict
+"""
+
+import mmap
+from array import array
+import os
+import re
+import sys
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..config.i18n import get_text
+from ..utils.text import normalize_word
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'lexicon.txt')
+
+ARPABET_TO_IPA = {
+    'AA': 'ɑ', 'AE': 'æ', 'AH': 'ʌ', 'AO': 'ɔ', 'AW': 'aʊ', 'AY': 'aɪ',
+    'EH': 'ɛ', 'ER': 'ɝ', 'EY': 'eɪ', 'IH': 'ɪ', 'IY': 'i', 'OW': 'oʊ',
+    'OY': 'ɔɪ', 'UH': 'ʊ', 'UW': 'u',
+    'B': 'b', 'CH': 'tʃ', 'D': 'd', 'DH': 'ð', 'F': 'f', 'G': 'ɡ', 'HH': 'h',
+    'JH': 'dʒ', 'K': 'k', 'L': 'l', 'M': 'm', 'N': 'n', 'NG': 'ŋ', 'P': 'p',
+    'R': 'ɹ', 'S': 's', 'SH': 'ʃ', 'T': 't', 'TH': 'θ', 'V': 'v', 'W': 'w',
+    'Y': 'j', 'Z': 'z', 'ZH': 'ʒ',
+}
+
+# Unstressed variants of vowels whose reduced form has its own IPA symbol
+UNSTRESSED_IPA = {'AH': 'ə', 'ER': 'ɚ'}
+
+STRESS_MARKS = {'1': 'ˈ', '2': 'ˌ', '0': ''}
+
+# Onsets English allows word-initially, used for maximal-onset syllabification
+LEGAL_ONSETS = {tuple(onset.split()) for onset in (
+    'B', 'CH', 'D', 'DH', 'F', 'G', 'HH', 'JH', 'K', 'L', 'M', 'N', 'P', 'R', 'S', 'SH',
+    'T', 'TH', 'V', 'W', 'Y', 'Z', 'ZH',
+    'B L', 'B R', 'B Y', 'D R', 'D W', 'D Y', 'F L', 'F R', 'F Y', 'G L', 'G R', 'G W',
+    'HH W', 'HH Y', 'K L', 'K R', 'K W', 'K Y', 'M Y', 'N Y', 'P L', 'P R', 'P Y',
+    'S F', 'S K', 'S L', 'S M', 'S N', 'S P', 'S T', 'S W', 'S Y', 'SH R', 'T R', 'T W',
+    'TH R', 'TH W', 'V Y',
+    'S K L', 'S K R', 'S K W', 'S K Y', 'S P L', 'S P R', 'S P Y', 'S T R', 'S T Y',
+)}
+
+
+def is_vowel(phone: str) -> bool:
+    return phone[-1].isdigit()
+
+
+def syllabify(phones: List[str]) -> List[List[str]]:
+    """Split ARPAbet phones into syllables by the maximal onset principle"""
+    nuclei = [i for i, phone in enumerate(phones) if is_vowel(phone)]
+    if not nuclei:
+        return [phones]
+
+    syllables = []
+    start = 0
+    for current, following in zip(nuclei, nuclei[1:]):
+        cluster = phones[current + 1:following]
+        # Give the next syllable the longest legal onset
+        split = len(cluster)
+        for i in range(len(cluster) + 1):
+            if not cluster[i:] or tuple(cluster[i:]) in LEGAL_ONSETS:
+                split = i
+                break
+        boundary = current + 1 + split
+        syllables.append(phones[start:boundary])
+        start = boundary
+    syllables.append(phones[start:])
+    return syllables
+
+
+def syllable_stress(syllable: List[str]) -> str:
+    """Stress digit of a syllable: '1' primary, '2' secondary, '0' none"""
+    for phone in syllable:
+        if is_vowel(phone):
+            return phone[-1]
+    return '0'
+
+
+def phone_to_ipa(phone: str) -> str:
+    base, stress = (phone[:-1], phone[-1]) if is_vowel(phone) else (phone, None)
+    if stress == '0' and base in UNSTRESSED_IPA:
+        return UNSTRESSED_IPA[base]
+    return ARPABET_TO_IPA.get(base, base.lower())
+
+
+def to_ipa(phones: List[str]) -> str:
+    """IPA transcription with stress marks before stressed syllables"""
+    syllables = syllabify(phones)
+    return '.'.join(
+        STRESS_MARKS[syllable_stress(syllable)] + ''.join(phone_to_ipa(phone) for phone in syllable)
+        for syllable in syllables
+    ).replace('.ˈ', 'ˈ').replace('.ˌ', 'ˌ')
+
+
+def describe_pronunciation(word: str, arpabet: str) -> Dict:
+    """Structured pronunciation (IPA, syllables, stress) for one ARPAbet string"""
+    phones = arpabet.split()
+    syllables = syllabify(phones)
+    stresses = [syllable_stress(syllable) for syllable in syllables]
+    return {
+        'word': word,
+        'arpabet': arpabet,
+        'ipa': to_ipa(phones),
+        'syllables': [''.join(phone_to_ipa(phone) for phone in syllable) for syllable in syllables],
+        'stress_pattern': ''.join(stresses),
+        'primary_stress': stresses.index('1') + 1 if '1' in stresses else None,
+    }
+
+
+class Lexicon:
+    """Memory-mapped, bisection-searched pronunciation lexicon
+
+    Args:
+        path: Lexicon file in the build_lexicon format (default: bundled CMUdict)
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv('LEXICON_PATH') or DEFAULT_LEXICON_PATH
+        with open(self.path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = np.frombuffer(self._mm, dtype=np.uint8)
+        newlines = np.flatnonzero(data == ord('\n'))
+        # Line i spans starts[i]..starts[i + 1] - 1 and its key ends at tabs[i].
+        # Kept in compact arrays of C ints, indexing them is much cheaper than NumPy
+        self._starts = array('I', np.concatenate(([0], newlines + 1)).astype(np.uint32).tobytes())
+        self._tabs = array('I', np.flatnonzero(data == ord('\t')).astype(np.uint32).tobytes())
+        self._count = len(newlines)
+        if len(self._tabs) != self._count:
+            raise ValueError(f"Malformed lexicon file: {self.path}")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _key(self, index: int) -> bytes:
+        return self._mm[self._starts[index]:self._tabs[index]]
+
+    def lookup(self, word: str) -> Optional[List[str]]:
+        """ARPAbet pronunciations of a word, most common first, or None"""
+        key = normalize_word(word).encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._key(lo) == key:
+            return self._mm[self._tabs[lo] + 1:self._starts[lo + 1] - 1].decode('ascii').split('|')
+        return None
+
+    def __contains__(self, word: str) -> bool:
+        return self.lookup(word) is not None
+
+    def describe(self, word: str) -> Optional[List[Dict]]:
+        """Structured pronunciations of a word, or None if unknown"""
+        prons = self.lookup(word)
+        if prons is None:
+            return None
+        return [describe_pronunciation(normalize_word(word), pron) for pron in prons]
+
+
+def format_lexicon_guide(descriptions: List[Dict], language: str = 'english') -> str:
+    """Render lexicon pronunciations as markdown"""
+    lines = [f"**{descriptions[0]['word']}**"]
+    for description in descriptions:
+        lines.append(f"- {get_text('guide_ipa', language)}: /{description['ipa']}/ "
+                     f"(ARPAbet: `{description['arpabet']}`)")
+        lines.append(f"  - {get_text('guide_syllables', language)}: {' · '.join(description['syllables'])}")
+        if description['primary_stress']:
+            lines.append(f"  - {get_text('guide_stress', language)}: "
+                         f"{get_text('guide_stress_syllable', language, n=description['primary_stress'])}")
+    return '\n'.join(lines)
+
+
+def build_lexicon(source: str, dest: str = DEFAULT_LEXICON_PATH) -> int:
+    """Convert a cmudict.dict file into the sorted lexicon format
+
+    Comments are dropped and alternate pronunciations ("word(2)") are merged
+    onto the word's line in their original order.
+
+    Returns:
+        Number of words written
+    """
+    prons: Dict[str, List[str]] = {}
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            word, pron = line.split(None, 1)
+            word = re.sub(r'\(\d+\)$', '', word)
+            prons.setdefault(normalize_word(word), []).append(' '.join(pron.split()))
+
+    # Sort on bytes, the order Lexicon.lookup bisects in
+    words = sorted(prons, key=lambda w: w.encode('utf-8'))
+    with open(dest, 'w', encoding='utf-8', newline='\n') as f:
+        for word in words:
+            f.write(f"{word}\t{'|'.join(prons[word])}\n")
+    return len(words)
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon() -> Lexicon:
+    """Return the process-wide lexicon, loading it on first use"""
+    global _lexicon
+    with _lexicon_lock:
+        if _lexicon is None:
+            _lexicon = Lexicon()
+        return _lexicon
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'build':
+        print("usage: python -m src.services.lexicon build path/to/cmudict.dict [dest]")
+        sys.exit(1)
+    count = build_lexicon(*sys.argv[2:4])
+    print(f"Wrote {count} words")
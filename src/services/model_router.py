@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Model routing for AIService calls.
+
+Each prompt name (see prompt_builder) maps to a list of tiers ordered by
+input size. A tier applies up to its max_prompt_tokens and lists models in
+fallback order: the first is tried, the next ones only when it fails with a
+timeout, a connection error or a server-side error, or when its circuit is
+open. Each model has its own circuit breaker, and a model with a fallback
+gets only fallback_attempts attempts (OPENAI_FALLBACK_ATTEMPTS) before the
+call moves on, instead of the full retry budget.
+
+The table can be overridden per route with OPENAI_ROUTES, a JSON object like
+{"pronunciation_feedback": [{"max_prompt_tokens": null, "models": ["gpt-4o"]}]},
+and prices (USD per million input/output tokens) with OPENAI_MODEL_PRICES,
+e.g. {"gpt-4o": [2.5, 10]}.
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from openai import APIConnectionError, APITimeoutError
+
+from ..utils.logger import setup_logger
+from .resilience import CircuitOpenError, RetryableError
+
+logger = setup_logger(__name__)
+
+load_dotenv()
+
+DEFAULT_ROUTE = '*'
+
+DEFAULT_ROUTES = {
+    'word_guide': [{'max_prompt_tokens': None, 'models': ['gpt-4o-mini', 'gpt-3.5-turbo']}],
+    'word_guide_batch': [{'max_prompt_tokens': None, 'models': ['gpt-4o-mini', 'gpt-4o']}],
+    'phonetic_guide': [
+        {'max_prompt_tokens': 300, 'models': ['gpt-4o-mini', 'gpt-4o']},
+        {'max_prompt_tokens': None, 'models': ['gpt-4o', 'gpt-4']},
+    ],
+    'pronunciation_feedback': [
+        {'max_prompt_tokens': 300, 'models': ['gpt-4o-mini', 'gpt-4o']},
+        {'max_prompt_tokens': None, 'models': ['gpt-4o', 'gpt-4']},
+    ],
+    DEFAULT_ROUTE: [{'max_prompt_tokens': None, 'models': ['gpt-4o', 'gpt-4']}],
+}
+
+# USD per million prompt and completion tokens
+DEFAULT_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4': (30.00, 60.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+}
+
+# Client errors other than these mean the request itself is wrong, another model would fail too
+FALLBACK_STATUS_CODES = {404, 408, 409, 429}
+
+
+def should_fall_back(error: BaseException) -> bool:
+    """Whether a failed call is worth retrying on the next model of the route
+
+    Each model has its own circuit, so an open one sends the call on to the next model.
+    """
+    if isinstance(error, (CircuitOpenError, RetryableError, APITimeoutError, APIConnectionError,
+                          TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, 'status_code', None)
+    return status_code is not None and (status_code >= 500 or status_code in FALLBACK_STATUS_CODES)
+
+
+def _load_json_env(key: str) -> Dict:
+    value = os.getenv(key)
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError:
+        logger.error(f"Ignoring invalid JSON in {key}")
+        return {}
+
+
+class ModelRouter:
+    """Pick models per prompt name and input size, and track each route
+
+    Args:
+        routes: Route name -> tiers, merged over DEFAULT_ROUTES
+        prices: Model -> (prompt, completion) USD per million tokens, merged over DEFAULT_PRICES
+        window: Number of recent latencies kept per route and model
+        fallback_attempts: Attempts on a model before falling back to the next one
+    """
+
+    def __init__(self, routes: Optional[Dict[str, List[Dict]]] = None,
+                 prices: Optional[Dict[str, Any]] = None, window: int = 500, fallback_attempts: int = 2):
+        self.fallback_attempts = fallback_attempts
+        self.routes = dict(DEFAULT_ROUTES)
+        self.routes.update(routes or {})
+        self.prices = {model: tuple(price) for model, price in {**DEFAULT_PRICES, **(prices or {})}.items()}
+        self._window = window
+        self._lock = threading.Lock()
+        self._stats: Dict[tuple, Dict[str, Any]] = {}
+
+    def models_for(self, route: str, prompt_tokens: int = 0) -> List[str]:
+        """Models to try for a request, in fallback order"""
+        tiers = self.routes.get(route) or self.routes[DEFAULT_ROUTE]
+        for tier in tiers:
+            limit = tier.get('max_prompt_tokens')
+            if limit is None or prompt_tokens <= limit:
+                return list(tier['models'])
+        return list(tiers[-1]['models'])
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        """USD cost of one call, None for models without a known price"""
+        price = self.prices.get(model)
+        if price is None:
+            return None
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    def record(self, route: str, model: str, latency: float, prompt_tokens: int = 0,
+               completion_tokens: int = 0, error: bool = False, fallback: bool = False):
+        """Record one call of a model on a route"""
+        cost = None if error else self.cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            stats = self._stats.setdefault((route, model), {
+                'calls': 0, 'errors': 0, 'fallbacks': 0, 'prompt_tokens': 0,
+                'completion_tokens': 0, 'cost_usd': 0.0, 'latencies': deque(maxlen=self._window),
+            })
+            stats['calls'] += 1
+            if error:
+                stats['errors'] += 1
+                return
+            stats['fallbacks'] += fallback
+            stats['prompt_tokens'] += prompt_tokens
+            stats['completion_tokens'] += completion_tokens
+            stats['cost_usd'] += cost or 0.0
+            stats['latencies'].append(latency)
+
+    def get_metrics(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Per route and model: calls, errors, fallbacks served, tokens, cost and latency percentiles"""
+        with self._lock:
+            snapshot = {key: dict(stats, latencies=list(stats['latencies'])) for key, stats in self._stats.items()}
+        metrics: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (route, model), stats in snapshot.items():
+            latencies = stats.pop('latencies')
+            successes = stats['calls'] - stats['errors']
+            stats['mean_cost_usd'] = stats['cost_usd'] / successes if successes else None
+            for q in (50, 95):
+                stats[f'p{q}_latency'] = float(np.percentile(latencies, q)) if latencies else None
+            metrics.setdefault(route, {})[model] = stats
+        return metrics
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide router, configured from the OPENAI_ROUTES, _MODEL_PRICES and _FALLBACK_ATTEMPTS"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter(_load_json_env('OPENAI_ROUTES'), _load_json_env('OPENAI_MODEL_PRICES'),
+                                  fallback_attempts=int(os.getenv('OPENAI_FALLBACK_ATTEMPTS', 2)))
+        return _router
+
+
+def get_routing_metrics() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Return latency and cost metrics for every route"""
+    return get_model_router().get_metrics()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Spectrogram and waveform tiles for reviewing a recording.
+
+The log-mel spectrogram and the per-hop peak envelope of a recording are
+computed once, in the audio process pool, and cached by the recording's
+content hash. Each view of the playback panel is then a tile: the visible
+time range pooled down to the display size and colored as a small RGB
+image, cached as well. Scrubbing and Streamlit reruns only slice cached
+arrays, they never recompute the FFT or send full-resolution data to the
+browser.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from ..utils.cache import LRUCache
+from ..utils.dsp import ANALYSIS_RATE, HOP_SECONDS, log_mel, peak_envelope, pool, resample, to_mono
+from .audio_executor import get_audio_executor
+
+load_dotenv()
+
+DISPLAY_MELS = 80
+# Spectrogram levels below the loudest bin minus this many dB are black
+DB_RANGE = 80.0
+TILE_WIDTH = 800
+SPECTROGRAM_HEIGHT = 160
+WAVEFORM_HEIGHT = 60
+
+WAVEFORM_COLOR = (31, 119, 180)
+BACKGROUND_COLOR = (255, 255, 255)
+
+
+def _colormap() -> np.ndarray:
+    """(256, 3) uint8 black-purple-orange-yellow ramp, close to magma"""
+    anchors = np.array([(0, 0, 4), (59, 15, 112), (140, 41, 129), (222, 73, 104),
+                        (254, 159, 109), (252, 253, 191)], dtype=np.float64)
+    positions = np.linspace(0, 255, len(anchors))
+    levels = np.arange(256)
+    return np.stack([np.interp(levels, positions, anchors[:, c]) for c in range(3)], axis=1).astype(np.uint8)
+
+
+COLORMAP = _colormap()
+
+
+def compute_review(samples: np.ndarray, sample_rate: int) -> Dict[str, Any]:
+    """Full-resolution review data of a recording, as an AudioExecutor task
+
+    Returns:
+        {'duration': seconds, 'spectrogram': (DISPLAY_MELS, frames) uint8
+        levels over the top DB_RANGE dB, 'envelope': (2, frames) float32
+        min/max sample per frame, scaled to the peak}
+    """
+    samples = resample(to_mono(samples), sample_rate, ANALYSIS_RATE)
+    hop = int(HOP_SECONDS * ANALYSIS_RATE)
+    mel = log_mel(samples, ANALYSIS_RATE, DISPLAY_MELS).T
+    levels = np.clip((mel - (mel.max() - DB_RANGE)) * (255.0 / DB_RANGE), 0, 255).astype(np.uint8)
+    envelope = peak_envelope(samples, hop)[:, :levels.shape[1]]
+    peak = float(np.abs(envelope).max())
+    return {
+        'duration': len(samples) / ANALYSIS_RATE,
+        'spectrogram': levels,
+        'envelope': envelope / peak if peak > 0 else envelope,
+    }
+
+
+def render_tile(review: Dict[str, Any], start: float, end: float, width: int = TILE_WIDTH,
+                spectrogram_height: int = SPECTROGRAM_HEIGHT,
+                waveform_height: int = WAVEFORM_HEIGHT) -> Dict[str, np.ndarray]:
+    """RGB images of a time range, pooled down to the display size
+
+    Args:
+        review: compute_review() of the recording
+        start: Range start in seconds
+        end: Range end in seconds
+        width: Image width in pixels
+        spectrogram_height: Spectrogram image height in pixels
+        waveform_height: Waveform image height in pixels
+
+    Returns:
+        {'spectrogram': (spectrogram_height, width, 3), 'waveform': (waveform_height, width, 3)} uint8
+    """
+    frames = review['spectrogram'].shape[1]
+    first = min(max(int(start / HOP_SECONDS), 0), frames - 1)
+    last = min(max(int(np.ceil(end / HOP_SECONDS)), first + 1), frames)
+
+    # Peaks stay visible however far the range is zoomed out
+    levels = pool(review['spectrogram'][:, first:last], width)
+    levels = pool(levels, spectrogram_height, axis=0)[::-1]
+
+    low = pool(review['envelope'][0, first:last], width, np.minimum)
+    high = pool(review['envelope'][1, first:last], width, np.maximum)
+    amplitude = np.linspace(1, -1, waveform_height)[:, None]
+    # A pixel row is filled when its amplitude lies within the column's min/max, give or take half a row
+    half_row = 1.0 / waveform_height
+    filled = (amplitude >= low - half_row) & (amplitude <= high + half_row)
+    waveform = np.where(filled[..., None], np.array(WAVEFORM_COLOR, dtype=np.uint8),
+                        np.array(BACKGROUND_COLOR, dtype=np.uint8))
+    return {'spectrogram': COLORMAP[levels], 'waveform': waveform}
+
+
+class PlaybackReview:
+    """Per-recording review data and rendered tiles, cached by content hash
+
+    Args:
+        max_recordings: Recordings whose full-resolution data is kept
+        max_tiles: Rendered tiles kept
+    """
+
+    def __init__(self, max_recordings: int = 8, max_tiles: int = 256):
+        self._reviews = LRUCache(max_entries=max_recordings)
+        self._tiles = LRUCache(max_entries=max_tiles)
+        # (path, size, mtime) -> content hash, so a rerun does not reread the file
+        self._hashes = LRUCache(max_entries=max_tiles)
+        self._lock = threading.Lock()
+        self._computes = 0
+        self._compute_seconds = 0.0
+
+    def audio_hash(self, audio_file: str) -> str:
+        """Content hash of a recording, its file name when the audio store manages it"""
+        # soundfile stays out of the app's startup imports
+        from .audio_store import get_audio_store
+
+        if get_audio_store().is_managed(audio_file):
+            return os.path.splitext(os.path.basename(audio_file))[0]
+        stat = os.stat(audio_file)
+        key = (os.path.abspath(audio_file), stat.st_size, stat.st_mtime_ns)
+
+        def digest():
+            sha = hashlib.sha256()
+            with open(audio_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(chunk)
+            return sha.hexdigest()
+
+        return self._hashes.get_or_load(key, digest)
+
+    def _compute(self, audio_file: str) -> Dict[str, Any]:
+        from .audio_encoding import load_mono
+
+        start = time.perf_counter()
+        samples, sample_rate = load_mono(audio_file)
+        review = get_audio_executor().run(compute_review, samples, sample_rate)
+        with self._lock:
+            self._computes += 1
+            self._compute_seconds += time.perf_counter() - start
+        return review
+
+    def get_review(self, audio_file: str) -> Tuple[str, Dict[str, Any]]:
+        """(content hash, compute_review()) of a recording, computed on first use"""
+        content_hash = self.audio_hash(audio_file)
+        return content_hash, self._reviews.get_or_load(content_hash, lambda: self._compute(audio_file))
+
+    def duration(self, audio_file: str) -> float:
+        return self.get_review(audio_file)[1]['duration']
+
+    def tile(self, audio_file: str, start: float, end: float, width: int = TILE_WIDTH) -> Dict[str, np.ndarray]:
+        """render_tile() of a time range, from the tile cache when it was shown before"""
+        content_hash, review = self.get_review(audio_file)
+        key = (content_hash, round(start, 2), round(end, 2), width)
+        return self._tiles.get_or_load(key, lambda: render_tile(review, start, end, width))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            computes, compute_seconds = self._computes, self._compute_seconds
+        return {
+            'computes': computes,
+            'mean_compute_seconds': compute_seconds / computes if computes else None,
+            'review_hits': self._reviews.hits,
+            'review_misses': self._reviews.misses,
+            'tile_hits': self._tiles.hits,
+            'tile_misses': self._tiles.misses,
+        }
+
+
+_review = None
+_review_lock = threading.Lock()
+
+
+def get_playback_review() -> PlaybackReview:
+    """Return the process-wide review cache, sized from REVIEW_CACHE_*"""
+    global _review
+    with _review_lock:
+        if _review is None:
+            _review = PlaybackReview(
+                max_recordings=int(os.getenv('REVIEW_CACHE_RECORDINGS', 8)),
+                max_tiles=int(os.getenv('REVIEW_CACHE_TILES', 256)),
+            )
+        return _review
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Per-text practice statistics stored on PracticeText.
+
+create_practice_session applies increment_values() in the same transaction
+as the session insert, so list views read session_count, best_score,
+mean_score and last_practiced_at without touching practice_sessions.
+Backfill or repair them with:
+
+    python -m src.services.practice_stats rebuild [--text-id ID]
+"""
+
+import argparse
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from ..models import PracticeSession, PracticeText
+
+
+def increment_values(score: Optional[float], practiced_at: datetime) -> Dict:
+    """UPDATE values folding one new session into its text's statistics
+
+    Expressed in SQL on the current column values, so concurrent inserts do
+    not lose updates.
+    """
+    values = {
+        PracticeText.session_count: PracticeText.session_count + 1,
+        PracticeText.last_practiced_at: case(
+            (PracticeText.last_practiced_at.is_(None), practiced_at),
+            (PracticeText.last_practiced_at < practiced_at, practiced_at),
+            else_=PracticeText.last_practiced_at
+        ),
+    }
+    if score is not None:
+        values.update({
+            PracticeText.scored_session_count: PracticeText.scored_session_count + 1,
+            PracticeText.score_sum: PracticeText.score_sum + score,
+            PracticeText.best_score: case(
+                (PracticeText.best_score.is_(None), score),
+                (PracticeText.best_score < score, score),
+                else_=PracticeText.best_score
+            ),
+        })
+    return values
+
+
+def rebuild_text_stats(db: Session, text_id: Optional[int] = None) -> int:
+    """Recompute statistics from practice_sessions
+
+    Args:
+        db: Database session, committed on return
+        text_id: Only rebuild this text (default: all texts)
+
+    Returns:
+        Number of texts updated
+    """
+    sessions = PracticeSession.__table__
+    of_text = sessions.c.practice_text_id == PracticeText.id
+    scored = sessions.c.pronunciation_score.isnot(None)
+
+    def aggregate(expression, *conditions):
+        return select(expression).where(of_text, *conditions).scalar_subquery()
+
+    query = db.query(PracticeText)
+    if text_id is not None:
+        query = query.filter(PracticeText.id == text_id)
+    updated = query.update({
+        PracticeText.session_count: aggregate(func.count()),
+        PracticeText.scored_session_count: aggregate(func.count(), scored),
+        PracticeText.score_sum: func.coalesce(aggregate(func.sum(sessions.c.pronunciation_score)), 0),
+        PracticeText.best_score: aggregate(func.max(sessions.c.pronunciation_score)),
+        PracticeText.last_practiced_at: aggregate(func.max(sessions.c.created_at)),
+    }, synchronize_session=False)
+    db.commit()
+    return updated
+
+
+if __name__ == '__main__':
+    from ..models.base import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Maintain per-text practice statistics")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--text-id', type=int, default=None)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt statistics of {rebuild_text_stats(db, args.text_id)} texts")
+    finally:
+        db.close()
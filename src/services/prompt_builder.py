@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Prompt construction for AIService.
+
+Every prompt is a static system message, identical across calls of the same
+kind so provider-side prompt caching can reuse it, followed by a compact user
+message holding only the per-call data. Variable inputs are cut to a token
+budget before they are sent.
+
+Token counts use tiktoken (a requirement) with the cl100k_base encoding. If
+the encoding cannot be loaded, e.g. offline without a cached copy, counts
+fall back to a character estimate. Estimates can undercount text dense in
+punctuation, digits or IPA, so budgets are then shrunk by ESTIMATE_MARGIN.
+"""
+
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from ..utils.dsp import summarize_prosody
+from .feedback_cache import BUCKETED_SCORES, prosody_buckets, score_bucket
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+load_dotenv()
+
+# Average characters per token of English text, used without tiktoken
+CHARS_PER_TOKEN = 4
+# Share of a token budget used when counts are estimated
+ESTIMATE_MARGIN = 0.8
+CJK_PATTERN = re.compile(r'[　-〿㐀-鿿＀-￯]')
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?。！？])\s+')
+TRUNCATION_MARK = '…'
+
+TRUNCATION_POLICIES = ('head', 'middle', 'sentences')
+
+FEEDBACK_SYSTEM = {
+    'english': (
+        "You are an expert English pronunciation coach. Provide feedback in English.\n"
+        "Input: a word diff of a text read aloud against its speech recognition result "
+        "([expected→heard], [-missed], [+extra], … = read correctly), the local word accuracy "
+        "and, when available, recognizer scores (0-100) and prosody measured from the recording.\n"
+        "Analyze:\n"
+        "1. Pronunciation accuracy\n"
+        "2. Common mistakes\n"
+        "3. Specific improvement suggestions\n"
+        "4. Phonetic tips for difficult words\n"
+        "Incorporate the scores in your feedback when given, and comment on rhythm, "
+        "pauses and intonation when prosody is given."
+    ),
+    'chinese': (
+        "你是一位专业的英语发音教练。请用中文提供反馈。\n"
+        "输入：朗读文本与语音识别结果的逐词差异（[原词→识别为]、[-漏读]、[+多读]、… 表示读对的部分），"
+        "本地单词准确率，以及可能提供的识别评分（0-100）和从录音测得的韵律数据。\n"
+        "请分析以下几点：\n"
+        "1. 发音准确度\n"
+        "2. 常见错误\n"
+        "3. 具体改进建议\n"
+        "4. 难词的发音技巧\n"
+        "如有评分，请将其纳入你的反馈中；如有韵律数据，请点评节奏、停顿和语调。"
+    ),
+}
+
+FEEDBACK_USER = {
+    'english': "Words: {words}\nDiff: {diff}\nLocal word accuracy: {accuracy:.0f}%",
+    'chinese': "单词数：{words}\n差异：{diff}\n本地单词准确率：{accuracy:.0f}%",
+}
+
+NO_DIFF = {
+    'english': "none, every word was recognized as written",
+    'chinese': "无，所有单词均被正确识别",
+}
+
+PROSODY_USER = {
+    'english': "Prosody: {speaking_rate} syllables/s overall, {articulation_rate} while speaking, "
+               "{pause_count} pauses (mean {pause_mean}s, longest {pause_max}s), "
+               "pitch median {f0_median} Hz with a {f0_range_semitones} semitone range",
+    'chinese': "韵律：整体语速 {speaking_rate} 音节/秒，发声时 {articulation_rate} 音节/秒，"
+               "停顿 {pause_count} 次（平均 {pause_mean} 秒，最长 {pause_max} 秒），"
+               "音高中位数 {f0_median} Hz，音域 {f0_range_semitones} 个半音",
+}
+
+SCORES_USER = {
+    'english': "Scores: pronunciation {pronunciation_score}, accuracy {accuracy_score}, "
+               "fluency {fluency_score}, completeness {completeness_score}",
+    'chinese': "评分：总体发音 {pronunciation_score}，准确性 {accuracy_score}，"
+               "流畅度 {fluency_score}，完整度 {completeness_score}",
+}
+
+# Only as precise as a feedback cache key, see coarse_feedback_details()
+SCORE_BANDS_USER = {
+    'english': "Score bands (refer to the band, not an exact score): accuracy {accuracy_score}, "
+               "fluency {fluency_score}, completeness {completeness_score}",
+    'chinese': "评分区间（请按区间点评，不要给出具体分数）：准确性 {accuracy_score}，"
+               "流畅度 {fluency_score}，完整度 {completeness_score}",
+}
+
+PROSODY_BANDS_USER = {
+    'english': "Prosody: about {speaking_rate} syllables/s, {pause_count} pauses, "
+               "pitch range {f0_range_semitones} semitones",
+    'chinese': "韵律：语速约 {speaking_rate} 音节/秒，停顿 {pause_count} 次，音域 {f0_range_semitones} 个半音",
+}
+
+PHONETIC_GUIDE_SYSTEM = (
+    "You are an expert in English phonetics and pronunciation.\n"
+    "Give phonetic guidance for the user's text, focusing on:\n"
+    "1. Stress patterns\n"
+    "2. Difficult sounds\n"
+    "3. Word linking\n"
+    "4. Natural rhythm\n"
+    "Include IPA symbols where helpful."
+)
+
+WORD_GUIDE_SYSTEM = (
+    "You are an expert in English pronunciation and phonetics.\n"
+    "Give a pronunciation guide for the user's word in markdown, with:\n"
+    "1. IPA transcription\n"
+    "2. Syllable breakdown\n"
+    "3. Stress pattern\n"
+    "4. Common pronunciation mistakes\n"
+    "5. Similar sounding words\n"
+    "6. Example sentences"
+)
+
+WORD_GUIDE_BATCH_SYSTEM = (
+    "You are an expert in English pronunciation and phonetics.\n"
+    "Return a JSON object {\"words\": [...]} with one entry per word the user lists. "
+    "Each entry: {\"word\": str, \"ipa\": str (General American), \"syllables\": [str], "
+    "\"stress\": str (which syllable is stressed), \"tips\": str (one short tip in the "
+    "requested language)}. JSON only."
+)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None and tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding('cl100k_base')
+            except Exception:
+                # The encoding file may not be downloadable, fall back to estimates
+                _encoding = False
+        return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in a text, exact with tiktoken, estimated otherwise
+
+    The estimate counts each CJK character as a token and every
+    CHARS_PER_TOKEN other characters as one.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / CHARS_PER_TOKEN)
+
+
+def count_message_tokens(messages: List[Dict]) -> int:
+    """Tokens of a chat message list, including the per-message overhead"""
+    return sum(count_tokens(message['content']) + 4 for message in messages) + 2
+
+
+def compact(text: str) -> str:
+    """Strip indentation, collapse runs of spaces and drop blank lines"""
+    lines = (re.sub(r'[ \t]+', ' ', line).strip() for line in (text or '').splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def _cut(text: str, max_tokens: int, from_end: bool = False) -> str:
+    """Longest prefix (or suffix) of text within max_tokens, on a word boundary"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        piece = encoding.decode(tokens[-max_tokens:] if from_end else tokens[:max_tokens])
+    else:
+        # Shrink a character cut until the estimate fits, CJK text takes more tokens per character
+        size = max_tokens * CHARS_PER_TOKEN
+        piece = text[-size:] if from_end else text[:size]
+        while piece and count_tokens(piece) > max_tokens:
+            size = int(size * 0.9)
+            piece = text[-size:] if from_end else text[:size]
+    if len(piece) < len(text) and ' ' in piece:
+        piece = piece.split(' ', 1)[1] if from_end else piece.rsplit(' ', 1)[0]
+    return piece.strip()
+
+
+def truncate_tokens(text: str, max_tokens: int, policy: str = 'head') -> str:
+    """Cut a text to a token budget
+
+    Args:
+        text: Input text
+        max_tokens: Token budget for the returned text
+        policy: 'head' keeps the beginning, 'middle' keeps the beginning and
+            the end, 'sentences' keeps as many leading whole sentences as fit
+
+    Returns:
+        The text unchanged if it fits, otherwise the kept part with a
+        truncation mark where text was dropped
+    """
+    if policy not in TRUNCATION_POLICIES:
+        raise ValueError(f"Unknown truncation policy: {policy}")
+    if _get_encoding() is None:
+        max_tokens = max(int(max_tokens * ESTIMATE_MARGIN), 1)
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    budget = max(max_tokens - count_tokens(f" {TRUNCATION_MARK} "), 1)
+    if policy == 'middle':
+        return f"{_cut(text, budget // 2)} {TRUNCATION_MARK} {_cut(text, budget - budget // 2, from_end=True)}"
+
+    if policy == 'sentences':
+        kept = []
+        used = 0
+        for sentence in SENTENCE_PATTERN.split(text):
+            cost = count_tokens(sentence) + 1
+            if used + cost > budget:
+                break
+            kept.append(sentence)
+            used += cost
+        if kept:
+            return f"{' '.join(kept)} {TRUNCATION_MARK}"
+        # A single overlong sentence is cut like 'head'
+
+    return f"{_cut(text, budget)} {TRUNCATION_MARK}"
+
+
+def _max_input_tokens() -> int:
+    return int(os.getenv('PROMPT_MAX_INPUT_TOKENS', 1500))
+
+
+def _prompt(name: str, system: str, user: str) -> Dict:
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+    return {'name': name, 'messages': messages, 'prompt_tokens': count_message_tokens(messages)}
+
+
+def _band(index: Optional[int], width: float, upper: float) -> str:
+    """Range of the width-sized band number index, N/A if missing"""
+    if index is None:
+        return 'N/A'
+    low = index * width
+    return f"{low:g}" if low >= upper else f"{low:g}-{min(low + width, upper):g}"
+
+
+def coarse_feedback_details(azure_details: Optional[Dict], prosody: Optional[Dict],
+                            bucket_width: float) -> tuple:
+    """Score bands and coarse prosody of a reading, as much as its feedback cache key holds
+
+    Returns:
+        (SCORE_BANDS_USER fields or None, PROSODY_BANDS_USER fields or None)
+    """
+    scores = None
+    if azure_details:
+        scores = {name: _band(score_bucket(azure_details.get(name), bucket_width), bucket_width, 100)
+                  for name in BUCKETED_SCORES}
+    rhythm = None
+    buckets = prosody_buckets(prosody)
+    if buckets is not None:
+        rate, pauses, semitone_band = buckets
+        rhythm = {
+            'speaking_rate': 'N/A' if rate is None else rate,
+            'pause_count': '5+' if pauses >= 5 else pauses,
+            'f0_range_semitones': _band(semitone_band, 3, math.inf),
+        }
+    return scores, rhythm
+
+
+def build_feedback_prompt(alignment: Dict, diff: str, language: str = 'english',
+                          azure_details: Optional[Dict] = None,
+                          max_input_tokens: Optional[int] = None,
+                          prosody: Optional[Dict] = None,
+                          bucket_width: Optional[float] = None) -> Dict:
+    """Pronunciation feedback prompt from a word alignment
+
+    Args:
+        alignment: align_words() result
+        diff: compact_diff() of the alignment, cut to the token budget
+        language: Feedback language ('english' or 'chinese')
+        azure_details: Azure assessment scores, added when given
+        max_input_tokens: Budget for the diff (default PROMPT_MAX_INPUT_TOKENS)
+        prosody: analyze_prosody() of the recording, its headline numbers are added when given
+        bucket_width: Score band width of the feedback cache the reply goes to. Scores and
+            prosody are then only given as coarsely as the cache key holds them, so the reply
+            fits every reading it is served for
+
+    Returns:
+        dict with the prompt name, chat messages and prompt_tokens
+    """
+    language = language if language in FEEDBACK_SYSTEM else 'english'
+    diff = truncate_tokens(diff, max_input_tokens or _max_input_tokens()) if diff else NO_DIFF[language]
+    user = FEEDBACK_USER[language].format(words=alignment['reference_words'], diff=diff,
+                                          accuracy=alignment['accuracy'])
+    if bucket_width:
+        scores, rhythm = coarse_feedback_details(azure_details, prosody, bucket_width)
+        if scores:
+            user += '\n' + SCORE_BANDS_USER[language].format(**scores)
+        if rhythm:
+            user += '\n' + PROSODY_BANDS_USER[language].format(**rhythm)
+        return _prompt('pronunciation_feedback', FEEDBACK_SYSTEM[language], user)
+    if azure_details:
+        scores = {key: azure_details.get(key, 'N/A') for key in
+                  ('pronunciation_score', 'accuracy_score', 'fluency_score', 'completeness_score')}
+        user += '\n' + SCORES_USER[language].format(**scores)
+    summary = summarize_prosody(prosody)
+    if summary:
+        user += '\n' + PROSODY_USER[language].format(**{key: 'N/A' if value is None else value
+                                                         for key, value in summary.items()})
+    return _prompt('pronunciation_feedback', FEEDBACK_SYSTEM[language], user)
+
+
+def build_phonetic_guide_prompt(text: str, max_input_tokens: Optional[int] = None) -> Dict:
+    """Phonetic guidance prompt, long texts keep their leading whole sentences"""
+    text = truncate_tokens(compact(text), max_input_tokens or _max_input_tokens(), policy='sentences')
+    return _prompt('phonetic_guide', PHONETIC_GUIDE_SYSTEM, text)
+
+
+def build_word_guide_prompt(word: str) -> Dict:
+    """Detailed pronunciation guide prompt for one word"""
+    return _prompt('word_guide', WORD_GUIDE_SYSTEM, word.strip())
+
+
+def build_word_guide_batch_prompt(words: List[str], language: str = 'english') -> Dict:
+    """Structured guides prompt for a chunk of words"""
+    tips_language = 'Chinese' if language == 'chinese' else 'English'
+    return _prompt('word_guide_batch', WORD_GUIDE_BATCH_SYSTEM,
+                   f"Tips in {tips_language}. Words: {', '.join(words)}")
+
+
+class PromptStats:
+    """Prompt token counts per prompt name
+
+    Records the local estimate for every call and, when the provider reports
+    usage, its prompt and cached token counts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, name: str, estimated: int, reported: Optional[int] = None,
+               cached: Optional[int] = None):
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                'calls': 0, 'estimated_tokens': 0, 'reported_calls': 0,
+                'reported_tokens': 0, 'cached_tokens': 0, 'max_estimated_tokens': 0,
+            })
+            stats['calls'] += 1
+            stats['estimated_tokens'] += estimated
+            stats['max_estimated_tokens'] = max(stats['max_estimated_tokens'], estimated)
+            if reported is not None:
+                stats['reported_calls'] += 1
+                stats['reported_tokens'] += reported
+                stats['cached_tokens'] += cached or 0
+
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            metrics = {}
+            for name, stats in self._stats.items():
+                metrics[name] = dict(stats)
+                metrics[name]['mean_estimated_tokens'] = stats['estimated_tokens'] / stats['calls']
+                if stats['reported_calls']:
+                    metrics[name]['mean_reported_tokens'] = stats['reported_tokens'] / stats['reported_calls']
+                    metrics[name]['cached_ratio'] = stats['cached_tokens'] / max(stats['reported_tokens'], 1)
+            return metrics
+
+
+_prompt_stats = PromptStats()
+
+
+def get_prompt_stats() -> PromptStats:
+    """Return the process-wide prompt token statistics"""
+    return _prompt_stats
+
+
+def get_prompt_metrics() -> Dict[str, Dict[str, float]]:
+    """Return prompt token metrics for every prompt name"""
+    return _prompt_stats.get_metrics()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Comparison of a learner's recording with the native reference reading.
+
+SpeechService.synthesize_reference() reads the practice text with the neural
+voice and reports when each word is spoken. Both recordings become MFCC
+frames, trimmed to their speech and normalized per recording so microphone
+and voice differences cancel out, and are aligned with banded DTW. Words
+whose aligned frames lie furthest apart are the ones that sound least like
+the reference. The distance is relative, it ranks the words of one reading
+and is not a pronunciation score.
+"""
+
+import io
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from ..utils.cache import LRUCache
+from ..utils.dsp import HOP_SECONDS, banded_dtw, speech_features
+from ..utils.logger import setup_logger
+from .audio_executor import get_audio_executor
+from .word_guide_store import text_key
+
+logger = setup_logger(__name__)
+
+load_dotenv()
+
+# How far the learner may drift from the reference timing, in seconds
+DEFAULT_BAND_SECONDS = 2.0
+DEFAULT_WORST_WORDS = 3
+
+
+def _normalized(features: np.ndarray, speech: np.ndarray) -> np.ndarray:
+    """Speech frames between the first and last one, without c0, mean and variance normalized"""
+    first, last = np.flatnonzero(speech)[[0, -1]]
+    features = features[first:last + 1, 1:]
+    return (features - features.mean(axis=0)) / (features.std(axis=0) + 1e-6)
+
+
+def compare_features(samples: np.ndarray, sample_rate: int, reference: np.ndarray, reference_rate: int,
+                     words: List[Dict], band_seconds: float = DEFAULT_BAND_SECONDS,
+                     worst: int = DEFAULT_WORST_WORDS) -> Optional[Dict]:
+    """Align a recording to the reference reading and score each reference word
+
+    Args:
+        samples: Learner's mono samples
+        sample_rate: Their sample rate in Hz
+        reference: Reference reading's mono samples
+        reference_rate: Its sample rate in Hz
+        words: Reference word spans, [{'text', 'start', 'end'}] in seconds
+        band_seconds: Sakoe-Chiba band half-width
+        worst: Words returned in 'worst'
+
+    Returns:
+        {'distance': mean aligned frame distance, 'words': per reference word
+        its 'text', learner 'start'/'end' in seconds, 'distance' and
+        'relative' (to the median word), 'worst': the highest 'relative'
+        words}, or None if either recording holds no speech
+    """
+    features, speech = speech_features(samples, sample_rate)
+    reference_features, reference_speech = speech_features(reference, reference_rate)
+    if not speech.any() or not reference_speech.any() or not words:
+        return None
+    offset = int(np.flatnonzero(speech)[0])
+    reference_offset = int(np.flatnonzero(reference_speech)[0])
+    x = _normalized(reference_features, reference_speech)
+    y = _normalized(features, speech)
+
+    rows, cols, total = banded_dtw(x, y, int(band_seconds / HOP_SECONDS))
+    step_cost = np.linalg.norm(x[rows] - y[cols], axis=1)
+
+    # Reference word of each path step, -1 between words
+    frames = rows + reference_offset
+    starts = np.array([word['start'] for word in words]) / HOP_SECONDS
+    ends = np.array([word['end'] for word in words]) / HOP_SECONDS
+    index = np.searchsorted(starts, frames, side='right') - 1
+    index[(index >= 0) & (frames >= ends[np.maximum(index, 0)])] = -1
+    on_word = index >= 0
+    index, cost, learner = index[on_word], step_cost[on_word], cols[on_word] + offset
+
+    counts = np.bincount(index, minlength=len(words))
+    sums = np.bincount(index, weights=cost, minlength=len(words))
+    first = np.full(len(words), np.iinfo(np.int64).max)
+    last = np.full(len(words), -1)
+    np.minimum.at(first, index, learner)
+    np.maximum.at(last, index, learner)
+
+    spoken = np.flatnonzero(counts)
+    if len(spoken) == 0:
+        return None
+    distances = sums[spoken] / counts[spoken]
+    median = float(np.median(distances))
+    scored = [{
+        'text': words[i]['text'],
+        'start': round(float(first[i] * HOP_SECONDS), 2),
+        'end': round(float((last[i] + 1) * HOP_SECONDS), 2),
+        'distance': round(float(distance), 3),
+        'relative': round(float(distance / median), 2) if median > 0 else None,
+    } for i, distance in zip(spoken, distances)]
+    return {
+        'distance': round(total / len(rows), 3),
+        'words': scored,
+        'worst': sorted(scored, key=lambda word: word['distance'], reverse=True)[:worst],
+    }
+
+
+_references = None
+_references_lock = threading.Lock()
+
+
+def _get_reference_cache() -> LRUCache:
+    global _references
+    with _references_lock:
+        if _references is None:
+            _references = LRUCache(max_entries=int(os.getenv('REFERENCE_CACHE_SIZE', 64)))
+        return _references
+
+
+def get_reference(text: str, speech_service, language: str = 'english') -> Optional[Dict]:
+    """Decoded reference reading of a text, synthesized once per process
+
+    Returns:
+        {'samples', 'sample_rate', 'words'} or None if synthesis failed
+    """
+    import soundfile as sf
+
+    cache = _get_reference_cache()
+    key = text_key(text, language)
+    reference = cache.get(key)
+    if reference is None:
+        synthesized = speech_service.synthesize_reference(text, language)
+        if not synthesized:
+            return None
+        samples, sample_rate = sf.read(io.BytesIO(synthesized['audio_data']), dtype='float32', always_2d=True)
+        reference = {'samples': samples.mean(axis=1), 'sample_rate': sample_rate, 'words': synthesized['words']}
+        cache.put(key, reference)
+    return reference
+
+
+def compare_to_reference(audio_file: str, text: str, speech_service) -> Optional[Dict]:
+    """compare_features() of a recording against the reference reading of its text
+
+    The alignment runs in the audio process pool.
+    """
+    from .audio_encoding import load_mono
+
+    reference = get_reference(text, speech_service)
+    if reference is None:
+        return None
+    samples, sample_rate = load_mono(audio_file)
+    return get_audio_executor().run(
+        compare_features, samples, sample_rate, reference['samples'], reference['sample_rate'],
+        reference['words'],
+        band_seconds=float(os.getenv('REFERENCE_BAND_SECONDS', DEFAULT_BAND_SECONDS)),
+    )
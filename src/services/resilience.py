@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from dotenv import load_dotenv
+
+from ..utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+load_dotenv()
+
+# HTTP statuses worth retrying: timeouts, conflicts, throttling, server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """Transient upstream failure, e.g. throttling or a dropped connection
+
+    Args:
+        message: Error description
+        retry_after: Server-suggested delay in seconds, if any
+        throttled: Upstream asked us to slow down, e.g. a 429
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, throttled: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.throttled = throttled
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while its circuit breaker is open"""
+
+
+class TokenBucket:
+    """Token-bucket rate limiter
+
+    Args:
+        rate: Tokens added per second
+        capacity: Maximum burst size
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take one token, waiting up to timeout seconds for it"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe -> closed
+
+    While open every call fails fast. After reset_timeout a limited number of
+    probe calls are let through, a success closes the circuit and a failure
+    opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_probes: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go upstream now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Circuit open, upstream is failing")
+                self.state = self.HALF_OPEN
+                self._probes_in_flight = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    raise CircuitOpenError("Circuit half-open, probe in progress")
+                self._probes_in_flight += 1
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probes_in_flight = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit opened after {self._failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probes_in_flight = 0
+
+    def release_probe(self):
+        """Give back a half-open probe slot that ended without a verdict"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probes_in_flight:
+                self._probes_in_flight -= 1
+
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency limit that follows observed latency (AIMD)
+
+    The limit grows by one per window of fast completions and shrinks
+    multiplicatively when upstream throttles us, or when a call's latency
+    rises above tolerance times the best latency seen recently for calls of
+    the same kind. Baselines are kept per kind, so a short word guide and a
+    long feedback reply sharing one upstream are each compared with their
+    own kind rather than the fastest call overall.
+    """
+
+    def __init__(self, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 tolerance: float = 2.0, backoff: float = 0.7):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self._min_latency: Dict[Any, float] = {}
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            ok = self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout=timeout)
+            if ok:
+                self.in_flight += 1
+            return ok
+
+    def release(self, latency: Optional[float], throttled: bool = False, kind: Any = None):
+        """Release a slot and adapt the limit from the call outcome
+
+        Args:
+            latency: Seconds the call took, None when it failed
+            throttled: Upstream asked us to slow down
+            kind: Call type whose latency baseline the call is compared with
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif latency is not None:
+                baseline = self._min_latency.get(kind)
+                if baseline is None or latency < baseline:
+                    baseline = latency
+                else:
+                    # Let the baseline drift up slowly so one lucky call does not pin it
+                    baseline *= 1.01
+                self._min_latency[kind] = baseline
+                if latency > baseline * self.tolerance:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class ResiliencePolicy:
+    """Rate limiting, retry with jittered backoff and circuit breaking for one upstream
+
+    Args:
+        name: Upstream name, used in logs and metrics
+        rate: Requests per second allowed by the token bucket
+        burst: Token bucket capacity
+        max_attempts: Attempts per call, including the first
+        base_delay: First retry delay in seconds, doubled per attempt
+        max_delay: Retry delay cap in seconds
+        retry_on: Exception types treated as retryable besides RetryableError
+        breaker: Circuit breaker, default opens after 5 consecutive failures. Calls
+            naming a circuit (e.g. a model) get their own breaker configured alike
+        limiter: Adaptive concurrency limiter
+        acquire_timeout: Seconds to wait for a rate or concurrency slot
+    """
+
+    def __init__(self, name: str, rate: float = 5.0, burst: float = 10.0,
+                 max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 20.0,
+                 retry_on: Tuple[Type[BaseException], ...] = (),
+                 breaker: Optional[CircuitBreaker] = None,
+                 limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                 acquire_timeout: float = 60.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.acquire_timeout = acquire_timeout
+
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._metrics = {
+            'calls': 0,
+            'attempts': 0,
+            'retries': 0,
+            'throttled': 0,
+            'failures': 0,
+            'rejected_open_circuit': 0,
+        }
+
+    def breaker_for(self, circuit: Optional[str] = None) -> CircuitBreaker:
+        """Breaker of one circuit, created like the policy's own on first use, None for the policy's"""
+        if circuit is None:
+            return self.breaker
+        with self._lock:
+            breaker = self._breakers.get(circuit)
+            if breaker is None:
+                breaker = self._breakers[circuit] = CircuitBreaker(
+                    self.breaker.failure_threshold, self.breaker.reset_timeout, self.breaker.half_open_probes
+                )
+            return breaker
+
+    @staticmethod
+    def is_throttled(error: BaseException) -> bool:
+        return getattr(error, 'status_code', None) == 429 or getattr(error, 'throttled', False)
+
+    def is_retryable(self, error: BaseException) -> bool:
+        if isinstance(error, RetryableError) or (self.retry_on and isinstance(error, self.retry_on)):
+            return True
+        return getattr(error, 'status_code', None) in RETRYABLE_STATUS_CODES
+
+    def backoff_delay(self, attempt: int, error: BaseException) -> float:
+        """Full-jitter exponential backoff, honouring a server Retry-After"""
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is None:
+            response = getattr(error, 'response', None)
+            header = response.headers.get('retry-after') if response is not None else None
+            try:
+                retry_after = float(header) if header else None
+            except ValueError:
+                retry_after = None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _count(self, key: str):
+        with self._lock:
+            self._metrics[key] += 1
+
+    def call(self, fn: Callable[..., Any], *args, latency_kind: Any = None, circuit: Optional[str] = None,
+             max_attempts: Optional[int] = None, **kwargs) -> Any:
+        """Call fn through the rate limiter, concurrency limiter and circuit breaker
+
+        Retryable errors are retried with backoff, the last one is re-raised.
+        Other exceptions propagate immediately and do not trip the breaker.
+        Only throttling shrinks the concurrency limit, a failing model says
+        nothing about the capacity left for the others.
+
+        The keyword-only options are not passed to fn:
+            latency_kind: Call type the concurrency limiter compares this call's latency with
+            circuit: Breaker to use, e.g. the model, so one failing model does not open
+                the circuit for the others
+            max_attempts: Fewer attempts for this call than the policy's, e.g. when a fallback exists
+        """
+        self._count('calls')
+        breaker = self.breaker_for(circuit)
+        max_attempts = min(max_attempts or self.max_attempts, self.max_attempts)
+        for attempt in range(max_attempts):
+            try:
+                breaker.allow()
+            except CircuitOpenError:
+                self._count('rejected_open_circuit')
+                raise
+            if not self.bucket.acquire(timeout=self.acquire_timeout) or \
+                    not self.limiter.acquire(timeout=self.acquire_timeout):
+                breaker.release_probe()
+                raise RetryableError(f"{self.name}: timed out waiting for a request slot")
+
+            self._count('attempts')
+            start_time = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                retryable = self.is_retryable(e)
+                throttled = self.is_throttled(e)
+                self.limiter.release(None, throttled=throttled)
+                if not retryable:
+                    breaker.release_probe()
+                    raise
+                breaker.record_failure()
+                self._count('throttled' if throttled else 'failures')
+                if attempt + 1 >= max_attempts:
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                logger.warning(f"{self.name}: retryable error ({e}), retry {attempt + 1} in {delay:.2f}s")
+                self._count('retries')
+                time.sleep(delay)
+                continue
+
+            self.limiter.release(time.monotonic() - start_time, kind=latency_kind)
+            breaker.record_success()
+            return result
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            breakers = dict(self._breakers)
+        metrics['circuit_state'] = self.breaker.state
+        metrics['circuits'] = {circuit: breaker.state for circuit, breaker in breakers.items()}
+        metrics['concurrency_limit'] = int(self.limiter.limit)
+        metrics['in_flight'] = self.limiter.in_flight
+        return metrics
+
+
+def _env_float(prefix: str, key: str, default: float) -> float:
+    value = os.getenv(f"{prefix}_{key}")
+    return float(value) if value else default
+
+
+def policy_from_env(name: str, prefix: str, **kwargs) -> ResiliencePolicy:
+    """Build a policy whose limits can be overridden with <PREFIX>_* variables
+
+    E.g. OPENAI_RATE_LIMIT, OPENAI_BURST, OPENAI_MAX_ATTEMPTS,
+    OPENAI_CIRCUIT_FAILURES, OPENAI_CIRCUIT_RESET_SECONDS, OPENAI_MAX_CONCURRENCY.
+    """
+    return ResiliencePolicy(
+        name,
+        rate=_env_float(prefix, 'RATE_LIMIT', 5.0),
+        burst=_env_float(prefix, 'BURST', 10.0),
+        max_attempts=int(_env_float(prefix, 'MAX_ATTEMPTS', 4)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(_env_float(prefix, 'CIRCUIT_FAILURES', 5)),
+            reset_timeout=_env_float(prefix, 'CIRCUIT_RESET_SECONDS', 30.0),
+        ),
+        limiter=AdaptiveConcurrencyLimiter(
+            initial_limit=int(_env_float(prefix, 'MAX_CONCURRENCY', 16)) // 2 or 1,
+            max_limit=int(_env_float(prefix, 'MAX_CONCURRENCY', 16)),
+        ),
+        **kwargs
+    )
+
+
+_policies: Dict[str, ResiliencePolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(name: str, factory: Optional[Callable[[], ResiliencePolicy]] = None) -> ResiliencePolicy:
+    """Return the process-wide policy for an upstream, creating it on first use"""
+    with _policies_lock:
+        if name not in _policies:
+            _policies[name] = factory() if factory else ResiliencePolicy(name)
+        return _policies[name]
+
+
+def get_resilience_metrics() -> Dict[str, Dict[str, Any]]:
+    """Return metrics for every upstream policy"""
+    with _policies_lock:
+        policies = list(_policies.values())
+    return {policy.name: policy.get_metrics() for policy in policies}
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Daily and weekly score rollups for long-range progress charts.
+
+practice_rollups holds one row per resolution (day, week), scope (a text or a
+category) and UTC bucket, with the count, sum, min and max of every score.
+create_practice_session folds each new session into its four rows in the
+same transaction as the insert. get_progress() switches to weekly rows once
+a range has more days than a chart has points, so a year-long chart reads
+about 53 rows per text or category instead of every session. Backfill or repair them with:
+
+    python -m src.services.rollups rebuild
+"""
+
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+from ..models import PracticeRollup, PracticeSession, PracticeText
+from ..models.practice_rollup import ROLLUP_SCORES
+
+# Days per bucket, finest first
+RESOLUTIONS = {'day': 1, 'week': 7}
+SCOPES = ('text', 'category')
+DEFAULT_MAX_POINTS = 120
+
+
+def bucket_start(moment: datetime, resolution: str) -> date:
+    """First day of the bucket a UTC timestamp falls in, weeks start on Monday"""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if resolution == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def bucket_keys(text_id: int, category: Optional[str],
+                practiced_at: datetime) -> Iterator[Tuple[str, str, str, date]]:
+    """(resolution, scope, scope_key, bucket_start) of every rollup row a session belongs to"""
+    scopes = [('text', str(text_id))]
+    if category:
+        scopes.append(('category', category))
+    for resolution in RESOLUTIONS:
+        for scope, scope_key in scopes:
+            yield resolution, scope, scope_key, bucket_start(practiced_at, resolution)
+
+
+def _increment_values(scores: Dict[str, Optional[float]]) -> Dict:
+    """UPDATE values folding one session's scores into a rollup row, in SQL like increment_values"""
+    values = {PracticeRollup.session_count: PracticeRollup.session_count + 1}
+    for name in ROLLUP_SCORES:
+        score = scores.get(name)
+        if score is None:
+            continue
+        low, high = getattr(PracticeRollup, f'{name}_min'), getattr(PracticeRollup, f'{name}_max')
+        values.update({
+            getattr(PracticeRollup, f'{name}_count'): getattr(PracticeRollup, f'{name}_count') + 1,
+            getattr(PracticeRollup, f'{name}_sum'): getattr(PracticeRollup, f'{name}_sum') + score,
+            low: case((low.is_(None), score), (low > score, score), else_=low),
+            high: case((high.is_(None), score), (high < score, score), else_=high),
+        })
+    return values
+
+
+def _initial_values(scores: Dict[str, Optional[float]]) -> Dict:
+    values = {'session_count': 1}
+    for name in ROLLUP_SCORES:
+        score = scores.get(name)
+        if score is not None:
+            values.update({f'{name}_count': 1, f'{name}_sum': score, f'{name}_min': score, f'{name}_max': score})
+    return values
+
+
+def apply_session(db: Session, text_id: int, category: Optional[str], practiced_at: datetime,
+                  scores: Dict[str, Optional[float]]):
+    """Fold one session into its daily and weekly rows, without committing
+
+    Args:
+        db: Database session of the session insert
+        text_id: Practice text of the session
+        category: Category of that text
+        practiced_at: UTC creation time of the session
+        scores: Score name (see ROLLUP_SCORES) -> value or None
+    """
+    increments = _increment_values(scores)
+    for resolution, scope, scope_key, start in bucket_keys(text_id, category, practiced_at):
+        updated = db.query(PracticeRollup).filter(
+            PracticeRollup.resolution == resolution,
+            PracticeRollup.scope == scope,
+            PracticeRollup.scope_key == scope_key,
+            PracticeRollup.bucket_start == start,
+        ).update(increments, synchronize_session=False)
+        if not updated:
+            # The UPDATE already holds SQLite's write lock, so no other writer
+            # can insert the same bucket before this transaction commits
+            db.add(PracticeRollup(resolution=resolution, scope=scope, scope_key=scope_key,
+                                  bucket_start=start, **_initial_values(scores)))
+    db.flush()
+
+
+def rebuild_rollups(db: Session) -> int:
+    """Recompute every rollup row from practice_sessions
+
+    Args:
+        db: Database session, committed on return
+
+    Returns:
+        Number of rollup rows written
+    """
+    columns = [getattr(PracticeSession, f'{name}_score') for name in ROLLUP_SCORES]
+    rows = (db.query(PracticeSession.practice_text_id, PracticeText.category,
+                     PracticeSession.created_at, *columns)
+            .join(PracticeText, PracticeSession.practice_text_id == PracticeText.id)
+            .yield_per(1000))
+
+    buckets: Dict[tuple, Dict] = {}
+    for text_id, category, created_at, *values in rows:
+        if created_at is None:
+            continue
+        scores = dict(zip(ROLLUP_SCORES, values))
+        for key in bucket_keys(text_id, category, created_at):
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = _initial_values(scores)
+                continue
+            bucket['session_count'] += 1
+            for name, score in scores.items():
+                if score is None:
+                    continue
+                if f'{name}_count' not in bucket:
+                    bucket.update({f'{name}_count': 1, f'{name}_sum': score,
+                                   f'{name}_min': score, f'{name}_max': score})
+                    continue
+                bucket[f'{name}_count'] += 1
+                bucket[f'{name}_sum'] += score
+                bucket[f'{name}_min'] = min(bucket[f'{name}_min'], score)
+                bucket[f'{name}_max'] = max(bucket[f'{name}_max'], score)
+
+    db.query(PracticeRollup).delete(synchronize_session=False)
+    db.bulk_insert_mappings(PracticeRollup, [
+        dict(values, resolution=resolution, scope=scope, scope_key=scope_key, bucket_start=start)
+        for (resolution, scope, scope_key, start), values in buckets.items()
+    ])
+    db.commit()
+    return len(buckets)
+
+
+def choose_resolution(start: date, end: date, max_points: int = DEFAULT_MAX_POINTS) -> str:
+    """Finest resolution with at most max_points buckets in [start, end], else the coarsest"""
+    days = (end - start).days + 1
+    for resolution, bucket_days in RESOLUTIONS.items():
+        if -(-days // bucket_days) <= max_points:
+            return resolution
+    return list(RESOLUTIONS)[-1]
+
+
+def get_progress(db: Session, scope: str, scope_key, start: date, end: date,
+                 max_points: int = DEFAULT_MAX_POINTS, resolution: Optional[str] = None) -> Dict:
+    """Score series of a text or category between two dates, read from the rollups
+
+    Args:
+        db: Database session
+        scope: 'text' or 'category'
+        scope_key: Text id or category name
+        start: First day of the range (inclusive)
+        end: Last day of the range (inclusive)
+        max_points: Most buckets wanted, picks the resolution
+        resolution: Force 'day' or 'week' instead
+
+    Returns:
+        {'resolution', 'points'}, points being PracticeRollup.to_dict() in date order
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown rollup scope: {scope}")
+    resolution = resolution or choose_resolution(start, end, max_points)
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown rollup resolution: {resolution}")
+    rows = db.query(PracticeRollup).filter(
+        PracticeRollup.resolution == resolution,
+        PracticeRollup.scope == scope,
+        PracticeRollup.scope_key == str(scope_key),
+        PracticeRollup.bucket_start >= bucket_start(start, resolution),
+        PracticeRollup.bucket_start <= end,
+    ).order_by(PracticeRollup.bucket_start).all()
+    return {'resolution': resolution, 'points': [row.to_dict() for row in rows]}
+
+
+if __name__ == '__main__':
+    from ..models.base import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Maintain daily and weekly score rollups")
+    parser.add_argument('command', choices=['rebuild'])
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_rollups(db)} rollup rows")
+    finally:
+        db.close()
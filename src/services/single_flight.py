@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import functools
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from ..utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class _Call:
+    """An in-flight upstream call shared by every caller with the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent identical calls onto one upstream call
+
+    The first caller for a key (the leader) runs the function. Callers that
+    arrive with the same key while it is running block until it finishes and
+    receive the same result, or the same exception. Nothing is cached once the
+    call completes, so later callers trigger a fresh upstream call.
+
+    Thread-safe, Streamlit runs each session's script in its own thread.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._requests = 0
+        self._upstream_calls = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) unless an identical call is already in flight"""
+        with self._lock:
+            self._requests += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._upstream_calls += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                logger.info(f"[{self.name}] fanned out one upstream result to {call.waiters} waiters")
+            call.done.set()
+        return call.result
+
+    def get_metrics(self) -> Dict[str, float]:
+        """Return request, upstream and coalescing counts for this group"""
+        with self._lock:
+            requests = self._requests
+            return {
+                'requests': requests,
+                'upstream_calls': self._upstream_calls,
+                'coalesced': self._coalesced,
+                'in_flight': len(self._calls),
+                'coalescing_ratio': self._coalesced / requests if requests else 0.0,
+            }
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Return the process-wide single-flight group with the given name"""
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+
+def get_single_flight_metrics() -> Dict[str, Dict[str, float]]:
+    """Return metrics for every single-flight group"""
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.get_metrics() for group in groups}
+
+
+def request_key(name: str, *args, **kwargs) -> str:
+    """Build a stable key from a call's name and arguments"""
+    payload = json.dumps([name, args, kwargs], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def coalesced(group: str):
+    """Decorate a service method so identical concurrent calls share one upstream call
+
+    The key covers the method name, the instance's ``single_flight_scope``
+    and all other arguments. The scope is a fingerprint of what shapes the
+    upstream request (endpoint, policy, voice...), so instances configured
+    alike share calls and others never see each other's results. Instances
+    without one only coalesce with themselves.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            scope = getattr(self, 'single_flight_scope', None)
+            if scope is None:
+                scope = f"instance:{id(self)}"
+            key = request_key(method.__qualname__, scope, *args, **kwargs)
+            return get_single_flight(group).do(key, method, self, *args, **kwargs)
+        return wrapper
+    return decorator
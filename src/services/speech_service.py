@@ -5,45 +5,142 @@
 import azure.cognitiveservices.speech as speechsdk
 import os
 from dotenv import load_dotenv
-from typing import Dict
+from contextlib import contextmanager
+from typing import Dict, Optional
 import logging
 from ..config.i18n import get_text
+from .audio_store import get_audio_store
+from .audio_encoding import UPLOAD_FORMATS, encode_for_upload
+from .single_flight import coalesced
+from .resilience import RetryableError, get_policy, policy_from_env
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Azure compressed-stream containers for each compressed upload format
+COMPRESSED_CONTAINERS = {
+    'flac': speechsdk.AudioStreamContainerFormat.FLAC,
+    'ogg_opus': speechsdk.AudioStreamContainerFormat.OGG_OPUS,
+}
+
+# Cancellation codes that mean "try again later" rather than "request is wrong"
+RETRYABLE_CANCELLATION_CODES = {
+    speechsdk.CancellationErrorCode.TooManyRequests,
+    speechsdk.CancellationErrorCode.ServiceTimeout,
+    speechsdk.CancellationErrorCode.ServiceUnavailable,
+    speechsdk.CancellationErrorCode.ConnectionFailure,
+}
+
+def _raise_if_retryable(result):
+    """Turn a throttled or dropped Azure result into a RetryableError"""
+    if result.reason != speechsdk.ResultReason.Canceled:
+        return
+    details = result.cancellation_details
+    code = getattr(details, 'code', None) or getattr(details, 'error_code', None)
+    if code in RETRYABLE_CANCELLATION_CODES:
+        raise RetryableError(f"Azure request canceled: {code} {details.error_details}",
+                             throttled=code == speechsdk.CancellationErrorCode.TooManyRequests)
+
+def _speech_policy():
+    return policy_from_env('azure_speech', 'AZURE_SPEECH')
+
+def pronunciation_recognizer(speech_config, audio_config, pronunciation_config):
+    """SDK recognizer with pronunciation assessment applied, the default recognizer factory"""
+    speech_recognizer = speechsdk.SpeechRecognizer(
+        speech_config=speech_config,
+        audio_config=audio_config
+    )
+    pronunciation_config.apply_to(speech_recognizer)
+    return speech_recognizer
+
 class SpeechService:
-    def __init__(self):
+    def __init__(self, resilience=None, recognizer_factory=None, synthesizer_factory=None):
+        """
+        Args:
+            resilience: ResiliencePolicy, default the process-wide 'azure_speech' policy
+            recognizer_factory: (speech_config, audio_config, pronunciation_config) -> recognizer
+                with recognize_once(), default pronunciation_recognizer; load tests pass stubs
+            synthesizer_factory: (speech_config, audio_config) -> synthesizer with
+                speak_ssml_async() and synthesis_word_boundary, default speechsdk.SpeechSynthesizer
+        """
         self.speech_config = speechsdk.SpeechConfig(
             subscription=os.getenv('AZURE_SPEECH_KEY'),
             region=os.getenv('AZURE_SPEECH_REGION')
         )
+        self.upload_format = os.getenv('AZURE_UPLOAD_FORMAT', 'wav')
+        self.resilience = resilience or get_policy('azure_speech', _speech_policy)
+        self.recognizer_factory = recognizer_factory or pronunciation_recognizer
+        self.synthesizer_factory = synthesizer_factory or speechsdk.SpeechSynthesizer
+
+    @property
+    def single_flight_scope(self):
+        """What decides the upstream request besides the arguments, see coalesced()"""
+        return [self.speech_config.region, id(self.resilience), id(self.synthesizer_factory)]
+
+    @contextmanager
+    def _audio_config(self, audio_file: str, upload_format: str):
+        """Yield an AudioConfig feeding the recording in the requested format
+
+        'wav' hands Azure a WAV file path. Compressed formats are encoded in
+        memory and pushed through a compressed input stream, which the Speech
+        SDK decodes with GStreamer.
+        """
+        if upload_format not in UPLOAD_FORMATS:
+            raise ValueError(f"Unsupported upload format: {upload_format}")
+
+        if upload_format == 'wav':
+            # Azure file input only reads WAV, stored recordings are FLAC
+            with get_audio_store().as_wav(audio_file) as wav_file:
+                logger.debug(f"Uploading WAV audio: {os.path.getsize(wav_file)} bytes")
+                yield speechsdk.AudioConfig(filename=wav_file)
+            return
+
+        data, encode_time = encode_for_upload(audio_file, upload_format)
+        logger.debug(f"Uploading {upload_format} audio: {len(data)} bytes, encoded in {encode_time * 1000:.1f} ms")
+
+        stream_format = speechsdk.audio.AudioStreamFormat(
+            compressed_stream_format=COMPRESSED_CONTAINERS[upload_format]
+        )
+        push_stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+        push_stream.write(data)
+        push_stream.close()
+        yield speechsdk.audio.AudioConfig(stream=push_stream)
 
-    def analyze_pronunciation(self, audio_file: str, reference_text: str) -> Dict[str, float]:
-        """Comprehensive pronunciation analysis using Azure Speech Services"""
+    def analyze_pronunciation(self, audio_file: str, reference_text: str,
+                              upload_format: Optional[str] = None) -> Dict[str, float]:
+        """Comprehensive pronunciation analysis using Azure Speech Services
+        
+        Args:
+            audio_file: Recording path
+            reference_text: Text the learner read
+            upload_format: 'wav', 'flac' or 'ogg_opus' (default AZURE_UPLOAD_FORMAT)
+        """
         try:
-            logger.info(f"Starting pronunciation analysis for text length: {len(reference_text)}")
+            logger.debug(f"Starting pronunciation analysis for text length: {len(reference_text)}")
             
-            audio_config = speechsdk.AudioConfig(filename=audio_file)
             pronunciation_config = speechsdk.PronunciationAssessmentConfig(
                 reference_text=reference_text,
                 grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
                 granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme
             )
             
-            speech_recognizer = speechsdk.SpeechRecognizer(
-                speech_config=self.speech_config,
-                audio_config=audio_config
-            )
-            
-            pronunciation_config.apply_to(speech_recognizer)
+            def recognize():
+                # A fresh audio stream per attempt, push streams are consumed once read
+                with self._audio_config(audio_file, upload_format or self.upload_format) as audio_config:
+                    speech_recognizer = self.recognizer_factory(
+                        self.speech_config, audio_config, pronunciation_config
+                    )
+                    
+                    result = speech_recognizer.recognize_once()
+                _raise_if_retryable(result)
+                return result
             
-            result = speech_recognizer.recognize_once()
+            result = self.resilience.call(recognize, latency_kind='recognition')
             
             if result.reason == speechsdk.ResultReason.RecognizedSpeech:
                 pronunciation_result = speechsdk.PronunciationAssessmentResult(result)
-                logger.info("Pronunciation analysis completed successfully")
+                logger.debug("Pronunciation analysis completed successfully")
                 
                 return {
                     'transcribed_text': result.text,
@@ -129,46 +226,64 @@ class SpeechService:
         
         return speech_recognizer
 
-    def text_to_speech(self, text, language='english', speed=1.0):
-        """Convert text to speech using Azure TTS
-        
+    def _synthesize(self, text, language='english', speed=1.0, on_word_boundary=None):
+        """Synthesize SSML for the text with the language's neural voice
+
         Args:
             text: Text to convert to speech
             language: Language code ('english' or 'chinese')
             speed: Speech rate (0.5 to 2.0)
+            on_word_boundary: Optional callback for synthesis_word_boundary events
         """
-        try:
-            speech_config = self.speech_config
-            
-            # Set voice based on language
-            if language == 'english':
-                voice_name = "en-US-JennyNeural"
-                lang_code = "en-US"
-            else:
-                voice_name = "zh-CN-XiaoxiaoNeural"
-                lang_code = "zh-CN"
-            
-            speech_config.speech_synthesis_voice_name = voice_name
-            
-            # Create SSML with rate and pitch adjustment
-            ssml = f"""
-            <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{lang_code}">
-                <voice name="{voice_name}">
-                    <prosody rate="{speed:.0%}" pitch="0%">
-                        {text}
-                    </prosody>
-                </voice>
-            </speak>
-            """
-            
+        speech_config = self.speech_config
+        
+        # Set voice based on language
+        if language == 'english':
+            voice_name = "en-US-JennyNeural"
+            lang_code = "en-US"
+        else:
+            voice_name = "zh-CN-XiaoxiaoNeural"
+            lang_code = "zh-CN"
+        
+        speech_config.speech_synthesis_voice_name = voice_name
+        
+        # Create SSML with rate and pitch adjustment
+        ssml = f"""
+        <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{lang_code}">
+            <voice name="{voice_name}">
+                <prosody rate="{speed:.0%}" pitch="0%">
+                    {text}
+                </prosody>
+            </voice>
+        </speak>
+        """
+        
+        def synthesize():
             # Use memory stream
-            synthesizer = speechsdk.SpeechSynthesizer(
+            synthesizer = self.synthesizer_factory(
                 speech_config=speech_config,
                 audio_config=None
             )
-            
-            # Use SSML for speech synthesis
+            if on_word_boundary:
+                synthesizer.synthesis_word_boundary.connect(on_word_boundary)
             result = synthesizer.speak_ssml_async(ssml).get()
+            _raise_if_retryable(result)
+            return result
+        
+        # Use SSML for speech synthesis
+        return self.resilience.call(synthesize, latency_kind='synthesis')
+
+    @coalesced('azure_tts')
+    def text_to_speech(self, text, language='english', speed=1.0):
+        """Convert text to speech using Azure TTS
+        
+        Args:
+            text: Text to convert to speech
+            language: Language code ('english' or 'chinese')
+            speed: Speech rate (0.5 to 2.0)
+        """
+        try:
+            result = self._synthesize(text, language, speed)
             
             if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
                 return result.audio_data
@@ -179,3 +294,35 @@ class SpeechService:
         except Exception as e:
             logger.error(f"TTS error: {str(e)}")
             raise Exception(get_text('tts_error', language, error=str(e)))
+
+    @coalesced('azure_tts')
+    def synthesize_reference(self, text, language='english') -> Optional[Dict]:
+        """Native reading of a text at normal speed with the time span of each word
+        
+        Args:
+            text: Text to convert to speech
+            language: Language code ('english' or 'chinese')
+        
+        Returns:
+            {'audio_data': WAV bytes, 'words': [{'text', 'start', 'end'}]} with
+            times in seconds, or None if synthesis failed
+        """
+        # Keyed by offset, a retried synthesis reports the same words again
+        words = {}
+        
+        def word_boundary(evt):
+            if evt.boundary_type != speechsdk.SpeechSynthesisBoundaryType.Word:
+                return
+            # audio_offset is in 100 ns ticks
+            start = evt.audio_offset / 1e7
+            words[evt.audio_offset] = {'text': evt.text, 'start': start, 'end': start + evt.duration.total_seconds()}
+        
+        try:
+            result = self._synthesize(text, language, 1.0, on_word_boundary=word_boundary)
+        except Exception as e:
+            logger.error(f"Reference synthesis error: {str(e)}")
+            raise
+        if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+            logger.error(f"Reference synthesis failed: {result.reason}")
+            return None
+        return {'audio_data': result.audio_data, 'words': [words[offset] for offset in sorted(words)]}
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from ..config.i18n import get_text
+from ..utils.cache import LRUCache
+from ..utils.text import normalize_word
+
+load_dotenv()
+
+
+def text_key(text: str, language: str) -> str:
+    """Stable key for a practice text and feedback language"""
+    return hashlib.sha256(f"{language}\n{text}".encode('utf-8')).hexdigest()
+
+
+def format_word_guide(guide: Dict, language: str = 'english') -> str:
+    """Render a structured word guide as markdown"""
+    lines = [f"**{guide.get('word', '')}**"]
+    if guide.get('ipa'):
+        lines.append(f"- {get_text('guide_ipa', language)}: /{guide['ipa'].strip('/')}/")
+    if guide.get('syllables'):
+        syllables = guide['syllables']
+        if isinstance(syllables, list):
+            syllables = ' · '.join(syllables)
+        lines.append(f"- {get_text('guide_syllables', language)}: {syllables}")
+    if guide.get('stress'):
+        lines.append(f"- {get_text('guide_stress', language)}: {guide['stress']}")
+    if guide.get('tips'):
+        lines.append(f"- {get_text('guide_tips', language)}: {guide['tips']}")
+    return '\n'.join(lines)
+
+
+class WordGuideStore:
+    """Process-wide store of structured pronunciation guides per word
+
+    Guides are keyed by normalized word and feedback language and kept in an
+    LRU cache, so words pasted once by any learner are eventually evicted.
+    Texts whose words have all been fetched are remembered with the words
+    they got guides for, so later lookups on those texts never leave the
+    process while those guides are still cached.
+
+    Args:
+        max_words: Guides kept before the least recently used is evicted
+        max_texts: Prepared texts remembered
+    """
+
+    def __init__(self, max_words: int = 10000, max_texts: int = 1000):
+        self._lock = threading.Lock()
+        self._guides = LRUCache(max_words)
+        self._prepared_texts = LRUCache(max_texts)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, word: str, language: str = 'english') -> Optional[Dict]:
+        guide = self._guides.get((normalize_word(word), language))
+        with self._lock:
+            if guide is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return guide
+
+    def get_many(self, words: Iterable[str], language: str = 'english') -> Dict[str, Optional[Dict]]:
+        """Guides for several words keyed by normalized word, without touching hit counts"""
+        return {normalize_word(word): self._guides.get((normalize_word(word), language)) for word in words}
+
+    def put_many(self, guides: Iterable[Dict], language: str = 'english'):
+        for guide in guides:
+            if guide.get('word'):
+                self._guides.put((normalize_word(guide['word']), language), guide)
+
+    def missing(self, words: Iterable[str], language: str = 'english') -> List[str]:
+        """Normalized words that have no stored guide yet"""
+        return [word for word in words if self._guides.get((normalize_word(word), language)) is None]
+
+    def is_prepared(self, text: str, language: str = 'english') -> bool:
+        """Whether the text was prepared and none of its guides has been evicted since"""
+        words = self._prepared_texts.get(text_key(text, language))
+        return words is not None and not self.missing(words, language)
+
+    def mark_prepared(self, text: str, language: str = 'english', words: Iterable[str] = ()):
+        """Remember a prepared text and the words it has guides for"""
+        self._prepared_texts.put(text_key(text, language), tuple(words))
+
+    def get_metrics(self) -> Dict[str, int]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            'words': len(self._guides),
+            'prepared_texts': len(self._prepared_texts),
+            'hits': hits,
+            'misses': misses,
+            'evictions': self._guides.evictions,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_word_guide_store() -> WordGuideStore:
+    """Return the process-wide word guide store, sized by WORD_GUIDE_CACHE_SIZE"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = WordGuideStore(
+                max_words=int(os.getenv('WORD_GUIDE_CACHE_SIZE', 10000)),
+                max_texts=int(os.getenv('WORD_GUIDE_TEXT_CACHE_SIZE', 1000)),
+            )
+        return _store
@@ -1,11 +1,22 @@
-from .components import (
-    TextInputComponent,
-    AnalysisComponent,
-    PlaybackComponent,
-    PracticeHistoryComponent,
-    TextGuidanceComponent,
-    App
-)
-from .recording_visualizer import RecordingVisualizer
-
-__all__ = ['TextInputComponent', 'AnalysisComponent', 'PlaybackComponent', 'PracticeHistoryComponent', 'TextGuidanceComponent', 'App', 'RecordingVisualizer']
+# Components are imported on first access (PEP 562), so plotly is only
+# loaded when RecordingVisualizer is actually used
+from ..utils.lazy import lazy_getattr
+
+_EXPORTS = {
+    'TextInputComponent': '.components',
+    'AnalysisComponent': '.components',
+    'PlaybackComponent': '.components',
+    'PracticeHistoryComponent': '.components',
+    'TextGuidanceComponent': '.components',
+    'App': '.components',
+    'render_memory_panel': '.components',
+    'RecordingVisualizer': '.recording_visualizer',
+}
+
+__all__ = list(_EXPORTS)
+
+__getattr__ = lazy_getattr(__name__, _EXPORTS, globals())
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -16,10 +16,58 @@ if not logger.handlers:
     logger.addHandler(console_handler)
 
 import streamlit as st
+import os
 import time
 import numpy as np
 import queue
 from src.config.i18n import get_text
+from src.utils.text import normalize_word, unique_words
+from src.utils.dsp import summarize_prosody
+from src.services.analysis_jobs import get_analysis_queue, submit_analysis, submit_feedback
+from src.services.db_service import DBService
+from src.services.playback_review import get_playback_review
+from src.utils.memory_profiler import get_memory_profiler
+from datetime import datetime
+
+# Seconds between reruns while a job is queued or running
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+
+def poll_job(job_id, message_key, language):
+    """Show the progress of a queued job and rerun until it has finished
+    
+    Returns the job once it succeeded or failed, the error of a failed job
+    is shown here. Returns None if the job no longer exists. A job may have
+    been persisted by a worker in another process, so the cached reads of
+    the practice text it changed are dropped.
+    """
+    job = get_analysis_queue().get(job_id)
+    if job is None:
+        st.warning(get_text('job_missing', language))
+        return None
+    if job['status'] == 'failed':
+        st.error(get_text('analysis_failed', language, error=job['error']))
+        return job
+    if job['status'] == 'succeeded':
+        text_id = (job['result'] or {}).get('practice_text_id')
+        if text_id:
+            DBService().invalidate_text(text_id)
+        return job
+    if job['status'] == 'queued' and job['attempts']:
+        st.warning(get_text('job_retrying', language, attempt=job['attempts'] + 1,
+                            max_attempts=job['max_attempts'], error=job['error']))
+    elif job['status'] == 'queued':
+        st.info(get_text('job_queued', language))
+    with st.spinner(get_text(message_key, language)):
+        time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
+
+def format_text_option(text, language):
+    """Selector label of a practice text: its content and practice statistics"""
+    if not text.get('session_count'):
+        return f"{text['content']} ({get_text('never_practiced', language)})"
+    best = f"{text['best_score']:.0f}" if text.get('best_score') is not None else '-'
+    last = text['last_practiced_at'].strftime('%Y-%m-%d') if text.get('last_practiced_at') else '-'
+    return f"{text['content']} ({get_text('text_stats', language, count=text['session_count'], best=best, last=last)})"
 
 class TextInputComponent:
     def __init__(self, app):
@@ -46,11 +94,12 @@ class TextInputComponent:
             # Get preset text list
             preset_texts = self.app.db_service.get_preset_texts()
             
-            # Text selection dropdown
+            # Text selection dropdown, with each text's precomputed practice statistics
+            labels = {text['id']: format_text_option(text, current_language) for text in preset_texts}
             selected_text_id = st.selectbox(
                 get_text('text_selection_title', current_language), 
                 options=[text['id'] for text in preset_texts],
-                format_func=lambda x: next(text['content'] for text in preset_texts if text['id'] == x),
+                format_func=lambda x: labels[x],
                 disabled=disabled
             )
             
@@ -136,10 +185,92 @@ class RecordingComponent:
             st.success(get_text('recording_saved', current_language, 
                               duration=st.session_state.get('audio_duration', 0)))
 
+def render_word_diff(alignment, language):
+    """Show the word-level reading diff with its local accuracy"""
+    st.markdown(f"### {get_text('word_diff_title', language)}")
+    st.metric(get_text('local_accuracy', language), f"{alignment['accuracy']:.0f}%")
+    
+    parts = []
+    for operation in alignment['operations']:
+        if operation['type'] == 'correct':
+            parts.append(operation['reference'])
+        elif operation['type'] == 'substitution':
+            parts.append(f"~~{operation['reference']}~~ :red[**{operation['spoken']}**]")
+        elif operation['type'] == 'omission':
+            parts.append(f":orange[~~{operation['reference']}~~]")
+        else:
+            parts.append(f":blue[+{operation['spoken']}]")
+    st.markdown(' '.join(parts))
+    st.caption(get_text('word_diff_legend', language))
+
+def render_prosody(prosody, language):
+    """Show speaking rate, pauses and pitch range measured from the recording"""
+    summary = summarize_prosody(prosody)
+    if summary is None:
+        return
+    st.markdown(f"### {get_text('prosody_title', language)}")
+
+    def shown(value, unit=''):
+        return f"{value}{unit}" if value is not None else "N/A"
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric(get_text('speaking_rate', language), shown(summary['speaking_rate']))
+    col2.metric(get_text('pause_count', language), summary['pause_count'],
+                help=get_text('pause_help', language, mean=shown(summary['pause_mean'], ' s'),
+                              longest=shown(summary['pause_max'], ' s')))
+    col3.metric(get_text('pitch_range', language), shown(summary['f0_range_semitones']))
+    st.caption(get_text('prosody_legend', language))
+
+def render_reference_comparison(comparison, language):
+    """Show the words that sound least like the native reference reading"""
+    worst = [word for word in comparison.get('worst', []) if (word.get('relative') or 0) > 1]
+    if not worst:
+        return
+    st.markdown(f"### {get_text('reference_title', language)}")
+    st.markdown(' · '.join(
+        f"**{word['text']}** ({word['start']:.1f}s, ×{word['relative']:.1f})" for word in worst
+    ))
+    st.caption(get_text('reference_legend', language))
+
+def render_memory_panel(language):
+    """Show the memory profiler's latest figures in the sidebar, when MEMORY_PROFILING is on"""
+    profiler = get_memory_profiler()
+    if not profiler.enabled:
+        return
+
+    def mib(size):
+        return f"{size / 2 ** 20:.1f} MiB" if size is not None else "N/A"
+
+    with st.sidebar.expander(get_text('memory_title', language)):
+        measure_caches = st.checkbox(get_text('memory_measure_caches', language), key='memory_measure_caches')
+        report = profiler.report(services=measure_caches)
+        st.metric(get_text('memory_traced', language), mib(report['traced_bytes']),
+                  help=get_text('memory_peak', language, peak=mib(report['traced_peak_bytes'])))
+        
+        st.markdown(f"**{get_text('memory_sessions', language)}**")
+        st.table([{
+            'session': session['session_id'][:8],
+            'MiB': round(session['bytes'] / 2 ** 20, 2),
+            'idle s': session['idle_seconds'],
+            'keys': ', '.join(f"{key} {size / 2 ** 20:.1f}" for key, size in list(session['keys'].items())[:3]),
+        } for session in report['sessions']])
+        
+        st.markdown(f"**{get_text('memory_allocators', language)}**")
+        st.table([{
+            'location': os.path.join(*allocator['location'].split(os.sep)[-2:]),
+            'growth KiB': round(allocator['growth'] / 1024, 1),
+            'KiB': round(allocator['size'] / 1024, 1),
+        } for allocator in report['top_allocators']])
+        
+        if 'services' in report:
+            st.markdown(f"**{get_text('memory_caches', language)}**")
+            st.table([{'cache': name, 'MiB': round(size / 2 ** 20, 2)} for name, size in report['services'].items()])
+        st.caption(get_text('memory_legend', language, sessions=report['released']['sessions'],
+                            released=mib(report['released']['bytes'])))
+
 class AnalysisComponent:
     def __init__(self, app):
         self.app = app
-        self.analysis_start_time = None
 
     def render(self):
         current_language = st.session_state.get('language', 'english')
@@ -160,45 +291,75 @@ class AnalysisComponent:
         if 'analysis_error' not in st.session_state:
             st.session_state.analysis_error = False
 
+        # Results and jobs belong to one recording, a new one starts over
+        if st.session_state.get('analysis_audio_file') != st.session_state.audio_file:
+            st.session_state.analysis_audio_file = st.session_state.audio_file
+            st.session_state.analysis_job_id = None
+            st.session_state.feedback_job_id = None
+            st.session_state.analysis_completed = False
+            st.session_state.pronunciation_result = None
+            st.session_state.alignment = None
+            st.session_state.prosody = None
+            st.session_state.reference_comparison = None
+            st.session_state.practice_session_id = None
+            st.session_state.ai_feedback = None
+            st.session_state.analysis_error = False
+
         col1, col2 = st.columns([3, 1])
         
         with col1:
-            # Only show analysis button if not completed or error occurred
-            if not st.session_state.analysis_completed or st.session_state.analysis_error:
+            # Only show analysis button if no analysis is queued or running
+            if not st.session_state.get('analysis_job_id') and not st.session_state.analysis_completed:
                 if st.button(get_text('start_analysis', current_language)):
-                    with st.spinner(get_text('analyzing', current_language)):
-                        logger.info("Starting pronunciation analysis...")
-                        self.analysis_start_time = time.time()
-                        
-                        try:
-                            practice_text = st.session_state.get('practice_text', '')
-                            audio_file = st.session_state.get('audio_file')
-                            
-                            logger.info(f"Calling Azure Speech assessment, text length: {len(practice_text)}")
-                            st.session_state.pronunciation_result = self.app.speech_service.analyze_pronunciation(
-                                audio_file, 
-                                practice_text
-                            )
-                            logger.info("Azure Speech assessment completed")
-                            
-                            st.session_state.analysis_completed = True
-                            st.session_state.analysis_error = False
-                        except Exception as e:
-                            error_msg = get_text('unknown_error', current_language, error=str(e))
-                            logger.error(error_msg)
-                            st.error(error_msg)
-                            st.session_state.analysis_error = True
+                    practice_text = st.session_state.get('practice_text', '')
+                    logger.debug(f"Submitting pronunciation analysis, text length: {len(practice_text)}")
+                    job = submit_analysis(
+                        st.session_state.audio_file,
+                        practice_text,
+                        st.session_state.get('current_text_id')
+                    )
+                    st.session_state.analysis_job_id = job['id']
+                    st.session_state.analysis_error = False
+        
+        # The job runs on a worker, reruns and refreshes only restart the polling
+        if st.session_state.get('analysis_job_id') and not st.session_state.analysis_completed:
+            job = poll_job(st.session_state.analysis_job_id, 'analyzing', current_language)
+            if job is None:
+                # Nothing to retry, the learner starts a new analysis
+                st.session_state.analysis_job_id = None
+            elif job['status'] == 'succeeded':
+                st.session_state.pronunciation_result = job['result']['pronunciation']
+                # Local word diff, available before any LLM call
+                st.session_state.alignment = job['result']['alignment']
+                st.session_state.prosody = job['result'].get('prosody')
+                st.session_state.reference_comparison = job['result'].get('reference')
+                st.session_state.practice_session_id = job['result'].get('practice_session_id')
+                st.session_state.analysis_completed = True
+                st.session_state.analysis_error = False
+            else:
+                st.session_state.analysis_error = True
         
         with col2:
-            if self.analysis_start_time:
-                st.write(get_text('analysis_time', current_language, 
-                    time=time.time() - self.analysis_start_time))
+            job_id = st.session_state.get('analysis_job_id')
+            job = get_analysis_queue().get(job_id) if job_id else None
+            if job and job['finished_at']:
+                elapsed = datetime.fromisoformat(job['finished_at']) - datetime.fromisoformat(job['created_at'])
+                st.write(get_text('analysis_time', current_language, time=elapsed.total_seconds()))
 
         # Display analysis results
         if st.session_state.analysis_completed and st.session_state.pronunciation_result:
             st.markdown(f"### {get_text('recognized_text', current_language)}")
             st.text(st.session_state.pronunciation_result.get('transcribed_text', ''))
             
+            if st.session_state.get('alignment'):
+                render_word_diff(st.session_state.alignment, current_language)
+            
+            if st.session_state.get('reference_comparison'):
+                render_reference_comparison(st.session_state.reference_comparison, current_language)
+            
+            if st.session_state.get('prosody'):
+                render_prosody(st.session_state.prosody, current_language)
+            
             st.markdown(f"### {get_text('score_details', current_language)}")
             
             score_metrics = [
@@ -214,44 +375,44 @@ class AnalysisComponent:
                 st.progress(score / 100)
             
             # AI feedback button
-            if st.button(get_text('get_ai_feedback', current_language)):
-                with st.spinner(get_text('getting_feedback', current_language)):
-                    try:
-                        logger.info(f"Preparing AI service call, text length: {len(st.session_state.get('practice_text', ''))}")
-                        logger.info(f"Recognized text length: {len(st.session_state.pronunciation_result.get('transcribed_text', ''))}")
-                        
-                        st.session_state.ai_feedback = self.app.ai_service.get_pronunciation_feedback(
-                            st.session_state.get('practice_text', ''),
-                            st.session_state.pronunciation_result.get('transcribed_text', ''),
-                            language=st.session_state.get('language', 'english'),
-                            azure_details=st.session_state.pronunciation_result
-                        )
-                        
-                        logger.info(f"AI feedback received, length: {len(st.session_state.ai_feedback)}")
-                        logger.info(f"AI feedback preview: {st.session_state.ai_feedback[:100]}...")
-                        
-                        # Add success message
-                        st.success(get_text('completed', current_language))
-                    except Exception as e:
-                        error_msg = get_text('unknown_error', current_language, error=str(e))
-                        logger.error(error_msg)
-                        st.error(error_msg)
+            if not st.session_state.get('feedback_job_id') and st.button(get_text('get_ai_feedback', current_language)):
+                logger.debug(f"Submitting AI feedback, recognized text length: "
+                             f"{len(st.session_state.pronunciation_result.get('transcribed_text', ''))}")
+                job = submit_feedback(
+                    st.session_state.get('practice_text', ''),
+                    st.session_state.pronunciation_result.get('transcribed_text', ''),
+                    language=st.session_state.get('language', 'english'),
+                    azure_details=st.session_state.pronunciation_result,
+                    alignment=st.session_state.get('alignment'),
+                    practice_session_id=st.session_state.get('practice_session_id'),
+                    prosody=st.session_state.get('prosody')
+                )
+                if job['status'] == 'failed':
+                    job = get_analysis_queue().retry(job['id'])
+                st.session_state.feedback_job_id = job['id']
+            
+            if st.session_state.get('feedback_job_id') and not st.session_state.ai_feedback:
+                job = poll_job(st.session_state.feedback_job_id, 'getting_feedback', current_language)
+                if job is not None and job['status'] == 'succeeded':
+                    st.session_state.ai_feedback = job['result']['feedback']
+                    logger.debug(f"AI feedback received, length: {len(st.session_state.ai_feedback)}")
+                    st.success(get_text('completed', current_language))
+                else:
+                    st.session_state.feedback_job_id = None
             
             # Display AI feedback
             if st.session_state.ai_feedback:
                 st.markdown(f"### {get_text('ai_feedback_title', current_language)}")
                 st.info(st.session_state.ai_feedback)
-                logger.info("AI feedback display completed")
+                logger.debug("AI feedback display completed")
 
         # Only show retry button if analysis failed
         if st.session_state.get('analysis_error'):
             if st.button(get_text('retry_analysis', current_language)):
-                logger.info("Resetting analysis state...")
-                st.session_state.analysis_completed = False
-                st.session_state.pronunciation_result = None
-                st.session_state.ai_feedback = None
+                logger.info("Requeueing failed analysis...")
+                get_analysis_queue().retry(st.session_state.analysis_job_id)
                 st.session_state.analysis_error = False
-                self.analysis_start_time = None
+                st.rerun()
 
 class PlaybackComponent:
     def __init__(self, app):
@@ -263,11 +424,47 @@ class PlaybackComponent:
         if not audio_file:
             return
 
-        st.subheader(get_text('playback_title', st.session_state.get('language', 'english')))
+        current_language = st.session_state.get('language', 'english')
+        st.subheader(get_text('playback_title', current_language))
+        
+        # The recording may have been removed by the audio store retention policy
+        if not os.path.exists(audio_file):
+            st.warning(get_text('no_recording', current_language))
+            return
         
         # Play audio file
+        audio_format = 'audio/flac' if audio_file.endswith('.flac') else 'audio/wav'
         with open(audio_file, 'rb') as audio_bytes:
-            st.audio(audio_bytes.read(), format='audio/wav')
+            st.audio(audio_bytes.read(), format=audio_format)
+        
+        self.render_review(audio_file, current_language)
+
+    def render_review(self, audio_file, language):
+        """Spectrogram and waveform of the selected time range, from cached tiles
+        
+        Nothing is computed until the learner asks for it: an expander runs
+        its body even while collapsed.
+        """
+        if not st.checkbox(get_text('review_title', language), key='show_review'):
+            return
+        review = get_playback_review()
+        content_hash, data = review.get_review(audio_file)
+        duration = max(round(data['duration'], 1), 0.1)
+        # One slider per recording, a new take starts at its full length
+        start, end = st.slider(
+            get_text('review_range', language),
+            min_value=0.0,
+            max_value=duration,
+            value=(0.0, duration),
+            step=0.1,
+            key=f"review_range_{content_hash[:16]}"
+        )
+        if end <= start:
+            end = min(start + 0.1, duration)
+        tile = review.tile(audio_file, start, end)
+        st.image(tile['spectrogram'], use_column_width=True)
+        st.image(tile['waveform'], use_column_width=True)
+        st.caption(get_text('review_legend', language))
 
 class PracticeHistoryComponent:
     def __init__(self, app):
@@ -357,6 +554,11 @@ class TextGuidanceComponent:
                 expanded=True
             ):
                 try:
+                    # One batched call covers every word of the practice text
+                    if normalize_word(selected_word) in unique_words(text):
+                        with st.spinner(get_text('preparing_word_guides', current_language)):
+                            self.app.ai_service.prepare_word_guides(text, language=current_language)
+                    
                     with st.spinner(get_text('getting_guide', current_language)):
                         # Get pronunciation guide
                         guide = self.app.ai_service.get_word_pronunciation_guide(
@@ -367,6 +569,17 @@ class TextGuidanceComponent:
                         # Display guide
                         st.markdown(guide)
                         
+                        if st.button(
+                            get_text('ai_detailed_guide', current_language),
+                            key=f"detail_{selected_word}"
+                        ):
+                            with st.spinner(get_text('getting_guide', current_language)):
+                                st.markdown(self.app.ai_service.get_word_pronunciation_guide(
+                                    selected_word,
+                                    language=current_language,
+                                    detailed=True
+                                ))
+                        
                         # Add pronunciation playback button
                         col1, col2 = st.columns([1, 3])
                         with col1:
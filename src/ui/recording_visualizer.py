@@ -3,10 +3,28 @@ import plotly.graph_objs as go
 import numpy as np
 import threading
 import time
-import logging
 import queue
 
-logger = logging.getLogger(__name__)
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+def waveform_figure(data):
+    """
+    实时声波图，每次界面刷新调用一次
+    """
+    fig = go.Figure(data=go.Scatter(
+        y=data, 
+        mode='lines', 
+        line=dict(color='blue', width=1)
+    ))
+    fig.update_layout(
+        title='实时声波',
+        xaxis_title='采样点',
+        yaxis_title='振幅',
+        height=300
+    )
+    return fig
 
 class RecordingVisualizer:
     def __init__(self, audio_service):
@@ -37,8 +55,10 @@ class RecordingVisualizer:
                             'duration': status['current_duration']
                         })
                     except Exception as concat_error:
-                        logger.error(f"合并录音帧时出错: {concat_error}")
-                        logger.error(f"录音帧详情: {status['recorded_frames']}")
+                        # 只记录帧数和形状，不输出采样数据
+                        frames = status['recorded_frames']
+                        shapes = sorted({getattr(frame, 'shape', None) for frame in frames}, key=str)
+                        logger.error(f"合并录音帧时出错: {concat_error}（{len(frames)} 帧，形状 {shapes[:5]}）")
                 
                 # 仅在状态发生变化时才休眠
                 if status != last_status:
@@ -118,21 +138,9 @@ class RecordingVisualizer:
                             
                             # 安全检查数据
                             if latest_data['data'] is not None and len(latest_data['data']) > 0:
-                                # 更新声波图
-                                fig = go.Figure(data=go.Scatter(
-                                    y=latest_data['data'], 
-                                    mode='lines', 
-                                    line=dict(color='blue', width=1)
-                                ))
-                                fig.update_layout(
-                                    title='实时声波',
-                                    xaxis_title='采样点',
-                                    yaxis_title='振幅',
-                                    height=300
-                                )
-                                
                                 # 更新图表和时间
-                                waveform_placeholder.plotly_chart(fig, use_container_width=True)
+                                waveform_placeholder.plotly_chart(waveform_figure(latest_data['data']),
+                                                                  use_container_width=True)
                                 duration_placeholder.metric(
                                     label="录音时长", 
                                     value=f"{latest_data['duration']:.2f} 秒"
@@ -0,0 +1,423 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized signal processing for recordings: framing, energy, pitch, prosody,
+spectral features and DTW alignment.
+
+Everything works on whole frame matrices with NumPy, no per-sample Python
+loops, so a minute of audio is analyzed in a fraction of a second on one core.
+"""
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Pitch and prosody are computed at this rate, speech F0 is far below 8 kHz
+ANALYSIS_RATE = 16000
+FRAME_SECONDS = 0.04
+HOP_SECONDS = 0.01
+
+F0_MIN = 60.0
+F0_MAX = 400.0
+# Cumulative mean normalized difference below which a lag counts as periodic
+YIN_THRESHOLD = 0.15
+
+# Frames quieter than the loudest speech minus this many dB are silence
+SILENCE_RANGE_DB = 30.0
+SILENCE_FLOOR_DB = -55.0
+MIN_PAUSE_SECONDS = 0.25
+# Syllable nuclei are energy peaks at least this far apart and this prominent
+MIN_SYLLABLE_SECONDS = 0.12
+MIN_SYLLABLE_PROMINENCE_DB = 2.0
+
+PAUSE_BINS = (('short', 0.0, 0.5), ('medium', 0.5, 1.0), ('long', 1.0, np.inf))
+
+# Spectral features: 32 ms windows every HOP_SECONDS at ANALYSIS_RATE
+N_FFT = 512
+N_MELS = 40
+N_MFCC = 13
+MEL_FMIN = 60.0
+MEL_FMAX = 7600.0
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    """float32 mono samples from (frames,) or (frames, channels)"""
+    samples = np.asarray(samples, dtype=np.float32)
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Linear-interpolation resampling, enough for analysis"""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    dst_length = max(int(round(len(samples) * dst_rate / src_rate)), 1)
+    positions = np.arange(dst_length) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def frame_signal(samples: np.ndarray, frame_length: int, hop: int) -> np.ndarray:
+    """Read-only (frames, frame_length) view of a signal, zero-padded to a whole last frame"""
+    missing = frame_length - len(samples) if len(samples) < frame_length else (-(len(samples) - frame_length)) % hop
+    if missing:
+        samples = np.concatenate([samples, np.zeros(missing, dtype=samples.dtype)])
+    return np.lib.stride_tricks.sliding_window_view(samples, frame_length)[::hop]
+
+
+def frame_energy_db(frames: np.ndarray) -> np.ndarray:
+    """Mean power of each frame in dBFS"""
+    return 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-10)
+
+
+def speech_frames(energy_db: np.ndarray) -> np.ndarray:
+    """Mask of frames within SILENCE_RANGE_DB of the loudest speech, above SILENCE_FLOOR_DB"""
+    if len(energy_db) == 0:
+        return np.zeros(0, dtype=bool)
+    threshold = max(float(np.percentile(energy_db, 95)) - SILENCE_RANGE_DB, SILENCE_FLOOR_DB)
+    return energy_db > threshold
+
+
+def yin_f0(frames: np.ndarray, sample_rate: int, f0_min: float = F0_MIN, f0_max: float = F0_MAX,
+           threshold: float = YIN_THRESHOLD, batch: int = 128) -> np.ndarray:
+    """F0 of each frame with YIN, NaN for unvoiced frames
+
+    The difference function of every frame comes from one batched FFT
+    autocorrelation and cumulative sums of squares. The period is the first
+    local minimum of the normalized difference under threshold, refined by
+    parabolic interpolation.
+
+    Args:
+        frames: (frames, frame_length) samples
+        sample_rate: Sample rate of the frames in Hz
+        f0_min: Lowest pitch searched, the frame must hold two of its periods
+        f0_max: Highest pitch searched
+        threshold: Normalized difference that counts as periodic
+        batch: Frames per FFT batch, bounds memory
+    """
+    n_frames, width = frames.shape
+    tau_min = max(int(sample_rate / f0_max), 2)
+    tau_max = min(int(sample_rate / f0_min), width // 2)
+    # Long enough that lags up to tau_max do not wrap around
+    n_fft = 1 << int(np.ceil(np.log2(width + tau_max + 2)))
+    taus = np.arange(tau_max + 2)
+    f0 = np.full(n_frames, np.nan)
+
+    for start in range(0, n_frames, batch):
+        x = frames[start:start + batch].astype(np.float64)
+        x = x - x.mean(axis=1, keepdims=True)
+        spectrum = np.fft.rfft(x, n_fft, axis=1)
+        acf = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, n_fft, axis=1)[:, :tau_max + 2]
+        energy = np.concatenate([np.zeros((len(x), 1)), np.cumsum(x ** 2, axis=1)], axis=1)
+        # d(tau) = sum over the overlap of (x[j] - x[j + tau])^2
+        diff = energy[:, width - taus] + energy[:, [width]] - energy[:, taus] - 2 * acf
+        diff[:, 0] = 0.0
+        running = np.cumsum(diff[:, 1:], axis=1)
+        cmndf = np.ones_like(diff)
+        cmndf[:, 1:] = diff[:, 1:] * taus[1:] / np.where(running > 0, running, np.inf)
+
+        window = cmndf[:, tau_min:tau_max + 1]
+        local_min = (window <= cmndf[:, tau_min - 1:tau_max]) & (window <= cmndf[:, tau_min + 1:tau_max + 2])
+        candidates = local_min & (window < threshold)
+        voiced = candidates.any(axis=1)
+        tau = np.argmax(candidates, axis=1) + tau_min
+
+        rows = np.arange(len(x))
+        left, centre, right = cmndf[rows, tau - 1], cmndf[rows, tau], cmndf[rows, tau + 1]
+        curvature = left - 2 * centre + right
+        shift = np.where(np.abs(curvature) > 1e-12, 0.5 * (left - right) / np.where(curvature == 0, 1, curvature), 0.0)
+        period = tau + np.clip(shift, -1, 1)
+        f0[start:start + batch] = np.where(voiced, sample_rate / period, np.nan)
+    return f0
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end (exclusive) indices of the True runs of a boolean array"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _window_extreme(values: np.ndarray, radius: int, fn) -> np.ndarray:
+    padded = np.pad(values, radius, mode='edge')
+    return fn(np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1), axis=1)
+
+
+def _percentiles(values: np.ndarray, *qs: float):
+    return [float(v) for v in np.percentile(values, qs)] if len(values) else [None] * len(qs)
+
+
+def analyze_prosody(samples: np.ndarray, sample_rate: int) -> Dict:
+    """Pitch, energy, pause and syllable-rate statistics of a recording
+
+    Args:
+        samples: Samples shaped (frames,) or (frames, channels)
+        sample_rate: Sample rate in Hz
+
+    Returns:
+        dict of JSON-serializable statistics. Rates are syllables per second,
+        over the speaking time including pauses (speaking_rate) and without
+        them (articulation_rate). Pitch range and spread are in semitones.
+    """
+    samples = resample(to_mono(samples), sample_rate, ANALYSIS_RATE)
+    hop = int(HOP_SECONDS * ANALYSIS_RATE)
+    frames = frame_signal(samples, int(FRAME_SECONDS * ANALYSIS_RATE), hop)
+    energy = frame_energy_db(frames)
+
+    speech = speech_frames(energy)
+    # Silence has no pitch, only speech frames go through YIN
+    f0 = np.full(len(frames), np.nan)
+    if speech.any():
+        f0[speech] = yin_f0(frames[speech], ANALYSIS_RATE)
+    voiced = ~np.isnan(f0)
+
+    result = {
+        'duration': round(len(samples) / ANALYSIS_RATE, 3),
+        'speech_seconds': 0.0,
+        'voiced_ratio': None,
+        'f0_median': None, 'f0_p10': None, 'f0_p90': None,
+        'f0_range_semitones': None, 'f0_std_semitones': None,
+        'energy_mean_db': None, 'energy_range_db': None,
+        'pause_count': 0, 'pause_total': 0.0, 'pause_mean': None, 'pause_max': None,
+        'pause_durations': [], 'pause_histogram': {name: 0 for name, _, _ in PAUSE_BINS},
+        'syllable_count': 0, 'speaking_rate': None, 'articulation_rate': None,
+    }
+    if not speech.any():
+        return result
+
+    # Pauses are silences between the first and the last speech frame
+    first, last = np.flatnonzero(speech)[[0, -1]]
+    starts, ends = _runs(~speech[first:last + 1])
+    pauses = (ends - starts) * HOP_SECONDS
+    pauses = pauses[pauses >= MIN_PAUSE_SECONDS]
+    span = (last + 1 - first) * HOP_SECONDS
+    speech_seconds = span - float(pauses.sum())
+
+    # Syllable nuclei: voiced, prominent local maxima of the smoothed energy
+    envelope = np.convolve(energy, np.ones(5) / 5, mode='same')
+    radius = max(int(MIN_SYLLABLE_SECONDS / HOP_SECONDS / 2), 1)
+    peaks = ((envelope >= _window_extreme(envelope, radius, np.max))
+             & (envelope - _window_extreme(envelope, 2 * radius, np.min) >= MIN_SYLLABLE_PROMINENCE_DB)
+             & speech & (_window_extreme(voiced.astype(np.int8), 2, np.max) > 0))
+    # Flat tops count once
+    syllables = int(np.count_nonzero(peaks & ~np.concatenate([[False], peaks[:-1]])))
+
+    semitones = 12 * np.log2(f0[voiced] / np.median(f0[voiced])) if voiced.any() else np.array([])
+    p10, median, p90 = _percentiles(f0[voiced], 10, 50, 90)
+    speech_energy = energy[speech]
+    result.update({
+        'speech_seconds': round(speech_seconds, 3),
+        'voiced_ratio': round(float(voiced.sum() / speech.sum()), 3),
+        'f0_median': median, 'f0_p10': p10, 'f0_p90': p90,
+        'f0_range_semitones': 12 * float(np.log2(p90 / p10)) if p10 else None,
+        'f0_std_semitones': float(semitones.std()) if len(semitones) else None,
+        'energy_mean_db': float(speech_energy.mean()),
+        'energy_range_db': float(np.subtract(*np.percentile(speech_energy, [95, 5]))),
+        'pause_count': int(len(pauses)),
+        'pause_total': round(float(pauses.sum()), 3),
+        'pause_mean': float(pauses.mean()) if len(pauses) else None,
+        'pause_max': float(pauses.max()) if len(pauses) else None,
+        'pause_durations': [round(float(p), 2) for p in pauses],
+        'pause_histogram': {name: int(np.count_nonzero((pauses >= low) & (pauses < high)))
+                            for name, low, high in PAUSE_BINS},
+        'syllable_count': syllables,
+        'speaking_rate': syllables / span,
+        'articulation_rate': syllables / speech_seconds if speech_seconds > 0 else None,
+    })
+    return result
+
+
+def summarize_prosody(prosody: Optional[Dict]) -> Optional[Dict]:
+    """Rounded headline numbers of analyze_prosody() for prompts and display"""
+    if not prosody or not prosody.get('speech_seconds'):
+        return None
+
+    def rounded(key, digits=1):
+        value = prosody.get(key)
+        return round(value, digits) if value is not None else None
+
+    return {
+        'speaking_rate': rounded('speaking_rate'),
+        'articulation_rate': rounded('articulation_rate'),
+        'pause_count': prosody['pause_count'],
+        'pause_mean': rounded('pause_mean', 2),
+        'pause_max': rounded('pause_max', 2),
+        'f0_median': rounded('f0_median', 0),
+        'f0_range_semitones': rounded('f0_range_semitones'),
+    }
+
+
+def power_spectrogram(samples: np.ndarray, n_fft: int = N_FFT, hop: int = int(HOP_SECONDS * ANALYSIS_RATE),
+                      batch: int = 2048) -> np.ndarray:
+    """(frames, n_fft // 2 + 1) power spectrum of Hann-windowed frames, float32
+
+    Frames are transformed batch at a time, which bounds the float64 FFT
+    buffers on long recordings.
+    """
+    frames = frame_signal(np.asarray(samples, dtype=np.float32), n_fft, hop)
+    window = np.hanning(n_fft).astype(np.float32)
+    power = np.empty((len(frames), n_fft // 2 + 1), dtype=np.float32)
+    for start in range(0, len(frames), batch):
+        spectrum = np.fft.rfft(frames[start:start + batch] * window, axis=1)
+        power[start:start + batch] = spectrum.real ** 2 + spectrum.imag ** 2
+    return power
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sample_rate: int = ANALYSIS_RATE, n_fft: int = N_FFT, n_mels: int = N_MELS,
+                   fmin: float = MEL_FMIN, fmax: float = MEL_FMAX) -> np.ndarray:
+    """(n_fft // 2 + 1, n_mels) triangular HTK mel filters, read-only"""
+    def to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    edges = 700.0 * (10 ** (np.linspace(to_mel(fmin), to_mel(min(fmax, sample_rate / 2)), n_mels + 2) / 2595.0) - 1)
+    bins = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)[:, None]
+    lower, centre, upper = edges[:-2], edges[1:-1], edges[2:]
+    filters = np.maximum(0.0, np.minimum((bins - lower) / (centre - lower), (upper - bins) / (upper - centre)))
+    filters = filters.astype(np.float32)
+    filters.flags.writeable = False
+    return filters
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n_in: int, n_out: int) -> np.ndarray:
+    """(n_in, n_out) orthonormal DCT-II basis"""
+    k = np.arange(n_out)[None, :]
+    n = np.arange(n_in)[:, None]
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2 * n_in)) * np.sqrt(2.0 / n_in)
+    basis[:, 0] /= np.sqrt(2.0)
+    basis = basis.astype(np.float32)
+    basis.flags.writeable = False
+    return basis
+
+
+def log_mel(samples: np.ndarray, sample_rate: int, n_mels: int = N_MELS) -> np.ndarray:
+    """(frames, n_mels) log mel energies in dB, one frame every HOP_SECONDS"""
+    samples = resample(to_mono(samples), sample_rate, ANALYSIS_RATE)
+    return _log_mel(samples, n_mels)
+
+
+def _log_mel(samples: np.ndarray, n_mels: int = N_MELS) -> np.ndarray:
+    return 10 * np.log10(power_spectrogram(samples) @ mel_filterbank(n_mels=n_mels) + 1e-10)
+
+
+def cepstra(log_mel_frames: np.ndarray, n_mfcc: int = N_MFCC) -> np.ndarray:
+    """(frames, n_mfcc) MFCCs of log mel frames"""
+    return log_mel_frames @ _dct_matrix(log_mel_frames.shape[1], n_mfcc)
+
+
+def mfcc(samples: np.ndarray, sample_rate: int, n_mfcc: int = N_MFCC, n_mels: int = N_MELS) -> np.ndarray:
+    """(frames, n_mfcc) MFCCs of log_mel(), one frame every HOP_SECONDS"""
+    return cepstra(log_mel(samples, sample_rate, n_mels), n_mfcc)
+
+
+def pool(values: np.ndarray, size: int, ufunc: np.ufunc = np.maximum, axis: int = -1) -> np.ndarray:
+    """Reduce an axis to size equal spans with ufunc, repeating values where there are fewer than size"""
+    length = values.shape[axis]
+    starts = (np.arange(size) * length) // size
+    return ufunc.reduceat(values, starts, axis=axis)
+
+
+def peak_envelope(samples: np.ndarray, hop: int) -> np.ndarray:
+    """(2, blocks) minimum and maximum sample of each hop-long block"""
+    samples = np.asarray(samples, dtype=np.float32)
+    blocks = max(-(-len(samples) // hop), 1)
+    padded = np.zeros(blocks * hop, dtype=np.float32)
+    padded[:len(samples)] = samples
+    padded = padded.reshape(blocks, hop)
+    return np.stack([padded.min(axis=1), padded.max(axis=1)])
+
+
+def speech_features(samples: np.ndarray, sample_rate: int,
+                    n_mfcc: int = N_MFCC) -> Tuple[np.ndarray, np.ndarray]:
+    """MFCC frames of a recording and the mask of its speech frames, from one resampling"""
+    samples = resample(to_mono(samples), sample_rate, ANALYSIS_RATE)
+    energy = frame_energy_db(frame_signal(samples, N_FFT, int(HOP_SECONDS * ANALYSIS_RATE)))
+    return cepstra(_log_mel(samples), n_mfcc), speech_frames(energy)
+
+
+def banded_dtw(x: np.ndarray, y: np.ndarray, radius: int,
+               batch: int = 64) -> Tuple[np.ndarray, np.ndarray, float]:
+    """DTW of two feature sequences inside a Sakoe-Chiba band
+
+    Cells of row i are the 2 * radius + 1 columns around the diagonal from
+    (0, 0) to (len(x) - 1, len(y) - 1), so memory is linear in the sequence
+    length: two float rows of accumulated cost and one int8 backpointer per
+    band cell. Each row is a vectorized min-plus prefix scan: with a_j the
+    best of the diagonal and vertical predecessors and C the running sum of
+    the row's local costs, D[j] = C[j] + min over k <= j of (a_k - C[k - 1]).
+
+    Args:
+        x: (n, features) reference sequence
+        y: (m, features) sequence aligned to it
+        radius: Band half-width in frames, widened where the slope needs it
+        batch: Rows whose local costs are computed together, bounds memory
+
+    Returns:
+        (path rows, path columns, total Euclidean cost of the path)
+    """
+    n, m = len(x), len(y)
+    if n == 0 or m == 0:
+        raise ValueError("Cannot align an empty sequence")
+    # Consecutive rows must overlap for the band to stay connected
+    radius = max(int(radius), int(np.ceil(m / n)) + 1)
+    width = 2 * radius + 1
+    centres = np.round(np.arange(n) * ((m - 1) / max(n - 1, 1))).astype(np.int64)
+    offsets = centres - radius
+    columns = np.arange(width)
+    pointers = np.empty((n, width), dtype=np.int8)  # 0 diagonal, 1 vertical, 2 horizontal
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    previous = None
+    for i in range(n):
+        if i % batch == 0:
+            # Local costs of a batch of rows at once, (batch, width) in band coordinates
+            band = offsets[i:i + batch, None] + columns
+            inside = (band >= 0) & (band < m)
+            costs = np.linalg.norm(y[np.clip(band, 0, m - 1)] - x[i:i + batch, None], axis=2)
+        cols = band[i % batch]
+        valid = inside[i % batch]
+        cost = costs[i % batch]
+        if previous is None:
+            # Row 0 starts at (0, 0) and can only move right
+            best = np.full(width, np.inf)
+            best[cols == 0] = 0.0
+            pointer = np.zeros(width, dtype=np.int8)
+        else:
+            shift = offsets[i] - offsets[i - 1]
+            extended = np.full(width + shift + 1, np.inf)
+            extended[1:width + 1] = previous
+            diagonal = extended[shift:shift + width]
+            vertical = extended[shift + 1:shift + 1 + width]
+            pointer = (vertical < diagonal).astype(np.int8)
+            best = np.minimum(diagonal, vertical)
+        finite = np.where(valid, cost, 0.0)
+        running = np.cumsum(finite)
+        before = running - finite
+        scan = np.minimum.accumulate(best - before)
+        row = np.where(valid, running + scan, np.inf)
+        # Came from the left when an earlier cell of the row gives the minimum
+        horizontal = scan < best - before
+        if previous is None:
+            horizontal &= cols > 0
+        pointer[horizontal] = 2
+        pointers[i] = pointer
+        previous = row
+
+    total = float(previous[m - 1 - offsets[-1]])
+    if not np.isfinite(total):
+        raise ValueError("Band too narrow to reach the end of both sequences")
+
+    rows, cols = [n - 1], [m - 1]
+    i, j = n - 1, m - 1
+    while i > 0 or j > 0:
+        step = pointers[i, j - offsets[i]]
+        if step == 2:
+            j -= 1
+        elif step == 1:
+            i -= 1
+        else:
+            i, j = i - 1, j - 1
+        rows.append(i)
+        cols.append(j)
+    return np.array(rows[::-1]), np.array(cols[::-1]), total
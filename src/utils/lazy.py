@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import importlib
+import threading
+from typing import Any, Dict
+
+
+def lazy_getattr(package: str, exports: Dict[str, str], namespace: Dict[str, Any]):
+    """Build a PEP 562 module __getattr__ that imports exports on first access
+
+    Args:
+        package: Name of the package the relative module names belong to
+        exports: Public name -> relative module name defining it
+        namespace: The package's globals(), where loaded names are cached
+    """
+    def __getattr__(name: str) -> Any:
+        if name not in exports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(exports[name], package), name)
+        namespace[name] = value
+        return value
+    return __getattr__
+
+
+class LazyService:
+    """Proxy that builds a service on first attribute access
+
+    Neither the service's module nor its dependencies are imported until
+    then, so pages that never call the service never pay for them.
+
+    Args:
+        module: Absolute module name, e.g. 'src.services.ai_service'
+        name: Class or factory in that module
+        *args, **kwargs: Passed to the constructor
+    """
+
+    def __init__(self, module: str, name: str, *args, **kwargs):
+        object.__setattr__(self, '_target', (module, name, args, kwargs))
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _resolve(self) -> Any:
+        instance = object.__getattribute__(self, '_instance')
+        if instance is None:
+            with object.__getattribute__(self, '_lock'):
+                instance = object.__getattribute__(self, '_instance')
+                if instance is None:
+                    module, name, args, kwargs = object.__getattribute__(self, '_target')
+                    instance = getattr(importlib.import_module(module), name)(*args, **kwargs)
+                    object.__setattr__(self, '_instance', instance)
+        return instance
+
+    @property
+    def is_loaded(self) -> bool:
+        return object.__getattribute__(self, '_instance') is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._resolve(), attr)
+
+    def __setattr__(self, attr: str, value: Any):
+        setattr(self._resolve(), attr, value)
+
+    def __repr__(self) -> str:
+        module, name, _, _ = object.__getattribute__(self, '_target')
+        state = 'loaded' if self.is_loaded else 'not loaded'
+        return f"<LazyService {module}.{name} ({state})>"
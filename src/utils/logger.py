@@ -1,48 +1,259 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+"""
+Non-blocking logging shared by every module of a process.
+
+Loggers from setup_logger() hand their records to a bounded in-memory
+queue. A QueueListener thread writes them to a rotating file and the console
+as text or JSON lines, so a log call on a request thread never waits on the
+disk. A full queue drops records instead of blocking. Messages are cut to
+LOG_MAX_MESSAGE_CHARS when queued. Debug records are sampled per call site,
+1 in LOG_DEBUG_SAMPLE_EVERY, so hot-path debug logs stay affordable with
+LOG_LEVEL=DEBUG.
+
+Child processes (audio pool workers) write to a file of their own, named
+after their PID, since two processes rotating the same file lose records.
+"""
+
+import atexit
+import copy
+import itertools
+import json
 import logging
+import logging.handlers
+import multiprocessing
 import os
-from datetime import datetime
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """Cut text to max_chars, noting how much was left out"""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}… [{len(text) - max_chars} more chars]"
+
+
+class TruncatingFormatter(logging.Formatter):
+    """Text formatter that also cuts tracebacks to max_chars"""
+
+    def __init__(self, fmt: str = TEXT_FORMAT, max_chars: int = 8000):
+        super().__init__(fmt)
+        self.max_chars = max_chars
+
+    def formatException(self, exc_info) -> str:
+        return truncate(super().formatException(exc_info), self.max_chars)
+
+
+class JsonFormatter(TruncatingFormatter):
+    """One JSON object per record: time, level, logger, message, source, thread and exception"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'source': f"{record.module}:{record.lineno}",
+            'thread': record.threadName,
+            'process': record.process,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class CallSiteSampler(logging.Filter):
+    """Keeps 1 in every records below level from each call site, the first one included"""
+
+    def __init__(self, every: int, level: int = logging.INFO):
+        super().__init__()
+        self.every = every
+        self.level = level
+        self._counters: Dict[tuple, itertools.count] = {}
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.level or self.every <= 1:
+            return True
+        counter = self._counters.get((record.pathname, record.lineno))
+        if counter is None:
+            counter = self._counters.setdefault((record.pathname, record.lineno), itertools.count())
+        if next(counter) % self.every == 0:
+            return True
+        self.dropped += 1
+        return False
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are cut to max_chars and dropped when the queue is full
+
+    The message is rendered on the calling thread, so later changes to its
+    arguments do not show up, while exceptions are formatted by the listener.
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_chars: int = 2000):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.queued = 0
+        self.dropped = 0
+        self.truncated = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        if 0 < self.max_chars < len(message):
+            message = truncate(message, self.max_chars)
+            self.truncated += 1
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        return record
 
-def setup_logger(name: str, log_level: int = logging.INFO) -> logging.Logger:
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.queued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Queue, listener thread and output handlers of a process's logs
+
+    Args:
+        directory: Log directory, created on first write
+        filename: Log file name, rotated copies get a suffix
+        fmt: 'text' or 'json'
+        rotation: 'time' (at midnight) or 'size' (at max_bytes)
+        max_bytes: File size that triggers a 'size' rotation
+        backup_count: Rotated files kept
+        queue_size: Records waiting for the listener before new ones are dropped
+        max_message_chars: Longest message kept, 0 for no limit
+        max_traceback_chars: Longest traceback kept, 0 for no limit
+        debug_sample_every: Keep 1 in this many debug records per call site
+        console: Also write to stderr
+    """
+
+    def __init__(self, directory: str = 'logs', filename: str = 'app.log', fmt: str = 'text',
+                 rotation: str = 'time', max_bytes: int = 10 * 2 ** 20, backup_count: int = 14,
+                 queue_size: int = 10000, max_message_chars: int = 2000, max_traceback_chars: int = 8000,
+                 debug_sample_every: int = 10, console: bool = True):
+        formatter = (JsonFormatter if fmt == 'json' else TruncatingFormatter)(max_chars=max_traceback_chars)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, filename)
+        # delay: processes that never log (audio pool workers) never open the file
+        if rotation == 'size':
+            file_handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        else:
+            file_handler = logging.handlers.TimedRotatingFileHandler(
+                path, when='midnight', backupCount=backup_count, encoding='utf-8', delay=True)
+        self.handlers = [file_handler] + ([logging.StreamHandler()] if console else [])
+        for handler in self.handlers:
+            handler.setFormatter(formatter)
+
+        self.sampler = CallSiteSampler(debug_sample_every)
+        self.handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size), max_message_chars)
+        self.handler.addFilter(self.sampler)
+        self.listener = logging.handlers.QueueListener(self.handler.queue, *self.handlers,
+                                                       respect_handler_level=True)
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if not self._started:
+                self.listener.start()
+                self._started = True
+
+    def stop(self):
+        """Write out the queued records and stop the listener"""
+        with self._lock:
+            if self._started:
+                self.listener.stop()
+                self._started = False
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except ValueError:
+                # The stream was closed before us at exit, e.g. stderr captured by pytest
+                pass
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {
+            'queued': self.handler.queued,
+            'pending': self.handler.queue.qsize(),
+            'dropped_queue_full': self.handler.dropped,
+            'dropped_sampling': self.sampler.dropped,
+            'truncated': self.handler.truncated,
+        }
+
+
+def process_log_file(filename: str) -> str:
+    """Log file name of this process: filename itself in a main process, with the PID in a child"""
+    if multiprocessing.parent_process() is None:
+        return filename
+    root, extension = os.path.splitext(filename)
+    return f"{root}.{os.getpid()}{extension}"
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_log_pipeline() -> LogPipeline:
+    """Return the process-wide pipeline, configured from LOG_* and started on first use"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = LogPipeline(
+                directory=os.getenv('LOG_DIR', 'logs'),
+                filename=process_log_file(os.getenv('LOG_FILE', 'app.log')),
+                fmt=os.getenv('LOG_FORMAT', 'text'),
+                rotation=os.getenv('LOG_ROTATION', 'time'),
+                max_bytes=int(os.getenv('LOG_MAX_BYTES', 10 * 2 ** 20)),
+                backup_count=int(os.getenv('LOG_BACKUP_COUNT', 14)),
+                queue_size=int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+                max_message_chars=int(os.getenv('LOG_MAX_MESSAGE_CHARS', 2000)),
+                max_traceback_chars=int(os.getenv('LOG_MAX_TRACEBACK_CHARS', 8000)),
+                debug_sample_every=int(os.getenv('LOG_DEBUG_SAMPLE_EVERY', 10)),
+                console=os.getenv('LOG_CONSOLE', '1') == '1',
+            )
+            _pipeline.start()
+            atexit.register(_pipeline.stop)
+        return _pipeline
+
+
+def get_logging_metrics() -> Dict[str, int]:
+    """Records queued, pending, dropped and truncated by this process's pipeline"""
+    return get_log_pipeline().get_metrics()
+
+
+def setup_logger(name: str, log_level: Optional[int] = None) -> logging.Logger:
     """Setup and configure logger
-    
+
     Args:
         name: Logger name
-        log_level: Logging level
-    
+        log_level: Logging level (default LOG_LEVEL, INFO if unset)
+
     Returns:
-        Configured logger instance
+        Logger writing through the process's non-blocking pipeline
     """
     logger = logging.getLogger(name)
-    logger.setLevel(log_level)
-    
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    
-    # File handler
-    log_file = f'logs/{datetime.now().strftime("%Y%m%d")}.log'
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(log_level)
-    
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(log_level)
-    
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # Add formatter to handlers
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    
-    # Add handlers to logger
+    logger.setLevel(log_level if log_level is not None else os.getenv('LOG_LEVEL', 'INFO').upper())
+
     if not logger.handlers:
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-    
-    return logger 
\ No newline at end of file
+        logger.addHandler(get_log_pipeline().handler)
+
+    return logger
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Memory instrumentation of Streamlit sessions, and the idle-session sweeper.
+
+With MEMORY_PROFILING=1 tracemalloc traces allocations and each rerun ends
+with a snapshot. The snapshot is compared with the previous one to find the
+allocation sites that grew. The rerunning session's session_state keys are
+measured by walking what they reference, and so are the process-wide caches
+on request. Reruns of different sessions overlap, so a rerun's growth is the
+whole process's over that time.
+
+Apart from profiling, each rerun registers its session with the sweeper.
+Once a session has been idle for SESSION_IDLE_MINUTES, the sweeper thread
+calls its release callback, which drops buffers the next rerun restores.
+Sessions Streamlit no longer lists are forgotten together with their state.
+The state is not held through a weak reference: Streamlit wraps it in a new
+SafeSessionState every script run, which would die with the run.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+load_dotenv()
+
+# Process-wide caches measured by report(services=True): name -> (module, global).
+# Only modules already imported are measured, measuring never loads a service.
+TRACKED_SERVICES = {
+    'db_read_cache': ('src.services.db_service', '_read_cache'),
+    'feedback_cache': ('src.services.feedback_cache', '_cache'),
+    'reference_cache': ('src.services.reference_compare', '_references'),
+    'playback_review': ('src.services.playback_review', '_review'),
+    'word_guide_store': ('src.services.word_guide_store', '_store'),
+    'lexicon': ('src.services.lexicon', '_lexicon'),
+}
+
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_sizeof(obj: Any) -> int:
+    """Bytes of an object and everything it references, each object counted once
+
+    A NumPy view counts the array it views. Classes, modules, functions and
+    SQLAlchemy's per-instance state, which leads to the shared mappers, are
+    not followed.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _OPAQUE):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, np.ndarray):
+            # getsizeof counts the buffer of an array that owns it, a view's belongs to its base
+            if item.base is not None:
+                stack.append(item.base)
+            continue
+        if isinstance(item, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        attributes = getattr(item, '__dict__', None)
+        if isinstance(attributes, dict):
+            stack.extend(value for key, value in attributes.items() if not key.startswith('_sa_'))
+        for slot in getattr(type(item), '__slots__', ()):
+            if isinstance(slot, str) and hasattr(item, slot):
+                stack.append(getattr(item, slot))
+    return total
+
+
+def _state_items(state) -> Dict[str, Any]:
+    """User keys of a session state, a Streamlit SafeSessionState or a plain mapping"""
+    return dict(getattr(state, 'filtered_state', state))
+
+
+class MemoryProfiler:
+    """Per-rerun memory snapshots and idle-session release
+
+    Args:
+        enabled: Trace allocations and snapshot every rerun
+        frames: Stack frames tracemalloc keeps per allocation
+        top: Allocation sites and session keys reported
+        history: Reruns kept in the report
+        idle_seconds: Inactivity after which a session's buffers are released, 0 to never
+        sweep_interval: Seconds between sweeps
+        clock: Monotonic time source, replaceable in tests
+        is_active: Whether a session id still belongs to an open session,
+            closed ones are dropped (default: sessions only go when idle)
+    """
+
+    def __init__(self, enabled: bool = False, frames: int = 1, top: int = 10, history: int = 50,
+                 idle_seconds: float = 1800, sweep_interval: float = 60,
+                 clock: Callable[[], float] = time.monotonic,
+                 is_active: Optional[Callable[[str], bool]] = None):
+        self.enabled = enabled
+        self._is_active = is_active
+        self.top = top
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._reruns = deque(maxlen=history)
+        self._previous = None
+        self._allocators: List[Dict] = []
+        self._released = {'sessions': 0, 'bytes': 0}
+        self._sweeper = None
+        self._stop = threading.Event()
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    @contextmanager
+    def rerun(self, session_id: str, state, release: Optional[Callable[[Any], List[str]]] = None):
+        """Wrap one script run of a session
+
+        Args:
+            session_id: Streamlit session id
+            state: The session's state, read and released from the sweeper thread
+            release: Called with the state of an idle session, drops buffers
+                the next rerun restores and returns the keys it released
+        """
+        start = time.perf_counter()
+        traced = tracemalloc.get_traced_memory()[0] if self.enabled else 0
+        self._touch(session_id, state, release)
+        try:
+            yield
+        finally:
+            # st.rerun() and st.stop() end a run with an exception, it is still a rerun
+            self._touch(session_id, state, release)
+            if self.enabled:
+                self._record(session_id, state, time.perf_counter() - start, traced)
+
+    def _touch(self, session_id: str, state, release):
+        with self._lock:
+            new = session_id not in self._sessions
+            session = self._sessions.setdefault(session_id, {'reruns': 0, 'key_bytes': {}})
+            session['last_seen'] = self._clock()
+            # Held only while the sweeper may need it, a released session is forgotten
+            if self.idle_seconds > 0 and release is not None:
+                session['state'], session['release'] = state, release
+        if new:
+            self.drop_closed()
+        self.start_sweeper()
+
+    def drop_closed(self) -> int:
+        """Forget sessions that are no longer open, returns how many were dropped"""
+        if self._is_active is None:
+            return 0
+        with self._lock:
+            session_ids = list(self._sessions)
+        # A closed session never reruns, so it cannot come back meanwhile
+        closed = [session_id for session_id in session_ids if not self._is_active(session_id)]
+        with self._lock:
+            for session_id in closed:
+                self._sessions.pop(session_id, None)
+        return len(closed)
+
+    def _record(self, session_id: str, state, seconds: float, traced_before: int):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+        with self._lock:
+            previous, self._previous = self._previous, snapshot
+        if previous is None:
+            stats = [(stat, stat.size) for stat in snapshot.statistics('lineno')[:self.top]]
+        else:
+            stats = [(stat, stat.size_diff) for stat in snapshot.compare_to(previous, 'lineno')
+                     if stat.size_diff > 0][:self.top]
+        allocators = [{
+            'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            'size': stat.size,
+            'growth': growth,
+            'count': stat.count,
+        } for stat, growth in stats]
+
+        key_bytes = {key: deep_sizeof(value) for key, value in _state_items(state).items()}
+        current, peak = tracemalloc.get_traced_memory()
+        record = {
+            'session_id': session_id,
+            'seconds': round(seconds, 3),
+            'traced_bytes': current,
+            'traced_growth': current - traced_before,
+            'session_bytes': sum(key_bytes.values()),
+        }
+        with self._lock:
+            self._allocators = allocators
+            self._reruns.append(record)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session['reruns'] += 1
+                session['key_bytes'] = key_bytes
+        logger.debug(f"Rerun of {session_id[:8]}: {seconds:.2f}s, traced {current / 2 ** 20:.1f} MiB "
+                     f"({record['traced_growth'] / 2 ** 20:+.1f}), peak {peak / 2 ** 20:.1f} MiB, "
+                     f"session state {record['session_bytes'] / 2 ** 20:.1f} MiB")
+
+    def sweep(self) -> Dict[str, int]:
+        """Forget closed sessions and release the buffers of sessions idle for idle_seconds
+
+        An idle session without state to release is only forgotten.
+
+        Returns:
+            {'sessions': sessions released, 'bytes': bytes they released}
+        """
+        self.drop_closed()
+        if self.idle_seconds <= 0:
+            return {'sessions': 0, 'bytes': 0}
+        now = self._clock()
+        with self._lock:
+            idle = [(session_id, session) for session_id, session in self._sessions.items()
+                    if now - session['last_seen'] >= self.idle_seconds]
+            for session_id, session in idle:
+                if 'state' not in session:
+                    del self._sessions[session_id]
+        released = {'sessions': 0, 'bytes': 0}
+        for session_id, session in idle:
+            if 'state' not in session:
+                continue
+            state = session['state']
+            try:
+                before = {key: deep_sizeof(value) for key, value in _state_items(state).items()}
+                keys = session['release'](state) or []
+                after = _state_items(state)
+                freed = sum(before[key] - deep_sizeof(after.get(key)) for key in keys if key in before)
+            except Exception as e:
+                logger.error(f"Releasing idle session {session_id[:8]} failed: {str(e)}", exc_info=True)
+                freed, keys = 0, []
+            with self._lock:
+                # A session that reran meanwhile is active again, the next sweep looks at it
+                if self._sessions.get(session_id) is session and session['last_seen'] <= now:
+                    del self._sessions[session_id]
+            if keys:
+                released['sessions'] += 1
+                released['bytes'] += max(freed, 0)
+                logger.info(f"Released {', '.join(keys)} of idle session {session_id[:8]} "
+                            f"({freed / 2 ** 20:.1f} MiB)")
+        with self._lock:
+            self._released['sessions'] += released['sessions']
+            self._released['bytes'] += released['bytes']
+        return released
+
+    def start_sweeper(self):
+        """Start the background sweeper thread, if idle release is on"""
+        if self.idle_seconds <= 0:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='session-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {str(e)}", exc_info=True)
+
+    def measure_services(self) -> Dict[str, int]:
+        """Bytes held by each loaded cache of TRACKED_SERVICES"""
+        sizes = {}
+        for name, (module, attribute) in TRACKED_SERVICES.items():
+            value = getattr(sys.modules.get(module), attribute, None)
+            if value is not None:
+                sizes[name] = deep_sizeof(value)
+        return sizes
+
+    def report(self, services: bool = False) -> Dict[str, Any]:
+        """Latest memory figures
+
+        Args:
+            services: Also measure the process-wide caches, slow with a loaded lexicon
+
+        Returns:
+            {'enabled', 'traced_bytes', 'traced_peak_bytes', 'reruns', 'top_allocators',
+            'sessions': per session its idle seconds, reruns, bytes and largest keys,
+            'released', and 'services' if requested}
+        """
+        self.drop_closed()
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+        now = self._clock()
+        with self._lock:
+            sessions = [{
+                'session_id': session_id,
+                'idle_seconds': round(now - session['last_seen'], 1),
+                'reruns': session['reruns'],
+                'bytes': sum(session['key_bytes'].values()),
+                'keys': dict(sorted(session['key_bytes'].items(), key=lambda item: item[1],
+                                    reverse=True)[:self.top]),
+            } for session_id, session in self._sessions.items()]
+            report = {
+                'enabled': self.enabled,
+                'traced_bytes': current,
+                'traced_peak_bytes': peak,
+                'reruns': list(self._reruns),
+                'top_allocators': list(self._allocators),
+                'sessions': sorted(sessions, key=lambda session: session['bytes'], reverse=True),
+                'released': dict(self._released),
+            }
+        if services:
+            report['services'] = self.measure_services()
+        return report
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_memory_profiler() -> MemoryProfiler:
+    """Return the process-wide profiler, configured from MEMORY_PROFILING* and SESSION_*"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = MemoryProfiler(
+                enabled=os.getenv('MEMORY_PROFILING', '0') == '1',
+                frames=int(os.getenv('MEMORY_PROFILING_FRAMES', 1)),
+                top=int(os.getenv('MEMORY_PROFILING_TOP', 10)),
+                idle_seconds=float(os.getenv('SESSION_IDLE_MINUTES', 30)) * 60,
+                sweep_interval=float(os.getenv('SESSION_SWEEP_SECONDS', 60)),
+                is_active=_streamlit_session_active,
+            )
+        return _profiler
+
+
+def _streamlit_session_active(session_id: str) -> bool:
+    """Whether the Streamlit server still lists a session, True outside a server"""
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return True
+    return Runtime.instance().is_active_session(session_id)
+
+
+def track_rerun(release: Optional[Callable[[Any], List[str]]] = None):
+    """MemoryProfiler.rerun() of the current Streamlit script run, a no-op outside one"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return nullcontext()
+    # SafeSessionState takes a lock on every access, so the sweeper thread may use it
+    return get_memory_profiler().rerun(ctx.session_id, ctx.session_state, release)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+from typing import List
+
+# Words with inner apostrophes or hyphens ("don't", "well-known"), digits kept as words
+WORD_PATTERN = re.compile(r"[A-Za-z0-9]+(?:['’\-][A-Za-z0-9]+)*")
+
+
+def normalize_word(word: str) -> str:
+    """Lowercase a word and unify apostrophes so lookups match"""
+    return word.strip().lower().replace('’', "'")
+
+
+def tokenize_words(text: str) -> List[str]:
+    """Split text into words, dropping punctuation
+
+    Args:
+        text: Any practice or transcribed text
+
+    Returns:
+        Words in order of appearance, original casing preserved
+    """
+    return WORD_PATTERN.findall(text or '')
+
+
+def unique_words(text: str) -> List[str]:
+    """Normalized words of a text, deduplicated, in order of first appearance"""
+    seen = {}
+    for word in tokenize_words(text):
+        seen.setdefault(normalize_word(word), None)
+    return list(seen)
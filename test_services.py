@@ -1,3 +1,4 @@
+import io
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -6,20 +7,60 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import unittest
+from unittest import mock
+import subprocess
 import tempfile
+import threading
+import time
+import tracemalloc
+import logging
 import numpy as np
 import sounddevice as sd
 import soundfile as sf
 import httpx
+import json
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from src.services import (
     SpeechService, 
     AIService, 
     AudioService, 
-    DBService
+    DBService,
+    AudioStore,
+    SingleFlight,
+    ResiliencePolicy,
+    Hedger
 )
+from src.services.hedging import HedgeCancelled
+from src.services.single_flight import coalesced, get_single_flight
+from src.services.lexicon import get_lexicon
+from src.services.word_guide_store import WordGuideStore
+from src.utils.text import normalize_word, unique_words
+from src.services.alignment import align_words, compact_diff
+from src.services import prompt_builder
+from src.services.prompt_builder import (build_feedback_prompt, build_phonetic_guide_prompt, count_tokens,
+                                         truncate_tokens)
+from src.services.resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, RetryableError
+from src.services.model_router import ModelRouter
+from src.services.db_service import get_db_cache_metrics
+from src.services.practice_stats import rebuild_text_stats
+from src.services.rollups import choose_resolution, rebuild_rollups
+from src.utils.dsp import analyze_prosody, banded_dtw, summarize_prosody
+from src.services.reference_compare import compare_features
+from src.services.playback_review import PlaybackReview, SPECTROGRAM_HEIGHT, WAVEFORM_HEIGHT
+from src.services.feedback_cache import FeedbackCache
+from src.services.job_queue import JobQueue
+from src.services.audio_executor import AudioExecutor, ExecutorBusy
+from src.services.audio_encoding import UPLOAD_SAMPLE_RATE, encode_for_upload, encode_samples, resample
+from src.services.analysis_jobs import feedback, persist_analysis
+from src.utils.cache import LRUCache
+from src.utils.lazy import LazyService
 from src.models import PracticeText, PracticeSession
-from src.models.base import init_db, engine
+from src.models.base import init_db, engine, get_db_metrics, ALEMBIC_INI
+from alembic.config import Config as AlembicConfig
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 
 class MockHTTPClient:
@@ -32,6 +73,1005 @@ class MockHTTPClient:
                 return {"choices": [{"message": {"content": "Mock feedback"}}]}
         return MockResponse()
 
+class FakeOpenAIServer:
+    """Local OpenAI-compatible server that answers 429 to the first N requests
+    and 503 to requests for any of failing_models"""
+    def __init__(self, throttle_first=0, failing_models=()):
+        self.throttle_first = throttle_first
+        self.failing_models = set(failing_models)
+        self.requests = 0
+        self.models = []
+        self.prompts = []
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                model = request.get('model')
+                server.requests += 1
+                server.models.append(model)
+                server.prompts.append('\n'.join(message['content'] for message in request.get('messages', [])))
+                if server.requests <= server.throttle_first:
+                    body = json.dumps({"error": {"message": "Rate limit reached", "type": "rate_limit"}})
+                    self.send_response(429)
+                    self.send_header('Retry-After', '0')
+                elif model in server.failing_models:
+                    body = json.dumps({"error": {"message": "Model overloaded", "type": "server_error"}})
+                    self.send_response(503)
+                else:
+                    body = json.dumps({
+                        "id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "Mock feedback"}}],
+                        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+                    })
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(body.encode())
+            
+            def log_message(self, *args):
+                pass
+        
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+    
+    def close(self):
+        self.httpd.shutdown()
+
+class TestSingleFlightScope(unittest.TestCase):
+    def test_instances_share_calls_only_within_their_scope(self):
+        """Test that differently configured service instances never get each other's results"""
+        release = threading.Event()
+        
+        class Upstream:
+            def __init__(self, base_url):
+                self.base_url = base_url
+            
+            @property
+            def single_flight_scope(self):
+                return self.base_url
+            
+            @coalesced('scope-test')
+            def fetch(self, text):
+                release.wait(timeout=5)
+                return f"{self.base_url}/{text}"
+        
+        callers = [Upstream('http://a'), Upstream('http://a'), Upstream('http://b')]
+        results = [None] * len(callers)
+        
+        def call(index):
+            results[index] = callers[index].fetch('hello')
+        
+        threads = [threading.Thread(target=call, args=(index,)) for index in range(len(callers))]
+        for thread in threads:
+            thread.start()
+        while get_single_flight('scope-test').get_metrics()['requests'] < len(callers):
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(results, ['http://a/hello', 'http://a/hello', 'http://b/hello'])
+        self.assertEqual(get_single_flight('scope-test').get_metrics()['upstream_calls'], 2)
+    
+    def test_service_scopes_follow_configuration(self):
+        self.assertEqual(AIService(base_url='http://127.0.0.1:1/v1').single_flight_scope,
+                         AIService(base_url='http://127.0.0.1:1/v1').single_flight_scope)
+        self.assertNotEqual(AIService(base_url='http://127.0.0.1:1/v1').single_flight_scope,
+                            AIService(base_url='http://127.0.0.1:2/v1').single_flight_scope)
+        self.assertNotEqual(AIService().single_flight_scope,
+                            AIService(resilience=ResiliencePolicy('other')).single_flight_scope)
+
+
+class TestResilience(unittest.TestCase):
+    # A single model, so retries are not cut short by falling back
+    SINGLE_MODEL = {'phonetic_guide': [{'max_prompt_tokens': None, 'models': ['only-model']}]}
+
+    def test_retries_through_throttling(self):
+        """Test that 429 responses are retried until the fake server recovers"""
+        server = FakeOpenAIServer(throttle_first=2)
+        self.addCleanup(server.close)
+        policy = ResiliencePolicy('openai-test', base_delay=0.01, max_attempts=4)
+        ai_service = AIService(base_url=server.base_url, resilience=policy, router=ModelRouter(self.SINGLE_MODEL))
+        
+        feedback = ai_service.get_phonetic_guide("Hello world")
+        
+        self.assertEqual(feedback, "Mock feedback")
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(policy.get_metrics()['retries'], 2)
+        self.assertEqual(policy.get_metrics()['circuits'], {'only-model': 'closed'})
+
+    def test_circuit_breaker_opens_and_probes(self):
+        """Test that a throttling storm opens the circuit and a half-open probe closes it"""
+        server = FakeOpenAIServer(throttle_first=2)
+        self.addCleanup(server.close)
+        policy = ResiliencePolicy(
+            'openai-test', base_delay=0.01, max_attempts=2,
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+        )
+        ai_service = AIService(base_url=server.base_url, resilience=policy, router=ModelRouter(self.SINGLE_MODEL))
+        
+        # Both attempts are throttled, the model's circuit opens
+        self.assertIn("Error", ai_service.get_phonetic_guide("first"))
+        self.assertEqual(policy.get_metrics()['circuits'], {'only-model': 'open'})
+        
+        # Open circuit fails fast without reaching the server
+        self.assertIn("Error", ai_service.get_phonetic_guide("second"))
+        self.assertEqual(server.requests, 2)
+        
+        # After the reset timeout a probe goes through and closes the circuit
+        time.sleep(0.25)
+        self.assertEqual(ai_service.get_phonetic_guide("third"), "Mock feedback")
+        self.assertEqual(policy.get_metrics()['circuits'], {'only-model': 'closed'})
+
+    def test_mixed_call_types_keep_their_concurrency(self):
+        """Test that fast and slow call types sharing a limiter do not shrink it without throttling"""
+        rng = np.random.default_rng(0)
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=16)
+        for index in range(500):
+            kind, latency = ('feedback', 6.0) if index % 5 == 0 else ('word_guide', 0.4)
+            self.assertTrue(limiter.acquire(timeout=0))
+            limiter.release(latency * rng.uniform(0.8, 1.2), kind=kind)
+        self.assertEqual(int(limiter.limit), 16)
+        
+        # A slowdown within one call type still backs off
+        for _ in range(3):
+            limiter.acquire(timeout=0)
+            limiter.release(18.0, kind='feedback')
+        self.assertLess(int(limiter.limit), 8)
+        
+        # The kind is the limiter's, it is not passed on to the call
+        policy = ResiliencePolicy('kind-test', limiter=limiter)
+        self.assertEqual(policy.call(lambda **kwargs: kwargs, model='m', latency_kind='feedback'), {'model': 'm'})
+
+class TestWordGuides(unittest.TestCase):
+    TEXT = "Zorblax, the FLOOBIN; zorblax’s quindle—floobin. Glimmax? Trevvo!"
+    
+    def setUp(self):
+        self.store = WordGuideStore(max_words=100)
+        for target, value in (('src.services.ai_service.get_word_guide_store', lambda: self.store),
+                              ('src.services.ai_service.WORD_GUIDE_CHUNK_SIZE', 2)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ai_service = AIService(base_url='http://127.0.0.1:1/v1')
+        self.batches = []
+        self.failing_words = set()
+    
+    def complete(self, prompt, model=None, hedge_name=None):
+        """Answer a batch prompt with a guide per requested word"""
+        words = prompt['messages'][-1]['content'].split('Words: ', 1)[1].split(', ')
+        self.batches.append(words)
+        if self.failing_words & set(words):
+            raise RetryableError("upstream failed")
+        return json.dumps({'words': [{'word': word, 'ipa': f"/{word}/"} for word in words]})
+    
+    def test_unique_and_normalized_words(self):
+        self.assertEqual(normalize_word(" Zorblax’s "), "zorblax's")
+        self.assertEqual(unique_words(self.TEXT), ['zorblax', 'the', 'floobin', "zorblax's", 'quindle',
+                                                   'glimmax', 'trevvo'])
+    
+    def test_batches_only_unknown_words_and_serves_later_lookups_locally(self):
+        """Test that a text's unknown words are fetched in chunks once and then read from the store"""
+        with mock.patch.object(self.ai_service, '_complete', side_effect=self.complete):
+            guides = self.ai_service.prepare_word_guides(self.TEXT)
+            
+            requested = sorted(word for batch in self.batches for word in batch)
+            # 'the' is a dictionary word left to the lexicon
+            self.assertEqual(requested, sorted(set(unique_words(self.TEXT)) - {'the'}))
+            self.assertTrue(all(len(batch) <= 2 for batch in self.batches))
+            self.assertIsNone(guides['the'])
+            self.assertEqual(guides['quindle']['ipa'], '/quindle/')
+            
+            # Prepared: no further calls, single-word lookups are store hits
+            calls = len(self.batches)
+            self.assertEqual(self.ai_service.prepare_word_guides(self.TEXT), guides)
+            self.assertIn('/glimmax/', self.ai_service.get_word_pronunciation_guide('Glimmax'))
+            self.assertEqual(len(self.batches), calls)
+            self.assertEqual(self.store.get_metrics()['hits'], 1)
+    
+    def test_failed_batch_is_retried_on_the_next_call(self):
+        """Test that a failed chunk keeps the other chunks' guides and is requested again later"""
+        self.failing_words = {'glimmax'}
+        with mock.patch.object(self.ai_service, '_complete', side_effect=self.complete):
+            guides = self.ai_service.prepare_word_guides(self.TEXT)
+            self.assertIsNone(guides['glimmax'])
+            self.assertEqual(guides['zorblax']['ipa'], '/zorblax/')
+            self.assertFalse(self.store.is_prepared(self.TEXT))
+            failed_batch = [batch for batch in self.batches if 'glimmax' in batch][0]
+            
+            self.failing_words = set()
+            self.batches.clear()
+            guides = self.ai_service.prepare_word_guides(self.TEXT)
+            self.assertEqual(self.batches, [failed_batch])
+            self.assertEqual(guides['glimmax']['ipa'], '/glimmax/')
+            self.assertTrue(self.store.is_prepared(self.TEXT))
+    
+    def test_store_is_bounded(self):
+        store = WordGuideStore(max_words=3)
+        store.put_many([{'word': f"word{index}"} for index in range(5)])
+        store.mark_prepared("word3 word4", words=['word3', 'word4'])
+        self.assertEqual(store.get_metrics()['words'], 3)
+        self.assertEqual(store.get_metrics()['evictions'], 2)
+        self.assertTrue(store.is_prepared("word3 word4"))
+        
+        # A prepared text whose guides were evicted is prepared again
+        store.put_many([{'word': 'word5'}, {'word': 'word6'}, {'word': 'word7'}])
+        self.assertFalse(store.is_prepared("word3 word4"))
+
+
+class TestTokenCounting(unittest.TestCase):
+    TEXT = " ".join(["The quick brown fox jumps over the lazy dog (1x, 2x)."] * 50)
+    
+    def test_tiktoken_counts_and_cuts_exactly(self):
+        encoding = prompt_builder._get_encoding()
+        if encoding is None:
+            self.skipTest("tiktoken or its cl100k_base encoding is not available")
+        self.assertEqual(count_tokens(self.TEXT), len(encoding.encode(self.TEXT)))
+        for policy in prompt_builder.TRUNCATION_POLICIES:
+            with self.subTest(policy):
+                cut = truncate_tokens(self.TEXT, 60, policy)
+                self.assertLessEqual(len(encoding.encode(cut)), 60)
+                self.assertGreater(len(encoding.encode(cut)), 40)
+    
+    def test_estimated_budgets_keep_a_margin(self):
+        """Test that without an encoding texts are cut to ESTIMATE_MARGIN of the budget"""
+        with mock.patch.object(prompt_builder, '_get_encoding', return_value=None):
+            self.assertEqual(truncate_tokens("Hello there.", 10), "Hello there.")
+            
+            cut = truncate_tokens(self.TEXT, 100)
+            self.assertLessEqual(count_tokens(cut), 100 * prompt_builder.ESTIMATE_MARGIN)
+            self.assertTrue(cut.endswith(prompt_builder.TRUNCATION_MARK))
+
+
+class TestModelRouting(unittest.TestCase):
+    def test_routes_by_prompt_size(self):
+        """Test that short and long inputs of one route go to different tiers"""
+        router = ModelRouter({'phonetic_guide': [
+            {'max_prompt_tokens': 200, 'models': ['small-model']},
+            {'max_prompt_tokens': None, 'models': ['large-model', 'small-model']},
+        ]})
+        self.assertEqual(router.models_for('phonetic_guide', 150), ['small-model'])
+        self.assertEqual(router.models_for('phonetic_guide', 1500), ['large-model', 'small-model'])
+        self.assertEqual(router.models_for('unknown_route'), router.routes['*'][0]['models'])
+
+    def test_falls_back_on_server_errors(self):
+        """Test that a failing model falls back to the next one and both are tracked"""
+        server = FakeOpenAIServer(failing_models={'primary-model'})
+        self.addCleanup(server.close)
+        router = ModelRouter(
+            {'phonetic_guide': [{'max_prompt_tokens': None, 'models': ['primary-model', 'backup-model']}]},
+            prices={'backup-model': (1.0, 2.0)}
+        )
+        policy = ResiliencePolicy('openai-test', max_attempts=1)
+        ai_service = AIService(base_url=server.base_url, resilience=policy, router=router)
+        
+        self.assertEqual(ai_service.get_phonetic_guide("Hello world"), "Mock feedback")
+        self.assertEqual(server.models, ['primary-model', 'backup-model'])
+        
+        metrics = router.get_metrics()['phonetic_guide']
+        self.assertEqual(metrics['primary-model']['errors'], 1)
+        self.assertEqual(metrics['backup-model']['fallbacks'], 1)
+        self.assertAlmostEqual(metrics['backup-model']['cost_usd'], (100 * 1.0 + 20 * 2.0) / 1_000_000)
+
+    def test_falls_back_under_the_default_policy(self):
+        """Test that concurrent calls reach the backup model while the primary's circuit opens"""
+        server = FakeOpenAIServer(failing_models={'primary-model'})
+        self.addCleanup(server.close)
+        router = ModelRouter({'phonetic_guide': [{'max_prompt_tokens': None,
+                                                   'models': ['primary-model', 'backup-model']}]})
+        policy = ResiliencePolicy('openai-test', base_delay=0.01)
+        ai_service = AIService(base_url=server.base_url, resilience=policy, router=router)
+        
+        results = [None] * 4
+        
+        def call(index):
+            results[index] = ai_service.get_phonetic_guide(f"Hello {index}")
+        
+        threads = [threading.Thread(target=call, args=(index,)) for index in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(results, ["Mock feedback"] * 4)
+        self.assertEqual(server.models.count('backup-model'), 4)
+        self.assertLessEqual(server.models.count('primary-model'), 4 * router.fallback_attempts)
+        metrics = policy.get_metrics()
+        self.assertEqual(metrics['circuits']['backup-model'], 'closed')
+        # Server errors are not throttling, the concurrency limit is left alone
+        self.assertGreaterEqual(metrics['concurrency_limit'], 8)
+        
+        # Five failures opened the primary's circuit, calls now go straight to the backup
+        self.assertEqual(metrics['circuits']['primary-model'], 'open')
+        requests = server.requests
+        self.assertEqual(ai_service.get_phonetic_guide("Hello again"), "Mock feedback")
+        self.assertEqual(server.models[requests:], ['backup-model'])
+
+class TestFeedbackCache(unittest.TestCase):
+    def test_same_outcome_is_served_from_cache(self):
+        """Test that readings with the same mistakes and score bands share feedback"""
+        server = FakeOpenAIServer()
+        self.addCleanup(server.close)
+        ai_service = AIService(base_url=server.base_url, resilience=ResiliencePolicy('openai-test'),
+                               feedback_cache=FeedbackCache(bucket_width=10))
+        text = "The quick brown fox jumps over the lazy dog."
+        
+        first = ai_service.get_pronunciation_feedback(
+            text, "the quick brown box jumps over the lazy dog", azure_details={'accuracy_score': 81})
+        second = ai_service.get_pronunciation_feedback(
+            text, "The quick brown box jumps over the lazy dog.", azure_details={'accuracy_score': 88})
+        self.assertEqual(first, second)
+        self.assertEqual(server.requests, 1)
+        
+        # A different score band or a different mistake needs fresh feedback
+        ai_service.get_pronunciation_feedback(
+            text, "the quick brown box jumps over the lazy dog", azure_details={'accuracy_score': 91})
+        ai_service.get_pronunciation_feedback(
+            text, "the quick brown fox jumps over the hazy dog", azure_details={'accuracy_score': 81})
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(ai_service.feedback_cache.get_metrics()['hits'], 1)
+
+    def test_shared_reply_quotes_no_exact_scores(self):
+        """Test that a reply cached for a score band is generated from the band, not one reading's scores"""
+        server = FakeOpenAIServer()
+        self.addCleanup(server.close)
+        ai_service = AIService(base_url=server.base_url, resilience=ResiliencePolicy('openai-test'),
+                               feedback_cache=FeedbackCache(bucket_width=10))
+        text = "The quick brown fox jumps over the lazy dog."
+        readings = [
+            {'pronunciation_score': 64, 'accuracy_score': 83, 'fluency_score': 72, 'completeness_score': 91},
+            {'pronunciation_score': 97, 'accuracy_score': 86, 'fluency_score': 77, 'completeness_score': 94},
+        ]
+        replies = [ai_service.get_pronunciation_feedback(text, "the quick brown box jumps over the lazy dog",
+                                                         azure_details=scores) for scores in readings]
+        
+        self.assertEqual(replies[0], replies[1])
+        self.assertEqual(server.requests, 1)
+        prompt = server.prompts[0]
+        self.assertIn("accuracy 80-90, fluency 70-80, completeness 90-100", prompt)
+        for scores in readings:
+            for score in scores.values():
+                self.assertNotRegex(prompt, rf"\b{score}\b")
+        
+        # Without a cache the prompt keeps the exact scores
+        exact = build_feedback_prompt(align_words(text, text), "", 'english', readings[0])
+        self.assertIn("pronunciation 64", exact['messages'][1]['content'])
+
+    def test_lru_ttl_eviction(self):
+        """Test LRU eviction and expiry of cache entries"""
+        now = [0.0]
+        cache = LRUCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        
+        now[0] = 11
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.get_metrics()['evictions'], 1)
+        self.assertEqual(cache.get_metrics()['expirations'], 1)
+
+    def test_invalidation_during_load(self):
+        """Test that a load raced by invalidate() is not stored and no per-key bookkeeping is left"""
+        cache = LRUCache(max_entries=2)
+        def stale_load():
+            cache.invalidate('a')
+            return 'stale'
+        self.assertEqual(cache.get_or_load('a', stale_load), 'stale')
+        self.assertEqual(cache.get_or_load('a', lambda: 'fresh'), 'fresh')
+        self.assertEqual(cache.get('a'), 'fresh')
+        
+        for key in range(100):
+            cache.get_or_load(key, lambda: key)
+            cache.invalidate(key)
+        self.assertEqual((cache._loading, cache._versions), ({}, {}))
+
+class TestJobQueue(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        init_db()
+
+    def setUp(self):
+        # A kind of its own, so jobs left by other runs are never claimed
+        self.kind = f"test-{time.time()}"
+
+    def test_idempotent_submit_and_retries(self):
+        """Test that a key maps to one job and failures are retried until max_attempts"""
+        queue = JobQueue(retry_backoff=0, max_attempts=2)
+        calls = []
+        def flaky(payload):
+            calls.append(payload)
+            if len(calls) == 1:
+                raise RetryableError("throttled")
+            return {'echo': payload['value']}
+        queue.register(self.kind, flaky)
+        
+        job = queue.submit(self.kind, {'value': 1}, idempotency_key=self.kind)
+        self.assertEqual(queue.submit(self.kind, {'value': 2}, idempotency_key=self.kind)['id'], job['id'])
+        
+        self.assertTrue(queue.run_once('worker-a'))
+        retried = queue.get(job['id'])
+        self.assertEqual((retried['status'], retried['attempts'], retried['error']), ('queued', 1, 'throttled'))
+        self.assertTrue(queue.run_once('worker-a'))
+        done = queue.get(job['id'])
+        self.assertEqual((done['status'], done['result']), ('succeeded', {'echo': 1}))
+        self.assertFalse(queue.run_once('worker-a'))
+        
+        metrics = queue.get_metrics()
+        self.assertEqual((metrics['retried'], metrics['completed']), (1, 1))
+        self.assertIsNotNone(metrics['p50_total_seconds'])
+
+    def test_visibility_timeout_reclaims_once(self):
+        """Test that a job whose lease expired is claimed again and persisted only once"""
+        now = [datetime.utcnow()]
+        queue = JobQueue(visibility_timeout=60, clock=lambda: now[0])
+        persisted = []
+        queue.register(self.kind, lambda payload: {}, lambda db, job, result: persisted.append(job['locked_by']))
+        job = queue.submit(self.kind, {})
+        
+        stalled = queue.claim('worker-a')
+        self.assertIsNone(queue.claim('worker-b'))
+        now[0] += timedelta(seconds=61)
+        reclaimed = queue.claim('worker-b')
+        self.assertEqual((reclaimed['id'], reclaimed['attempts']), (job['id'], 2))
+        
+        # The stalled worker lost its lease, only the new holder's result counts
+        self.assertFalse(queue.complete(stalled, {}))
+        self.assertTrue(queue.complete(reclaimed, {}))
+        self.assertEqual(persisted, ['worker-b'])
+        self.assertEqual(queue.get_metrics()['reclaimed'], 1)
+
+    def test_worker_persists_practice_session(self):
+        """Test that worker threads run jobs and save the reading as a PracticeSession"""
+        text = DBService().create_practice_text("Jobs", "Jobs text.", "beginner", f"jobs-{time.time()}")
+        queue = JobQueue(poll_interval=0.05)
+        scores = {'transcribed_text': "jobs text", 'pronunciation_score': 88.0, 'accuracy_score': 90.0,
+                  'fluency_score': 85.0, 'completeness_score': 100.0}
+        queue.register(self.kind, lambda payload: {'pronunciation': scores, 'alignment': None}, persist_analysis)
+        queue.start(workers=2)
+        self.addCleanup(queue.stop, 5)
+        
+        job = queue.submit(self.kind, {'audio_file': None, 'text': "Jobs text.", 'practice_text_id': text.id})
+        deadline = time.time() + 5
+        while queue.get(job['id'])['status'] != 'succeeded' and time.time() < deadline:
+            time.sleep(0.05)
+        
+        result = queue.get(job['id'])['result']
+        self.assertEqual(result['practice_text_id'], text.id)
+        practice_session = DBService().get_practice_session(result['practice_session_id'])
+        self.assertEqual(practice_session.fluency_score, 85.0)
+        self.assertEqual(DBService().get_practice_text(text.id).session_count, 1)
+        self.assertGreaterEqual(queue.get_metrics()['depth']['succeeded'], 1)
+
+    def test_writes_of_another_process_are_picked_up(self):
+        """Test that invalidate_text() drops the reads another process's worker made stale"""
+        category = f"jobs-external-{time.time()}"
+        text_id = DBService().create_practice_text("External", "External text.", "beginner", category).id
+        self.assertEqual(DBService().get_practice_history(text_id), [])
+        self.assertEqual(DBService().get_preset_texts(category)[0]['title'], "External")
+        
+        # Written like a worker process would, without touching this process's read cache
+        db = sessionmaker(bind=engine)()
+        db.add(PracticeSession(practice_text_id=text_id, transcribed_text="external text",
+                               pronunciation_score=80.0, created_at=datetime.utcnow()))
+        db.query(PracticeText).filter(PracticeText.id == text_id).update({'title': "External 2"})
+        db.commit()
+        db.close()
+        self.assertEqual(DBService().get_practice_history(text_id), [])
+        
+        DBService().invalidate_text(text_id)
+        self.assertEqual(len(DBService().get_practice_history(text_id)), 1)
+        self.assertEqual(DBService().get_practice_text(text_id).title, "External 2")
+        self.assertEqual(DBService().get_preset_texts(category)[0]['title'], "External 2")
+
+    def test_failed_feedback_is_retried_not_persisted(self):
+        """Test that an LLM failure fails the feedback job instead of saving the error as feedback"""
+        class FailingAIService:
+            def generate_pronunciation_feedback(self, *args, **kwargs):
+                raise RetryableError("upstream down")
+        
+        queue = JobQueue(retry_backoff=0, max_attempts=2)
+        persisted = []
+        queue.register(self.kind, lambda payload: feedback(payload, ai_service=FailingAIService()),
+                       lambda db, job, result: persisted.append(result))
+        job = queue.submit(self.kind, {'text': "Hello", 'transcribed_text': "hallo"})
+        
+        self.assertTrue(queue.run_once('worker-a'))
+        self.assertEqual(queue.get(job['id'])['status'], 'queued')
+        self.assertTrue(queue.run_once('worker-a'))
+        failed = queue.get(job['id'])
+        self.assertEqual((failed['status'], failed['error']), ('failed', 'upstream down'))
+        self.assertEqual(persisted, [])
+
+class TestAudioStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        init_db()
+
+    def test_reference_counts_stay_inside_root(self):
+        """Test that wildcards in the root and sibling directories are not counted"""
+        parent = tempfile.mkdtemp()
+        store = AudioStore(root=os.path.join(parent, 'rec_%'))
+        inside = os.path.join(store.root, 'ab', 'ab12.flac')
+        texts = [PracticeText(content="Hello"), PracticeText(content="Hello")]
+        db = sessionmaker(bind=engine)()
+        try:
+            db.add_all(texts)
+            db.flush()
+            db.add_all([
+                PracticeSession(practice_text_id=texts[0].id, audio_file_path=inside),
+                PracticeSession(practice_text_id=texts[0].id, audio_file_path=inside),
+                PracticeSession(practice_text_id=texts[1].id,
+                                audio_file_path=os.path.join(parent, 'rec_%2', 'ab', 'ab12.flac')),
+                PracticeSession(practice_text_id=texts[1].id,
+                                audio_file_path=os.path.join(parent, 'recX%', 'ab', 'ab12.flac')),
+            ])
+            db.commit()
+        finally:
+            db.close()
+        self.assertEqual(store.reference_counts(), {inside: 2})
+
+
+class TestUploadFormats(unittest.TestCase):
+    def setUp(self):
+        self.samples = (0.3 * np.sin(2 * np.pi * 220 * np.arange(44100) / 44100)).astype(np.float32)
+        self.wav_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
+        sf.write(self.wav_file, self.samples, 44100, subtype='PCM_16')
+        self.addCleanup(os.unlink, self.wav_file)
+
+    def test_encode_for_upload_round_trips(self):
+        """Test that every upload format decodes back to the one-second take"""
+        expected = {'wav': ('WAV', 44100), 'flac': ('FLAC', UPLOAD_SAMPLE_RATE),
+                    'ogg_opus': ('OGG', UPLOAD_SAMPLE_RATE)}
+        for upload_format, (container, sample_rate) in expected.items():
+            with self.subTest(upload_format):
+                data, encode_time = encode_for_upload(self.wav_file, upload_format)
+                self.assertGreaterEqual(encode_time, 0)
+                info = sf.info(io.BytesIO(data))
+                self.assertEqual((info.format, info.samplerate, info.channels), (container, sample_rate, 1))
+                self.assertAlmostEqual(info.duration, 1.0, delta=0.05)
+        
+        # Lossless formats keep the samples up to 16-bit quantization
+        decoded, _ = sf.read(io.BytesIO(encode_for_upload(self.wav_file, 'flac')[0]), dtype='float32')
+        np.testing.assert_allclose(decoded, resample(self.samples, 44100, UPLOAD_SAMPLE_RATE), atol=1e-3)
+
+    def test_flac_at_upload_rate_is_sent_untouched(self):
+        flac_file = tempfile.NamedTemporaryFile(suffix='.flac', delete=False).name
+        self.addCleanup(os.unlink, flac_file)
+        sf.write(flac_file, resample(self.samples, 44100, UPLOAD_SAMPLE_RATE), UPLOAD_SAMPLE_RATE)
+        with open(flac_file, 'rb') as f:
+            self.assertEqual(encode_for_upload(flac_file, 'flac')[0], f.read())
+
+    def test_invalid_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            encode_for_upload(self.wav_file, 'mp3')
+        with self.assertRaises(ValueError):
+            SpeechService(recognizer_factory=lambda *args: self.fail("recognizer built")).analyze_pronunciation(
+                self.wav_file, "Hello", upload_format='mp3')
+
+    def test_compressed_upload_goes_through_push_stream(self):
+        """Test that compressed formats push the encoded bytes through a compressed input stream"""
+        import azure.cognitiveservices.speech as speechsdk
+        from benchmarks.stub_backends import LatencyModel, StubRecognizerFactory
+        
+        pushed = []
+        
+        class RecordingPushStream(speechsdk.audio.PushAudioInputStream):
+            def write(self, buffer):
+                pushed.append(bytes(buffer))
+                super().write(buffer)
+        
+        audio_configs = []
+        stub = StubRecognizerFactory(LatencyModel())
+        
+        def recognizer_factory(speech_config, audio_config, pronunciation_config):
+            audio_configs.append(audio_config)
+            return stub(speech_config, audio_config, pronunciation_config)
+        
+        speech = SpeechService(recognizer_factory=recognizer_factory)
+        with mock.patch.object(speechsdk.audio, 'PushAudioInputStream', RecordingPushStream):
+            for upload_format, subtype in (('flac', 'PCM_16'), ('ogg_opus', 'OPUS')):
+                with self.subTest(upload_format):
+                    pushed.clear()
+                    result = speech.analyze_pronunciation(self.wav_file, "Hello", upload_format=upload_format)
+                    self.assertIn('pronunciation_score', result)
+                    self.assertIsInstance(audio_configs[-1], speechsdk.audio.AudioConfig)
+                    self.assertEqual(len(pushed), 1)
+                    self.assertEqual(sf.info(io.BytesIO(pushed[0])).subtype, subtype)
+
+
+class TestAudioExecutor(unittest.TestCase):
+    def setUp(self):
+        self.samples = np.random.default_rng(0).uniform(-0.5, 0.5, 44100 * 2).astype(np.float32)
+
+    def test_pool_matches_inline(self):
+        """Test that pooled tasks return what they return inline, arrays and bytes alike"""
+        executor = AudioExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        
+        np.testing.assert_array_equal(executor.run(resample, self.samples, 44100, 16000),
+                                      resample(self.samples, 44100, 16000))
+        self.assertEqual(executor.run(encode_samples, self.samples, 44100),
+                         encode_samples(self.samples, 44100))
+        with self.assertRaises(TypeError):
+            executor.run(resample, self.samples, 44100, 'not a rate')
+        
+        metrics = executor.get_metrics()
+        self.assertEqual((metrics['completed'], metrics['failed'], metrics['in_flight']), (2, 1, 0))
+        self.assertEqual(metrics['tasks']['resample']['count'], 1)
+        self.assertIsNotNone(metrics['tasks']['encode_samples']['p50_wait'])
+
+    def test_back_pressure(self):
+        """Test that submits beyond max_pending wait for a slot or fail fast"""
+        executor = AudioExecutor(max_workers=1, max_pending=1)
+        self.addCleanup(executor.shutdown)
+        
+        pending = executor.submit(resample, self.samples, 44100, 16000)
+        with self.assertRaises(ExecutorBusy):
+            executor.submit(resample, self.samples, 44100, 16000, timeout=0)
+        pending.result()
+        executor.run(resample, self.samples, 44100, 16000)
+        self.assertEqual(executor.get_metrics()['rejected'], 1)
+
+    def test_replaces_broken_pool(self):
+        """Test that a killed worker process is replaced instead of failing every later task"""
+        executor = AudioExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        expected = resample(self.samples, 44100, 16000)
+        np.testing.assert_array_equal(executor.run(resample, self.samples, 44100, 16000), expected)
+        
+        broken = executor._pool
+        for process in list(broken._processes.values()):
+            process.kill()
+            process.join()
+        np.testing.assert_array_equal(executor.run(resample, self.samples, 44100, 16000), expected)
+        
+        self.assertIsNot(executor._pool, broken)
+        metrics = executor.get_metrics()
+        self.assertEqual((metrics['pool_restarts'], metrics['completed'], metrics['failed']), (1, 2, 0))
+
+class TestProsody(unittest.TestCase):
+    def synthesize(self, f0=150.0, sample_rate=44100):
+        """Voiced 'syllables' at f0, 0.2 s on and 0.1 s off, with two 0.6 s pauses"""
+        t = np.arange(int(0.2 * sample_rate)) / sample_rate
+        syllable = 0.3 * np.sin(2 * np.pi * f0 * t) * np.hanning(len(t))
+        gap, pause = np.zeros(int(0.1 * sample_rate)), np.zeros(int(0.6 * sample_rate))
+        phrase = np.concatenate([syllable, gap] * 3)
+        return np.concatenate([phrase, pause, phrase, pause, phrase]).astype(np.float32)
+
+    def test_pitch_pauses_and_syllables(self):
+        """Test that a synthetic reading gives its pitch, pauses and syllable count"""
+        prosody = analyze_prosody(self.synthesize(), 44100)
+        self.assertAlmostEqual(prosody['f0_median'], 150.0, delta=3)
+        self.assertLess(prosody['f0_range_semitones'], 1)
+        self.assertEqual(prosody['pause_count'], 2)
+        self.assertEqual(prosody['syllable_count'], 9)
+        self.assertIsNone(summarize_prosody(analyze_prosody(np.zeros(16000), 16000)))
+        
+        summary = summarize_prosody(prosody)
+        prompt = build_feedback_prompt(align_words("a b", "a b"), "", 'english', prosody=prosody)
+        self.assertIn(f"{summary['speaking_rate']} syllables/s", prompt['messages'][1]['content'])
+
+    def test_time_budget(self):
+        """Test that a minute of 44.1 kHz audio is analyzed well within a second"""
+        samples = np.tile(self.synthesize(), 12)[:44100 * 60]
+        analyze_prosody(samples[:44100], 44100)
+        start = time.perf_counter()
+        analyze_prosody(samples, 44100)
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+class TestReferenceComparison(unittest.TestCase):
+    CHORDS = [(200, 900, 2400), (300, 1200, 2600), (250, 700, 1800), (180, 1500, 3000), (400, 1000, 2200)]
+
+    def read(self, durations, replaced=None, sample_rate=16000):
+        """Chord 'words' separated by short silences, one of them replaced by noise"""
+        rng = np.random.default_rng(0)
+        parts, words, position = [np.zeros(int(0.3 * sample_rate))], [], 0.3
+        for i, (chord, duration) in enumerate(zip(self.CHORDS, durations)):
+            t = np.arange(int(duration * sample_rate)) / sample_rate
+            tone = sum(np.sin(2 * np.pi * f * t) for f in chord) if i != replaced else rng.normal(size=len(t))
+            parts += [0.1 * tone * np.hanning(len(t)), np.zeros(int(0.12 * sample_rate))]
+            words.append({'text': f"w{i}", 'start': position, 'end': position + duration})
+            position += duration + 0.12
+        return np.concatenate(parts).astype(np.float32), words
+
+    def test_banded_dtw_matches_full_dtw(self):
+        """Test that a band covering the whole matrix gives the exact DTW path and cost"""
+        rng = np.random.default_rng(1)
+        x, y = rng.normal(size=(30, 3)), rng.normal(size=(45, 3))
+        full = np.full((31, 46), np.inf)
+        full[0, 0] = 0
+        for i in range(1, 31):
+            for j in range(1, 46):
+                full[i, j] = np.linalg.norm(x[i - 1] - y[j - 1]) + min(full[i - 1, j - 1], full[i - 1, j], full[i, j - 1])
+        
+        rows, cols, total = banded_dtw(x, y, radius=100)
+        self.assertAlmostEqual(total, full[30, 45])
+        self.assertAlmostEqual(np.linalg.norm(x[rows] - y[cols], axis=1).sum(), total)
+        self.assertEqual((rows[0], cols[0], rows[-1], cols[-1]), (0, 0, 29, 44))
+        self.assertTrue((np.diff(rows) >= 0).all() and (np.diff(cols) >= 0).all())
+        # A narrow band costs at least as much
+        self.assertGreaterEqual(banded_dtw(x, y, radius=3)[2], total)
+
+    def test_worst_word_is_the_mispronounced_one(self):
+        """Test that the word read differently ranks worst and is located in the learner's take"""
+        reference, words = self.read([0.3] * 5)
+        learner, learner_words = self.read([0.35, 0.25, 0.4, 0.3, 0.28], replaced=3)
+        comparison = compare_features(resample(learner, 16000, 44100), 44100, reference, 16000, words)
+        
+        self.assertEqual(comparison['worst'][0]['text'], 'w3')
+        self.assertGreater(comparison['worst'][0]['relative'], 1.5)
+        spoken = {word['text']: word for word in comparison['words']}
+        self.assertAlmostEqual(spoken['w2']['start'], learner_words[2]['start'], delta=0.05)
+        self.assertIsNone(compare_features(np.zeros(16000), 16000, reference, 16000, words))
+
+class TestPlaybackReview(unittest.TestCase):
+    def test_tiles_are_cached_and_pooled(self):
+        """Test that a recording is analyzed once and tiles are display-sized and reused"""
+        rate = 16000
+        samples = np.zeros(rate * 3, dtype=np.float32)
+        samples[rate:rate + 800] = 0.5 * np.sin(2 * np.pi * 1000 * np.arange(800) / rate)
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
+            sf.write(f.name, samples, rate)
+        self.addCleanup(os.remove, f.name)
+        review = PlaybackReview()
+        
+        tile = review.tile(f.name, 0.0, 3.0, width=200)
+        self.assertEqual(tile['spectrogram'].shape, (SPECTROGRAM_HEIGHT, 200, 3))
+        self.assertEqual(tile['waveform'].shape, (WAVEFORM_HEIGHT, 200, 3))
+        # The 50 ms tone survives pooling 300 frames into 200 columns
+        burst = (tile['waveform'][0] != 255).any(axis=1)
+        self.assertTrue(burst[66:70].any())
+        self.assertFalse(burst[:60].any())
+        
+        self.assertIs(review.tile(f.name, 0.0, 3.0, width=200), tile)
+        review.tile(f.name, 1.0, 1.5, width=200)
+        metrics = review.get_metrics()
+        self.assertEqual(metrics['computes'], 1)
+        self.assertEqual((metrics['tile_hits'], metrics['tile_misses']), (1, 2))
+
+class TestStubBackends(unittest.TestCase):
+    def test_services_run_on_stubs(self):
+        """Test that the load-test stubs drive SpeechService and AudioService end to end"""
+        from benchmarks.stub_backends import (LatencyModel, StubRecognizerFactory, StubSynthesizerFactory,
+                                              SyntheticStreamFactory)
+        speech = SpeechService(recognizer_factory=StubRecognizerFactory(LatencyModel()),
+                               synthesizer_factory=StubSynthesizerFactory(LatencyModel()))
+        reference = speech.synthesize_reference("Practice makes perfect")
+        self.assertEqual([word['text'] for word in reference['words']], ["Practice", "makes", "perfect"])
+        
+        audio = AudioService(stream_factory=SyntheticStreamFactory(speed=10))
+        audio.start_recording()
+        time.sleep(0.2)
+        audio_file = audio.stop_recording()
+        self.assertGreater(sf.info(audio_file).duration, 1.0)
+        
+        result = speech.analyze_pronunciation(audio_file, "Practice makes perfect")
+        self.assertGreaterEqual(result['pronunciation_score'], 60)
+        self.assertTrue(set(result['transcribed_text'].split()) <= {"Practice", "makes", "perfect"})
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_compare_flags_significant_changes(self):
+        """Test that the benchmark comparison separates real slowdowns from noise"""
+        from benchmarks.suite import mann_whitney
+        rng = np.random.default_rng(0)
+        before = rng.normal(1.0, 0.02, 15)
+        self.assertLess(mann_whitney(before, rng.normal(1.2, 0.02, 15)), 0.001)
+        self.assertGreater(mann_whitney(before, rng.normal(1.0, 0.02, 15)), 0.01)
+        self.assertEqual(mann_whitney([1.0] * 5, [1.0] * 5), 1.0)
+
+class TestMemoryProfiler(unittest.TestCase):
+    def test_idle_sessions_are_released(self):
+        """Test that per-rerun profiling attributes session bytes and the sweeper frees idle sessions"""
+        from app import release_idle_session
+        from src.utils.memory_profiler import MemoryProfiler, deep_sizeof
+        samples = np.zeros(100000, dtype=np.float32)
+        self.assertLess(deep_sizeof([samples, samples[:10]]), samples.nbytes + 1000)
+
+        now = [0.0]
+        profiler = MemoryProfiler(enabled=True, idle_seconds=60, clock=lambda: now[0])
+        self.addCleanup(tracemalloc.stop)
+        state = {'practice_history': [samples], 'analysis_job_id': 1, 'analysis_completed': True,
+                 'pronunciation_result': {'transcribed_text': 'hello'}, 'language': 'english'}
+        with profiler.rerun('session-1', state, release_idle_session):
+            pass
+        report = profiler.report()
+        self.assertEqual(report['reruns'][-1]['session_id'], 'session-1')
+        self.assertEqual(next(iter(report['sessions'][0]['keys'])), 'practice_history')
+
+        self.assertEqual(profiler.sweep()['sessions'], 0)
+        now[0] = 61
+        released = profiler.sweep()
+        profiler.stop_sweeper()
+        self.assertEqual(released['sessions'], 1)
+        self.assertGreater(released['bytes'], samples.nbytes)
+        # Restored by the next rerun from the finished analysis job
+        self.assertEqual(state['practice_history'], [])
+        self.assertIsNone(state['pronunciation_result'])
+        self.assertFalse(state['analysis_completed'])
+        self.assertEqual(state['analysis_job_id'], 1)
+        self.assertEqual(profiler.report()['sessions'], [])
+
+    def test_closed_sessions_are_forgotten(self):
+        """Test that sessions Streamlit no longer lists and idle sessions without state are dropped"""
+        from src.utils.memory_profiler import MemoryProfiler
+        now = [0.0]
+        active = {'open', 'closed', 'stateless'}
+        profiler = MemoryProfiler(idle_seconds=60, clock=lambda: now[0], is_active=active.__contains__)
+        self.addCleanup(profiler.stop_sweeper)
+        released = []
+        for session_id in ('open', 'closed'):
+            with profiler.rerun(session_id, {'practice_history': [b'x' * 1000]}, released.append):
+                pass
+        with profiler.rerun('stateless', {}):
+            pass
+        
+        active.discard('closed')
+        self.assertEqual({session['session_id'] for session in profiler.report()['sessions']},
+                         {'open', 'stateless'})
+        now[0] = 61
+        profiler.sweep()
+        self.assertEqual(profiler.report()['sessions'], [])
+        # Only the open session's state was still held for release
+        self.assertEqual(len(released), 1)
+
+class TestLogging(unittest.TestCase):
+    def test_pipeline_truncates_samples_and_writes_json(self):
+        """Test that queued logs are cut, debug logs are sampled per call site and lines are JSON"""
+        from src.utils.logger import LogPipeline
+        log_dir = tempfile.mkdtemp()
+        pipeline = LogPipeline(directory=log_dir, fmt='json', rotation='size', max_message_chars=100,
+                               debug_sample_every=10, console=False)
+        pipeline.start()
+        logger = logging.getLogger('test_logging_pipeline')
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger.addHandler(pipeline.handler)
+        self.addCleanup(logger.removeHandler, pipeline.handler)
+
+        logger.error("frames: %s", [0.0] * 10000)
+        for i in range(50):
+            logger.debug("hot path %d", i)
+        try:
+            raise ValueError("bad take")
+        except ValueError:
+            logger.error("analysis failed", exc_info=True)
+        pipeline.stop()
+
+        with open(os.path.join(log_dir, 'app.log'), encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f]
+        self.assertLess(len(entries[0]['message']), 150)
+        self.assertIn('more chars', entries[0]['message'])
+        self.assertEqual([entry['message'] for entry in entries[1:-1]],
+                         [f"hot path {i}" for i in range(0, 50, 10)])
+        self.assertIn('ValueError: bad take', entries[-1]['exception'])
+        self.assertEqual(pipeline.get_metrics()['dropped_sampling'], 45)
+        self.assertEqual(pipeline.get_metrics()['truncated'], 1)
+
+    def test_stop_after_stderr_closed_and_worker_files(self):
+        """Test that stopping survives a closed console stream and child processes get their own file"""
+        from src.utils.logger import LogPipeline, process_log_file
+        stderr = io.StringIO()
+        with mock.patch.object(sys, 'stderr', stderr):
+            pipeline = LogPipeline(directory=tempfile.mkdtemp(), console=True)
+        pipeline.start()
+        stderr.close()
+        pipeline.stop()
+
+        self.assertEqual(process_log_file('app.log'), 'app.log')
+        with mock.patch('multiprocessing.parent_process', return_value=object()):
+            self.assertEqual(process_log_file('app.log'), f"app.{os.getpid()}.log")
+
+class TestColdStart(unittest.TestCase):
+    # Modules a fresh Streamlit worker must not load before first use
+    DEFERRED_MODULES = ('azure.cognitiveservices.speech', 'openai', 'httpx', 'sounddevice',
+                        'soundfile', 'src.ui.recording_visualizer')
+    # Import time of app.py on top of streamlit itself
+    IMPORT_BUDGET_SECONDS = 1.0
+
+    def test_import_time_budget(self):
+        """Test that importing app.py defers heavy dependencies and stays within budget"""
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import app'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        
+        cumulative = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, micros, name = line.split('|')
+                if micros.strip().isdigit():
+                    cumulative[name.strip()] = int(micros)
+        for module in self.DEFERRED_MODULES:
+            self.assertNotIn(module, cumulative, f"{module} imported at startup")
+        
+        own_time = (cumulative['app'] - cumulative.get('streamlit', 0)) / 1e6
+        self.assertLess(own_time, self.IMPORT_BUDGET_SECONDS)
+
+    def test_lazy_service_proxy(self):
+        """Test that a lazy service is built once, on first attribute access"""
+        service = LazyService('src.services.single_flight', 'SingleFlight', 'lazy-test')
+        self.assertFalse(service.is_loaded)
+        self.assertEqual(service.name, 'lazy-test')
+        self.assertTrue(service.is_loaded)
+        self.assertEqual(service.do('key', lambda: 42), 42)
+
+class TestHedging(unittest.TestCase):
+    def test_hedge_wins_over_slow_primary(self):
+        """Test that a late first token triggers a hedge and the loser is cancelled"""
+        hedger = Hedger('test', budget=1.0, initial_delay=0.05)
+        cancelled = threading.Event()
+        
+        def slow_primary(attempt):
+            while not attempt.cancelled():
+                time.sleep(0.01)
+            cancelled.set()
+            raise HedgeCancelled()
+        
+        def fast_hedge(attempt):
+            attempt.first_token()
+            attempt.tokens += 1
+            return "hedged feedback"
+        
+        self.assertEqual(hedger.run(slow_primary, fast_hedge), "hedged feedback")
+        self.assertTrue(cancelled.wait(timeout=1))
+        
+        metrics = hedger.get_metrics()
+        self.assertEqual(metrics['hedges'], 1)
+        self.assertEqual(metrics['hedge_wins'], 1)
+        self.assertGreaterEqual(metrics['p99_unhedged'], metrics['p99'])
+
+    def test_hedge_budget(self):
+        """Test that hedging stops once the budget is spent"""
+        hedger = Hedger('test', budget=0.0, initial_delay=0.01)
+        
+        def slow(attempt):
+            time.sleep(0.05)
+            return "primary"
+        
+        self.assertEqual(hedger.run(slow), "primary")
+        self.assertEqual(hedger.get_metrics()['hedges'], 0)
+        self.assertEqual(hedger.get_metrics()['budget_denied'], 1)
+
+    def test_failed_primary_does_not_wait_for_the_delay(self):
+        """Test that an immediate primary error surfaces at once and is counted, not sampled"""
+        hedger = Hedger('test', budget=1.0, initial_delay=2.0)
+        
+        def refused(attempt):
+            raise ConnectionRefusedError("connection refused")
+        
+        start_time = time.monotonic()
+        with self.assertRaises(ConnectionRefusedError):
+            hedger.run(refused, lambda attempt: self.fail("hedge sent"))
+        self.assertLess(time.monotonic() - start_time, 0.5)
+        
+        metrics = hedger.get_metrics()
+        self.assertEqual((metrics['hedges'], metrics['failed_primaries']), (0, 1))
+
+    def test_slow_primary_is_sampled_as_censored(self):
+        """Test that a primary cut off by the hedge still adds a first-token sample"""
+        hedger = Hedger('test', budget=1.0, initial_delay=0.05, min_samples=1)
+        
+        def slow_primary(attempt):
+            while not attempt.cancelled():
+                time.sleep(0.01)
+            raise HedgeCancelled()
+        
+        def fast_hedge(attempt):
+            attempt.first_token()
+            return "hedged feedback"
+        
+        hedger.run(slow_primary, fast_hedge)
+        metrics = hedger.get_metrics()
+        self.assertEqual(metrics['censored_first_tokens'], 1)
+        self.assertGreaterEqual(metrics['hedge_delay'], 0.05)
+
 class TestEnglishPracticeApp(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -181,6 +1221,184 @@ class TestEnglishPracticeApp(unittest.TestCase):
             self.assertIsNotNone(practice_session)
             self.assertEqual(practice_session.practice_text_id, practice_text.id)
 
+    def test_audio_store(self):
+        """Test content-addressed recording storage and garbage collection"""
+        store = AudioStore(root=tempfile.mkdtemp(), orphan_grace_hours=0)
+        audio_data = np.random.normal(0, 0.1, (2 * 16000, 1)).astype('float32')
+        
+        # Identical takes are stored once, compressed
+        first_path = store.store_array(audio_data, 16000)
+        second_path = store.store_array(audio_data, 16000)
+        self.assertEqual(first_path, second_path)
+        self.assertTrue(first_path.endswith('.flac'))
+        
+        metrics = store.get_metrics()
+        self.assertEqual(metrics['dedup_hits'], 1)
+        self.assertGreater(metrics['bytes_saved'], 0)
+        
+        # Decoded copy for WAV-only consumers
+        with store.as_wav(first_path) as wav_path:
+            self.assertEqual(sf.info(wav_path).frames, len(audio_data))
+        
+        # Unreferenced recordings are collected once past the grace period
+        deleted = store.collect_garbage(now=os.path.getmtime(first_path) + 1)
+        self.assertEqual(deleted['orphaned'], 1)
+        self.assertFalse(os.path.exists(first_path))
+
+    def test_single_flight(self):
+        """Test that concurrent identical calls share one upstream call"""
+        flight = SingleFlight('test')
+        upstream_calls = []
+        release = threading.Event()
+        
+        def upstream(text):
+            upstream_calls.append(text)
+            release.wait(timeout=5)
+            return f"audio for {text}"
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do('hello', upstream, 'hello')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        # Let every caller join the in-flight call before it completes
+        while flight.get_metrics()['requests'] < 5:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(upstream_calls), 1)
+        self.assertEqual(results, ["audio for hello"] * 5)
+        metrics = flight.get_metrics()
+        self.assertEqual(metrics['coalesced'], 4)
+        self.assertAlmostEqual(metrics['coalescing_ratio'], 0.8)
+        self.assertEqual(metrics['in_flight'], 0)
+
+    def test_lexicon_lookup(self):
+        """Test offline IPA, syllable and stress lookup"""
+        lexicon = get_lexicon()
+        
+        banana = lexicon.describe("Banana")[0]
+        self.assertEqual(banana['ipa'], "bəˈnæ.nə")
+        self.assertEqual(banana['syllables'], ["bə", "næ", "nə"])
+        self.assertEqual(banana['primary_stress'], 2)
+        
+        # Alternate pronunciations are kept, unknown words miss
+        self.assertEqual(len(lexicon.lookup("read")), 2)
+        self.assertIsNone(lexicon.lookup("qzxv"))
+
+    def test_word_alignment(self):
+        """Test local word diff between reference text and transcription"""
+        alignment = align_words("The quick brown fox jumps.", "the quick brown box jumps jumps")
+        
+        self.assertEqual(alignment['correct'], 4)
+        self.assertEqual(alignment['substitutions'], 1)
+        self.assertEqual(alignment['insertions'], 1)
+        self.assertEqual(alignment['omissions'], 0)
+        self.assertEqual(compact_diff(alignment), "… brown [fox→box] jumps [+jumps]")
+        
+        # A perfect reading leaves nothing to send to the model
+        self.assertEqual(compact_diff(align_words("Hello world", "hello, world!")), "")
+
+    def test_prompt_builder(self):
+        """Test token-budgeted prompts with stable system messages"""
+        long_text = " ".join(["The quick brown fox jumps over the lazy dog."] * 200)
+        prompt = build_phonetic_guide_prompt(long_text, max_input_tokens=100)
+        self.assertLessEqual(count_tokens(prompt['messages'][1]['content']), 100)
+        self.assertTrue(prompt['messages'][1]['content'].endswith("dog. …"))
+        
+        # The system message does not depend on the reading
+        first = build_feedback_prompt(align_words("a b c", "a x c"), "a [b→x] c", 'english')
+        second = build_feedback_prompt(align_words("d e", "d e"), "", 'english', {'pronunciation_score': 90})
+        self.assertEqual(first['messages'][0], second['messages'][0])
+        self.assertIn("[b→x]", first['messages'][1]['content'])
+        self.assertGreater(first['prompt_tokens'], count_tokens(first['messages'][0]['content']))
+
+    def test_db_bootstrap(self):
+        """Test that migrations run once per process and seed the presets"""
+        queries = get_db_metrics()['queries']
+        init_db()
+        self.assertEqual(get_db_metrics()['queries'], queries)
+        self.assertTrue(get_db_metrics()['bootstrapped'])
+        
+        with engine.connect() as connection:
+            revision = connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+        self.assertEqual(revision, ScriptDirectory.from_config(AlembicConfig(ALEMBIC_INI)).get_current_head())
+        self.assertEqual(len(self.db_service.get_preset_texts()), 3)
+
+    def test_db_read_cache(self):
+        """Test that reads are cached and writes invalidate exactly what they change"""
+        category = f"cache-test-{time.time()}"
+        text = self.db_service.create_practice_text("Cache", "First text.", "beginner", category)
+        self.assertEqual(len(self.db_service.get_preset_texts(category)), 1)
+        
+        # Repeated reads, even from a new service, do not touch the database
+        queries = get_db_metrics()['queries']
+        self.assertEqual(len(DBService().get_preset_texts(category)), 1)
+        self.assertEqual(self.db_service.get_practice_history(text.id), [])
+        self.assertEqual(self.db_service.get_practice_history(text.id), [])
+        self.assertEqual(self.db_service.get_practice_text(text.id).content, "First text.")
+        self.assertEqual(self.db_service.get_practice_text(text.id).content, "First text.")
+        self.assertEqual(get_db_metrics()['queries'] - queries, 2)
+        
+        self.db_service.create_practice_text("Cache 2", "Second text.", "beginner", category)
+        self.db_service.create_practice_session(text.id, None, "first text", 90.0, "Good")
+        self.assertEqual(len(self.db_service.get_preset_texts(category)), 2)
+        history = self.db_service.get_practice_history(text.id)
+        self.assertEqual([session.pronunciation_score for session in history], [90.0])
+        self.assertGreater(get_db_cache_metrics()['hits'], 0)
+
+    def test_practice_text_stats(self):
+        """Test that per-text statistics follow inserts and match a rebuild"""
+        text = self.db_service.create_practice_text("Stats", "Stats text.", "beginner", f"stats-{time.time()}")
+        for score in (70.0, None, 90.0):
+            self.db_service.create_practice_session(text.id, None, "stats text", score, "")
+        
+        stats = self.db_service.get_practice_text(text.id).to_dict()
+        self.assertEqual(stats['session_count'], 3)
+        self.assertEqual(stats['best_score'], 90.0)
+        self.assertEqual(stats['mean_score'], 80.0)
+        self.assertIsNotNone(stats['last_practiced_at'])
+        
+        # A rebuild from practice_sessions gives the same values
+        self.assertEqual(rebuild_text_stats(self.db_service.db, text.id), 1)
+        self.db_service.cache.clear()
+        self.assertEqual(self.db_service.get_practice_text(text.id).to_dict(), stats)
+
+    def test_practice_rollups(self):
+        """Test that score rollups follow inserts, match a rebuild and pick a resolution"""
+        category = f"rollups-{time.time()}"
+        text = self.db_service.create_practice_text("Rollups", "Rollups text.", "beginner", category)
+        for score, accuracy in ((70.0, 60.0), (None, None), (90.0, 95.0)):
+            self.db_service.create_practice_session(text.id, None, "rollups text", score, "",
+                                                    accuracy_score=accuracy)
+        
+        today = datetime.utcnow().date()
+        progress = self.db_service.get_progress('text', text.id, today, today)
+        self.assertEqual(progress['resolution'], 'day')
+        self.assertEqual(len(progress['points']), 1)
+        point = progress['points'][0]
+        self.assertEqual(point['session_count'], 3)
+        self.assertEqual(point['pronunciation'], {'count': 2, 'mean': 80.0, 'min': 70.0, 'max': 90.0})
+        self.assertEqual(point['accuracy']['max'], 95.0)
+        self.assertEqual(point['fluency']['count'], 0)
+        
+        # The category series and the weekly rows see the same sessions
+        by_category = self.db_service.get_progress('category', category, today, today)['points']
+        self.assertEqual(by_category[0]['pronunciation'], point['pronunciation'])
+        yearly = self.db_service.get_progress('text', text.id)
+        self.assertEqual(yearly['resolution'], 'week')
+        self.assertEqual(yearly['points'][-1]['session_count'], 3)
+        self.assertEqual(choose_resolution(today - timedelta(days=29), today, max_points=30), 'day')
+        self.assertEqual(choose_resolution(today - timedelta(days=30), today, max_points=30), 'week')
+        
+        # A rebuild from practice_sessions gives the same rows
+        rebuild_rollups(self.db_service.db)
+        self.assertEqual(self.db_service.get_progress('text', text.id, today, today), progress)
+
     def test_phonetic_guide(self):
         """Test phonetic guide generation"""
         text = "The quick brown fox jumps over the lazy dog."